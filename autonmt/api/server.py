@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import bisect
+import importlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from autonmt.vocabularies.base_vocab import pad_ids
+
+
+class LatencyHistogram:
+    """Number of observed latencies (ms) per bucket. Each bucket is identified by its upper bound"""
+    def __init__(self, buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # The last bucket has no upper bound
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def to_dict(self):
+        keys = [str(b) for b in self.buckets] + ["inf"]
+        return {"buckets": dict(zip(keys, self.counts)), "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0}
+
+
+class _Request:
+    __slots__ = ("ids", "arrival", "future")
+
+    def __init__(self, ids, arrival, future):
+        self.ids = ids
+        self.arrival = arrival
+        self.future = future
+
+
+class TranslationServer:
+    """
+    Serves an 'AutonmtTranslator' over a local TCP socket (one JSON object per line).
+    Concurrent requests are grouped into micro-batches. A batch is closed when its oldest request has waited
+    'max_latency_ms', or when it would exceed 'max_tokens' (padded source tokens) or 'max_batch_size'.
+    The batches are decoded in a worker thread, so new requests keep queueing while a batch is being translated.
+
+    Requests:
+        {"id": ..., "text": "..."} => {"id": ..., "translation": "..."}
+        {"id": ..., "cmd": "stats"} => {"id": ..., "stats": {...}}
+    """
+    def __init__(self, translator, host="127.0.0.1", port=8765, max_latency_ms=10, max_tokens=4096, max_batch_size=64,
+                 max_len_a=1.2, max_len_b=50, preprocess_fn=None, checkpoint=None, accelerator="auto", shortlist=None):
+        if max_batch_size < 1:
+            raise ValueError("'max_batch_size' must be greater than zero")
+        self.translator = translator
+        self.host = host
+        self.port = port
+        self.max_latency = max_latency_ms / 1000
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.max_len_a = max_len_a
+        self.max_len_b = max_len_b
+        self.preprocess_fn = preprocess_fn
+
+        # Load the model once
+        self.shortlist = translator.prepare_inference(checkpoint=checkpoint, accelerator=accelerator, shortlist=shortlist)
+
+        # Batching
+        self.queue = None  # Created in the event loop
+        self.pending = None  # Request that did not fit in the previous batch
+        self.executor = ThreadPoolExecutor(max_workers=1)  # Decoding
+
+        # Stats
+        self.request_latency = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def get_stats(self):
+        return {
+            "queue_depth": self.queue.qsize() + int(self.pending is not None) if self.queue else 0,
+            "num_requests": self.num_requests,
+            "num_batches": self.num_batches,
+            "avg_batch_size": self.num_requests / self.num_batches if self.num_batches else 0.0,
+            "request_latency_ms": self.request_latency.to_dict(),
+            "batch_latency_ms": self.batch_latency.to_dict(),
+        }
+
+    def _encode(self, text):
+        x_ids, x_lens = self.translator.encode_src_lines([text], preprocess_fn=self.preprocess_fn)
+        return x_ids[0, :x_lens[0]]
+
+    def _translate_batch(self, ids):
+        x_ids, x_lens = pad_ids(ids, pad_id=self.translator.src_vocab.pad_id)
+        hyp_tok = self.translator.translate_ids(x_ids, x_lens, max_len_a=self.max_len_a, max_len_b=self.max_len_b,
+                                                shortlist=self.shortlist)
+        return self.translator.decode_hyp_lines(hyp_tok)
+
+    async def _next_batch(self):
+        # Wait for the first request
+        req = self.pending if self.pending is not None else await self.queue.get()
+        self.pending = None
+        batch, max_len = [req], len(req.ids)
+
+        # Fill the batch until the latency window of the first request is over
+        deadline = req.arrival + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                req = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+            # Padded tokens
+            new_max_len = max(max_len, len(req.ids))
+            if self.max_tokens and (len(batch) + 1) * new_max_len > self.max_tokens:
+                self.pending = req  # First request of the next batch
+                break
+            batch.append(req)
+            max_len = new_max_len
+        return batch
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+
+            # Translate (worker thread)
+            start = time.perf_counter()
+            try:
+                translations = await loop.run_in_executor(self.executor, self._translate_batch, [r.ids for r in batch])
+            except Exception as e:
+                for req in batch:
+                    if not req.future.done():
+                        req.future.set_exception(e)
+                continue
+            end = time.perf_counter()
+
+            # Stats
+            self.num_batches += 1
+            self.num_requests += len(batch)
+            self.batch_latency.observe((end - start) * 1000)
+            for req, translation in zip(batch, translations):
+                self.request_latency.observe((end - req.arrival) * 1000)
+                if not req.future.done():  # The client might have disconnected
+                    req.future.set_result(translation)
+
+    async def _handle_request(self, line, writer, lock):
+        loop = asyncio.get_running_loop()
+        req_id = None
+        try:
+            data = json.loads(line)
+            req_id = data.get("id")
+            if data.get("cmd") == "stats":
+                response = {"id": req_id, "stats": self.get_stats()}
+            elif isinstance(data.get("text"), str):
+                arrival = time.perf_counter()
+                ids = await loop.run_in_executor(None, self._encode, data["text"])  # Preprocessing
+                future = loop.create_future()
+                await self.queue.put(_Request(ids, arrival, future))
+                response = {"id": req_id, "translation": await future}
+            else:
+                raise ValueError("Requests must contain a 'text' (str) or a 'cmd' field")
+        except Exception as e:
+            response = {"id": req_id, "error": str(e)}
+
+        # Responses are written as soon as they are ready (use the 'id' to match them)
+        async with lock:
+            writer.write((json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.ensure_future(self._handle_request(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.queue = asyncio.Queue()
+        batcher = asyncio.ensure_future(self._batcher())
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]  # Port 0: Any free port
+        print(f"\t- [INFO]: Serving on {self.host}:{self.port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.executor.shutdown(wait=False)
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+def _import_object(path):
+    # "package.module:name" => object
+    module_name, sep, name = path.partition(":")
+    if not sep or not name:
+        raise ValueError(f"Invalid import path: '{path}' (expected 'package.module:name')")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Serve an AutoNMT model on a local socket (JSON lines)")
+    parser.add_argument("factory", help="Function that returns the 'AutonmtTranslator' to serve ('package.module:name')")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--checkpoint", default=None, help="'best', 'last', filename or path")
+    parser.add_argument("--accelerator", default="auto")
+    parser.add_argument("--shortlist", default=None, help="Path to a lexical shortlist")
+    parser.add_argument("--preprocess-fn", default=None, help="Preprocessing function ('package.module:name')")
+    parser.add_argument("--max-latency-ms", type=float, default=10)
+    parser.add_argument("--max-tokens", type=int, default=4096)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-len-a", type=float, default=1.2)
+    parser.add_argument("--max-len-b", type=int, default=50)
+    args = parser.parse_args(args)
+
+    # Build translator (model + vocabularies)
+    translator = _import_object(args.factory)()
+    preprocess_fn = _import_object(args.preprocess_fn) if args.preprocess_fn else None
+
+    server = TranslationServer(translator, host=args.host, port=args.port, max_latency_ms=args.max_latency_ms,
+                               max_tokens=args.max_tokens, max_batch_size=args.max_batch_size,
+                               max_len_a=args.max_len_a, max_len_b=args.max_len_b, preprocess_fn=preprocess_fn,
+                               checkpoint=args.checkpoint, accelerator=args.accelerator, shortlist=args.shortlist)
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+def _load_state_dict(checkpoint_path):
+    # Weights only (safe unpickling) and memory-mapped (tensors are read lazily)
+    try:
+        checkpoint = torch.load(checkpoint_path, map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:  # Old PyTorch versions (no 'mmap')
+        checkpoint = torch.load(checkpoint_path, map_location="cpu")
+    except (pickle.UnpicklingError, RuntimeError):  # Objects that are not weights (e.g. custom hyper-parameters)
+        print(f"\t- [WARNING]: The checkpoint contains objects that are not weights. Loading it fully: {checkpoint_path}")
+        checkpoint = torch.load(checkpoint_path, map_location="cpu", weights_only=False)
+
+    # Keep only the weights (optimizer states, loops,... are released)
+    return checkpoint.get("state_dict", checkpoint)
+
+
+def _num_bytes(state_dict):
+    return sum(t.numel() * t.element_size() for t in state_dict.values() if torch.is_tensor(t))
+
+
+class CheckpointCache:
+    """
+    Loaded checkpoints (state dicts) shared by all the translators of the process, keyed by (path, mtime).
+    The least recently used checkpoints are released when the cache exceeds 'max_bytes' (None: no limit)
+    """
+    def __init__(self, max_bytes=4*1024**3):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # {(path, mtime): (state_dict, num_bytes)}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(checkpoint_path):
+        return os.path.abspath(checkpoint_path), os.path.getmtime(checkpoint_path)
+
+    def set_budget(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def load(self, checkpoint_path):
+        key = self.get_key(checkpoint_path)
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+
+            # Load checkpoint (old versions of the same file are released)
+            self.misses += 1
+            for old_key in [k for k in self.entries if k[0] == key[0]]:
+                del self.entries[old_key]
+            state_dict = _load_state_dict(checkpoint_path)
+            self.entries[key] = (state_dict, _num_bytes(state_dict))
+            self._evict()
+            return state_dict
+
+    def _evict(self):
+        # Release the least recently used checkpoints (the last one is always kept)
+        while self.max_bytes is not None and len(self.entries) > 1 and self.num_bytes > self.max_bytes:
+            self.entries.popitem(last=False)
+
+    @property
+    def num_bytes(self):
+        return sum(num_bytes for _, num_bytes in self.entries.values())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Shared by all the translators of the process
+checkpoint_cache = CheckpointCache()
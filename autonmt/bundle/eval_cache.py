@@ -0,0 +1,84 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import uuid
+
+_file_hashes = {}
+
+
+def file_hash(filename, chunk_size=1 << 20):
+    # Content hash (memoized by path, size and modification time)
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime)
+    if key not in _file_hashes:
+        h = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                h.update(chunk)
+        _file_hashes[key] = h.hexdigest()
+    return _file_hashes[key]
+
+
+def fn_fingerprint(fn):
+    """
+    Fingerprint of a (preprocessing) function: its source code, or its bytecode and constants if the source is not
+    available. Changes in the global variables it uses are not detected.
+    """
+    if fn is None:
+        return "none"
+    try:
+        code = inspect.getsource(fn)
+    except (OSError, TypeError):
+        fn_code = getattr(fn, "__code__", None)
+        code = repr((fn_code.co_code, fn_code.co_consts, fn_code.co_names)) if fn_code else repr(fn)
+    closure = [repr(c.cell_contents) for c in (getattr(fn, "__closure__", None) or [])]
+    return hashlib.sha1(json.dumps([getattr(fn, "__qualname__", ""), code, closure]).encode("utf-8")).hexdigest()
+
+
+def link_or_copy(src, dst):
+    # Hardlink (atomic replace). Falls back to a copy across filesystems
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    tmp_dst = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(src, tmp_dst)
+    except OSError:
+        shutil.copyfile(src, tmp_dst)
+    os.replace(tmp_dst, dst)
+
+
+class EncodedSetCache:
+    """
+    Preprocessed and encoded eval files shared by all the runs with the same vocabulary.
+    Entries are keyed by the test file, preprocessing function, subword model and pretokenization flag, and they are
+    reused by hardlink (or copied if the cache is in another filesystem).
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(input_file, preprocess_fn, input_lang, vocab_lang, pretok_flag, subword_model, model_vocab_path):
+        vocab_hash = file_hash(model_vocab_path) if model_vocab_path and os.path.isfile(model_vocab_path) else None
+        values = [file_hash(input_file), fn_fingerprint(preprocess_fn), input_lang, vocab_lang, bool(pretok_flag),
+                  subword_model, vocab_hash]
+        return hashlib.sha1(json.dumps(values).encode("utf-8")).hexdigest()
+
+    def get(self, key, dst_files):
+        # Link the cached files ({name: dst_file}) if all of them are available
+        entry_path = os.path.join(self.cache_dir, key)
+        src_files = {name: os.path.join(entry_path, name) for name in dst_files}
+        if not all(os.path.exists(f) for f in src_files.values()):
+            return False
+        for name, dst_file in dst_files.items():
+            link_or_copy(src_files[name], dst_file)
+        return True
+
+    def put(self, key, src_files):
+        # Add files to the cache ({name: src_file})
+        entry_path = os.path.join(self.cache_dir, key)
+        os.makedirs(entry_path, exist_ok=True)
+        for name, src_file in src_files.items():
+            link_or_copy(src_file, os.path.join(entry_path, name))
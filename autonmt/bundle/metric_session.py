@@ -0,0 +1,148 @@
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+
+
+class BertScoreScorer:
+    """
+    BERTScore with the model loaded once. The reference embeddings of each test set are cached (on CPU, trimmed to the
+    length of each sentence), since the references are the same for all the models evaluated on it.
+    The least recently used test sets are released when the cache exceeds 'max_cache_bytes'.
+    """
+    def __init__(self, lang, batch_size=64, max_cache_bytes=2*1024**3, **kwargs):
+        import bert_score
+        self.scorer = bert_score.BERTScorer(lang=lang, batch_size=batch_size, **kwargs)
+        self.batch_size = batch_size
+        self.max_cache_bytes = max_cache_bytes
+        self.ref_cache = OrderedDict()  # {refs hash: (embeddings, idf, num_bytes)} (one tensor per sentence)
+
+        # Uniform weights, except for [SEP] and [CLS] (same as 'bert_score.score' without idf)
+        tokenizer = self.scorer._tokenizer
+        self.idf_dict = defaultdict(lambda: 1.0)
+        self.idf_dict[tokenizer.sep_token_id] = 0
+        self.idf_dict[tokenizer.cls_token_id] = 0
+
+    def _embed(self, lines):
+        from bert_score.utils import get_bert_embedding
+        return get_bert_embedding(lines, self.scorer._model, self.scorer._tokenizer, self.idf_dict,
+                                  batch_size=self.batch_size, device=self.scorer.device)
+
+    def _get_ref_embeddings(self, ref_lines):
+        key = hashlib.sha1('\n'.join(ref_lines).encode("utf-8")).hexdigest()
+        if key not in self.ref_cache:
+            # Embed by batches (only one batch is kept on the device)
+            embeddings, idf = [], []
+            for i in range(0, len(ref_lines), self.batch_size):
+                batch_embeddings, batch_masks, batch_idf = self._embed(ref_lines[i:i+self.batch_size])
+                batch_embeddings, batch_idf = batch_embeddings.cpu(), batch_idf.cpu()
+                for j, length in enumerate(batch_masks.sum(1).tolist()):  # Without padding
+                    embeddings.append(batch_embeddings[j, :length].clone())
+                    idf.append(batch_idf[j, :length].clone())
+            num_bytes = sum(t.numel() * t.element_size() for t in embeddings + idf)
+            self.ref_cache[key] = (embeddings, idf, num_bytes)
+
+            # Release the least recently used test sets (the last one is always kept)
+            while len(self.ref_cache) > 1 and sum(x[2] for x in self.ref_cache.values()) > self.max_cache_bytes:
+                self.ref_cache.popitem(last=False)
+        self.ref_cache.move_to_end(key)
+        return self.ref_cache[key][:2]
+
+    def score(self, src_lines, hyp_lines, ref_lines):
+        import torch
+        from torch.nn.utils.rnn import pad_sequence
+        from bert_score.utils import greedy_cos_idf
+
+        device = self.scorer.device
+        ref_embeddings, ref_idf = self._get_ref_embeddings(ref_lines)
+        precision, recall, f1 = [], [], []
+        with torch.no_grad():
+            for i in range(0, len(hyp_lines), self.batch_size):
+                hyp_emb, hyp_mask, hyp_idf = self._embed(hyp_lines[i:i+self.batch_size])
+
+                # Pad the references of this batch (new tensors: the embeddings and weights are normalized in place).
+                # Padding must not be zero (its norm is a division), but it is masked out
+                ref_lengths = torch.tensor([len(x) for x in ref_embeddings[i:i+self.batch_size]])
+                ref_emb = pad_sequence(ref_embeddings[i:i+self.batch_size], batch_first=True, padding_value=1.0).to(device)
+                ref_idf_i = pad_sequence(ref_idf[i:i+self.batch_size], batch_first=True)
+                ref_mask = (torch.arange(int(ref_lengths.max()))[None, :] < ref_lengths[:, None]).long().to(device)
+
+                p, r, f = greedy_cos_idf(ref_emb, ref_mask, ref_idf_i, hyp_emb, hyp_mask, hyp_idf)
+                precision.append(p.cpu())
+                recall.append(r.cpu())
+                f1.append(f.cpu())
+        precision, recall, f1 = torch.cat(precision), torch.cat(recall), torch.cat(f1)
+
+        return [{"name": "bertscore",
+                 "precision": float(precision.mean()),
+                 "recall": float(recall.mean()),
+                 "f1": float(f1.mean()),
+                 }]
+
+
+class CometScorer:
+    """COMET with the model downloaded and loaded once"""
+    def __init__(self, model_name="wmt20-comet-da", batch_size=64):
+        try:
+            import comet
+        except ImportError as e:
+            raise ImportError("'unbabel-comet' is not installed due to an incompatibility with 'pytorch-lightning'") from e
+        self.model = comet.load_from_checkpoint(comet.download_model(model_name))
+        self.batch_size = batch_size
+
+    def score(self, src_lines, hyp_lines, ref_lines):
+        data = [{"src": s, "mt": h, "ref": r} for s, h, r in zip(src_lines, hyp_lines, ref_lines)]
+        seg_scores, sys_score = self.model.predict(data, batch_size=self.batch_size)
+        return [{"name": "comet", "score": sys_score}]
+
+
+class HuggingFaceScorer:
+    """HuggingFace metric loaded once"""
+    def __init__(self, metric):
+        from datasets import load_metric  # https://huggingface.co/metrics
+        self.metric_name = metric
+        self.metric = load_metric(metric)
+
+    def score(self, src_lines, hyp_lines, ref_lines):
+        self.metric.add_batch(predictions=list(hyp_lines), references=[[x] for x in ref_lines])
+        d = {"name": self.metric_name}
+        d.update(self.metric.compute())
+        return [d]
+
+
+class MetricSession:
+    """
+    Registry of the model-based scorers of the process. Each scorer is created once per set of params and reused.
+    Scorers are pluggable: 'register(name, factory)', where 'factory(**params)' returns an object with a
+    'score(src_lines, hyp_lines, ref_lines)' method (e.g. a tiny local model for tests).
+    """
+    def __init__(self):
+        self.factories = {}
+        self.scorers = {}
+        self.lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self.lock:
+            self.factories[name] = factory
+            for key in [k for k in self.scorers if k[0] == name]:  # Release the scorers of the previous factory
+                del self.scorers[key]
+
+    def get(self, name, **params):
+        key = (name, tuple(sorted(params.items())))
+        with self.lock:
+            if key not in self.scorers:
+                if name not in self.factories:
+                    raise ValueError(f"Unknown scorer: '{name}'")
+                print(f"\t- [INFO]: Loading scorer: {name}")
+                self.scorers[key] = self.factories[name](**params)
+            return self.scorers[key]
+
+    def clear(self):
+        with self.lock:
+            self.scorers.clear()
+
+
+# Shared by all the evaluations of the process
+metric_session = MetricSession()
+metric_session.register("bertscore", BertScoreScorer)
+metric_session.register("comet", CometScorer)
+metric_session.register("huggingface", HuggingFaceScorer)
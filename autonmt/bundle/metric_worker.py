@@ -0,0 +1,62 @@
+import copy
+import multiprocessing as mp
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from autonmt.bundle.metrics import _sacrebleu_stats
+from autonmt.preprocessing.processors import decode_lines
+
+_worker_vocab = None
+
+
+def compute_bleu_stats(hyp_ids, ref_ids, trg_vocab):
+    # Decode lines (token ids => text)
+    hyp_lines = trg_vocab.decode_batch(hyp_ids)
+    ref_lines = trg_vocab.decode_batch(ref_ids)
+
+    # Full decoding (lines are stripped)
+    hyp_lines = decode_lines(hyp_lines, trg_vocab.lang, trg_vocab.subword_model, trg_vocab.pretok_flag, trg_vocab.spm_model)
+    ref_lines = decode_lines(ref_lines, trg_vocab.lang, trg_vocab.subword_model, trg_vocab.pretok_flag, trg_vocab.spm_model)
+    return _sacrebleu_stats(hyp_lines=hyp_lines, ref_lines=ref_lines)
+
+
+def _init_worker(trg_vocab):
+    global _worker_vocab
+    if trg_vocab.model_path:  # SentencePiece models are reloaded in the worker
+        trg_vocab._load_spm_model_from_path(trg_vocab.model_path)
+    _worker_vocab = trg_vocab
+
+
+def _compute_bleu_stats(hyp_ids, ref_ids):
+    return compute_bleu_stats(hyp_ids, ref_ids, trg_vocab=_worker_vocab)
+
+
+class MetricWorker:
+    """Decodes and scores the validation predictions (token ids) in a background process"""
+    def __init__(self, trg_vocab):
+        trg_vocab = copy.copy(trg_vocab)
+        trg_vocab.spm_model = None  # Not picklable (reloaded from 'model_path')
+        self.executor = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"),
+                                            initializer=_init_worker, initargs=(trg_vocab,))
+        self.jobs = defaultdict(list)  # {log_prefix: [future1, future2,...]}
+
+    def submit(self, log_prefix, hyp_ids, ref_ids):
+        self.jobs[log_prefix].append(self.executor.submit(_compute_bleu_stats, hyp_ids, ref_ids))
+
+    def pop_jobs(self):
+        # Jobs of the current validation epoch
+        jobs, self.jobs = dict(self.jobs), defaultdict(list)
+        return jobs
+
+    @staticmethod
+    def is_done(jobs):
+        return all(f.done() for futures in jobs.values() for f in futures)
+
+    @staticmethod
+    def gather(jobs):
+        # Sum the sufficient statistics of each batch (blocks until they are ready) => {log_prefix: stats}
+        return {log_prefix: [sum(x) for x in zip(*[f.result() for f in futures])]
+                for log_prefix, futures in jobs.items() if futures}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -2,11 +2,10 @@ import os.path
 
 from tqdm import tqdm
 
-import bert_score
 import sacrebleu
-from datasets import load_metric  # https://huggingface.co/metrics
 
 from autonmt.bundle import utils
+from autonmt.bundle.metric_session import metric_session
 
 
 def compute_sacrebleu(ref_file, hyp_file, output_file, metrics):
@@ -52,6 +51,27 @@ def _sacrebleu(hyp_lines, ref_lines, metrics, trg_lang="", tokenize=None):
     return scores
 
 
+def _sacrebleu_stats(hyp_lines, ref_lines, trg_lang="", tokenize=None):
+    # Sufficient statistics of BLEU (additive): [sys_len, ref_len, correct_1..n, total_1..n]
+    bleu = sacrebleu.metrics.BLEU(trg_lang=trg_lang, tokenize=tokenize)
+    score = bleu.corpus_score(hyp_lines, [ref_lines])
+    return [score.sys_len, score.ref_len] + list(score.counts) + list(score.totals)
+
+
+def _sacrebleu_from_stats(stats, trg_lang="", tokenize=None):
+    # Corpus BLEU from the accumulated sufficient statistics
+    stats = [int(x) for x in stats]
+    max_ngram_order = (len(stats) - 2) // 2
+    bleu = sacrebleu.metrics.BLEU(trg_lang=trg_lang, tokenize=tokenize)
+    score = bleu.compute_bleu(correct=stats[2:2 + max_ngram_order], total=stats[2 + max_ngram_order:],
+                              sys_len=stats[0], ref_len=stats[1], smooth_method=bleu.smooth_method,
+                              smooth_value=bleu.smooth_value, effective_order=bleu.effective_order,
+                              max_ngram_order=max_ngram_order)
+    d = score.__dict__
+    d["signature"] = str(bleu.get_signature())
+    return [d]
+
+
 def compute_bertscore(ref_file, hyp_file, output_file, trg_lang):
     # Read file
     ref_lines = utils.read_file_lines(ref_file, autoclean=True)
@@ -70,17 +90,8 @@ def compute_bertscore(ref_file, hyp_file, output_file, trg_lang):
 
 
 def _bertscore(hyp_lines, ref_lines, lang):
-    # Score
-    precision, recall, f1 = bert_score.score(hyp_lines, ref_lines, lang=lang)
-
-    scores = [
-        {"name": "bertscore",
-         "precision": float(precision.mean()),
-         "recall": float(recall.mean()),
-         "f1": float(f1.mean()),
-         }
-    ]
-    return scores
+    # The model is loaded once, and the reference embeddings are cached (see: 'metric_session')
+    return metric_session.get("bertscore", lang=lang).score(None, hyp_lines, ref_lines)
 
 
 def compute_comet(src_file, ref_file, hyp_file, output_file):
@@ -102,27 +113,8 @@ def compute_comet(src_file, ref_file, hyp_file, output_file):
 
 
 def _comet(src_lines, hyp_lines, ref_lines):
-    try:
-        import comet
-    except ImportError as e:
-        print("[WARNING]: 'unbabel-comet' is not installed due to an incompatibility with 'pytorch-lightning'")
-
-    # Get model
-    model_path = comet.download_model("wmt20-comet-da")
-    model = comet.load_from_checkpoint(model_path)
-
-    # Score
-    data = {"src": src_lines, "mt": hyp_lines, "ref": ref_lines}
-    data = [dict(zip(data, t)) for t in zip(*data.values())]
-    seg_scores, sys_score = model.predict(data)
-
-    scores = [
-        {"name": "comet",
-         # "seg_scores": seg_scores,
-         "score": sys_score,
-         }
-    ]
-    return scores
+    # The model is downloaded and loaded once (see: 'metric_session')
+    return metric_session.get("comet").score(src_lines, hyp_lines, ref_lines)
 
 
 def compute_fairseq(ref_file, hyp_file, output_file):
@@ -137,8 +129,6 @@ def compute_fairseq(ref_file, hyp_file, output_file):
 
 
 def compute_huggingface(src_file, hyp_file, ref_file, output_file, metrics, trg_lang):
-    scores = []
-
     if not metrics:
         return
 
@@ -147,32 +137,41 @@ def compute_huggingface(src_file, hyp_file, ref_file, output_file, metrics, trg_
     ref_lines = utils.read_file_lines(ref_file, autoclean=True)
     assert len(ref_lines) == len(hyp_lines)
 
+    # Compute scores
+    scores = _huggingface(hyp_lines, ref_lines, metrics)
+
+    # Save json
+    utils.save_json(scores, output_file)
+
+
+def _huggingface(hyp_lines, ref_lines, metrics):
+    scores = []
+
     # Load metric
     for metric in metrics:
         try:
-            # Tokenize sentences
-            hyp_lines_tok = [x for x in hyp_lines]
-            ref_lines_tok = [[x] for x in ref_lines]
-
-            # Compute score
-            hg_metric = load_metric(metric)
-            hg_metric.add_batch(predictions=hyp_lines_tok, references=ref_lines_tok)
-            result = hg_metric.compute()
-
-            # Format results
-            d = {
-                "name": metric,
-            }
-            d.update(result)
-
-            # Add results
-            scores.append(d)
+            # Compute score (the metric is loaded once)
+            scores += metric_session.get("huggingface", metric=metric).score(None, hyp_lines, ref_lines)
         except Exception as e:
             print(f"\t- [HUGGINGFACE ERROR]: Ignoring metric: {str(metric)}.\n"
                   f"\t                       Message: {str(e)}")
+    return scores
 
-    # Save json
-    utils.save_json(scores, output_file)
 
+def compute_scores(tool, src_lines, hyp_lines, ref_lines, metrics, trg_lang):
+    # Scores of a metric tool (the lines are already read)
+    if tool == "sacrebleu":
+        return _sacrebleu(hyp_lines, ref_lines, metrics)
+    elif tool == "bertscore":
+        return _bertscore(hyp_lines, ref_lines, trg_lang)
+    elif tool == "comet":
+        return _comet(src_lines, hyp_lines, ref_lines)
+    elif tool == "huggingface":
+        return _huggingface(hyp_lines, ref_lines, metrics)
+    raise ValueError(f"Unknown metric tool: '{tool}'")
 
 
+def save_scores(tool, output_file, src_lines, hyp_lines, ref_lines, metrics, trg_lang):
+    # Picklable job (see: 'BaseTranslator.score_beam')
+    scores = compute_scores(tool, src_lines, hyp_lines, ref_lines, metrics, trg_lang)
+    utils.save_json(scores, output_file)
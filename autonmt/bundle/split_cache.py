@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+from autonmt.bundle.utils import read_file_lines
+
+
+def filter_indices(filter_fn, src_lines, trg_lines, **kwargs):
+    """Indices of the pairs kept by 'filter_fn'. The filter must return a subsequence of the input pairs"""
+    f_src_lines, f_trg_lines = filter_fn(src_lines, trg_lines, **kwargs)
+
+    # Match the filtered pairs with the original ones (in order)
+    indices, j = [], 0
+    for i, (src_line, trg_line) in enumerate(zip(src_lines, trg_lines)):
+        if j < len(f_src_lines) and src_line == f_src_lines[j] and trg_line == f_trg_lines[j]:
+            indices.append(i)
+            j += 1
+    if j != len(f_src_lines):
+        raise ValueError("The filter function must return a subset of the input lines (in the same order)")
+    return np.array(indices, dtype=np.int64)
+
+
+class SplitCache:
+    """Reads each split once and caches the indices selected by each filter (per filter name).
+    Entries are keyed by the file modification times, so overwritten files are read again.
+    """
+    def __init__(self):
+        self.lines = {}
+        self.indices = {}
+
+    @staticmethod
+    def _get_key(*filenames):
+        return tuple((f, os.path.getmtime(f)) for f in filenames)
+
+    def get_lines(self, src_file, trg_file):
+        key = self._get_key(src_file, trg_file)
+        if key not in self.lines:
+            src_lines = read_file_lines(filename=src_file, autoclean=True)
+            trg_lines = read_file_lines(filename=trg_file, autoclean=True)
+            assert len(src_lines) == len(trg_lines)
+            self.lines[key] = (src_lines, trg_lines)
+        return self.lines[key]
+
+    def get_indices(self, src_file, trg_file, fn_name, filter_fn, **kwargs):
+        # No filter => all lines
+        if not filter_fn:
+            return None
+
+        key = (self._get_key(src_file, trg_file), fn_name, tuple(sorted(kwargs.items())))
+        if key not in self.indices:
+            src_lines, trg_lines = self.get_lines(src_file, trg_file)
+            self.indices[key] = filter_indices(filter_fn, src_lines, trg_lines, **kwargs)
+        return self.indices[key]
+
+    def get_view(self, src_file, trg_file, fn_name, filter_fn, **kwargs):
+        # Filtered lines (the original lines are shared)
+        src_lines, trg_lines = self.get_lines(src_file, trg_file)
+        indices = self.get_indices(src_file, trg_file, fn_name, filter_fn, **kwargs)
+        if indices is None:
+            return src_lines, trg_lines
+        return [src_lines[i] for i in indices], [trg_lines[i] for i in indices]
+
+    def clear(self):
+        self.lines.clear()
+        self.indices.clear()
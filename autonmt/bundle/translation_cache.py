@@ -0,0 +1,143 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+def model_fingerprint(model):
+    # Hash of the weights (independent of the checkpoint file they were loaded from)
+    h = hashlib.sha1()
+    for name, tensor in model.state_dict().items():
+        h.update(f"{name}:{tensor.dtype}".encode("utf-8"))
+        h.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())  # Any dtype (e.g. bf16)
+    return h.hexdigest()
+
+
+def vocab_fingerprint(vocab):
+    h = hashlib.sha1()
+    h.update(json.dumps([vocab.lang, vocab.subword_model, vocab.pretok_flag, vocab.max_tokens]).encode("utf-8"))
+    h.update('\n'.join(vocab.get_tokens()).encode("utf-8"))
+    return h.hexdigest()
+
+
+class TranslationCache:
+    """Tokenized translations ('hyp.tok' lines) keyed by model, vocabularies, decoding params and preprocessed source"""
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_prefix(model_hash, src_vocab, trg_vocab, **params):
+        # Everything but the source sentence (computed once per translation). See: 'model_fingerprint'
+        return json.dumps([model_hash, vocab_fingerprint(src_vocab), vocab_fingerprint(trg_vocab),
+                           sorted(params.items())])
+
+    @staticmethod
+    def make_key(prefix, src_line):
+        return hashlib.sha1(f"{prefix}\n{src_line}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        # {key: translation} (only hits)
+        found = self._get_many(keys)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def _get_many(self, keys):
+        raise NotImplementedError
+
+    def put_many(self, items):
+        raise NotImplementedError
+
+
+class LRUTranslationCache(TranslationCache):
+    """In-memory cache. The least recently used entries are evicted beyond 'max_size'"""
+    def __init__(self, max_size=100000):
+        super().__init__()
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _get_many(self, keys):
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.data:
+                    self.data.move_to_end(key)
+                    found[key] = self.data[key]
+        return found
+
+    def put_many(self, items):
+        with self.lock:
+            for key, value in items:
+                self.data[key] = value
+                self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class SQLiteTranslationCache(TranslationCache):
+    """On-disk cache, shared across runs (and processes)"""
+    def __init__(self, filename, chunk_size=500):
+        super().__init__()
+        self.filename = filename
+        self.chunk_size = chunk_size  # SQLite limits the number of query params
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def _get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        with self.lock:
+            for i in range(0, len(keys), self.chunk_size):
+                chunk = keys[i:i+self.chunk_size]
+                query = f"SELECT key, value FROM translations WHERE key IN ({','.join('?' * len(chunk))})"
+                found.update(self.conn.execute(query, chunk).fetchall())
+        return found
+
+    def put_many(self, items):
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO translations (key, value) VALUES (?, ?)", list(items))
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+def translate_with_cache(src_lines, translate_fn, cache=None, prefix=""):
+    """
+    Translates each unique line once and reuses the cached translations.
+    'translate_fn' receives the indices of the lines to translate and returns their translations (in order)
+    """
+    # Unique lines (first occurrence)
+    unique = {}
+    for i, line in enumerate(src_lines):
+        unique.setdefault(line, i)
+
+    # Cached translations
+    keys = {line: TranslationCache.make_key(prefix, line) for line in unique}
+    found = cache.get_many(list(keys.values())) if cache is not None else {}
+
+    # Translate the rest
+    missing = [line for line in unique if keys[line] not in found]
+    if missing:
+        translations = translate_fn([unique[line] for line in missing])
+        new_items = [(keys[line], translation) for line, translation in zip(missing, translations)]
+        found.update(new_items)
+        if cache is not None:
+            cache.put_many(new_items)
+
+    # Fan out
+    return [found[keys[line]] for line in src_lines]
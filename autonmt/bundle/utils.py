@@ -415,6 +415,16 @@ def text2hex(text, return_str=False):
     return res
 
 
+def text2bytes(text):
+    # Bytes (UTF-8) of a line: "Hola" => b'Hola' (used as tokens by the "bytes" subword model)
+    return text.strip().encode('utf-8')
+
+
+def bytes2tokens(text):
+    # Bytes of a line as vocabulary pieces: "Hi" => ['0x48', '0x69']
+    return [f'0x{byte:02x}' for byte in text2bytes(text)]
+
+
 def hex2text(hex_values, return_str=False):
     # Converts each hexadecimal code point to its Unicode character.
     if isinstance(hex_values, str):
@@ -0,0 +1,4 @@
+from autonmt.modules.datasets.seq2seq_dataset import Seq2SeqDataset
+from autonmt.modules.datasets.streaming_dataset import StreamingSeq2SeqDataset
+from autonmt.modules.datasets.multi_corpus_dataset import MultiCorpusDataset
+from autonmt.modules.datasets.prefetch_loader import PrefetchDataLoader
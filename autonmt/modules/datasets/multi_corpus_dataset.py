@@ -0,0 +1,38 @@
+import bisect
+
+from torch.utils.data import Dataset
+
+
+class MultiCorpusDataset(Dataset):
+    """Several parallel corpora (e.g. one per language pair) read in place, without merging their files.
+    All the corpora must be encoded with the same vocabularies. See: 'TemperatureSampler'
+    """
+    def __init__(self, datasets, names=None):
+        if not datasets:
+            raise ValueError("At least one dataset is required")
+        self.datasets = list(datasets)
+        self.names = list(names) if names else [str(i) for i in range(len(self.datasets))]
+        assert len(self.names) == len(self.datasets)
+
+        # Set vocabs (shared)
+        self.src_vocab = self.datasets[0].src_vocab
+        self.trg_vocab = self.datasets[0].trg_vocab
+
+        # Global index => (corpus, local index)
+        self.sizes = [len(ds) for ds in self.datasets]
+        self.offsets = [0]
+        for size in self.sizes:
+            self.offsets.append(self.offsets[-1] + size)
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getitem__(self, idx):
+        corpus_idx = bisect.bisect_right(self.offsets, idx) - 1
+        return self.datasets[corpus_idx][idx - self.offsets[corpus_idx]]
+
+    def collate_fn(self, batch, **kwargs):
+        return self.datasets[0].collate_fn(batch, **kwargs)
+
+    def get_collate_fn(self, max_tokens, packing=False, pack_size=None):
+        return self.datasets[0].get_collate_fn(max_tokens, packing=packing, pack_size=pack_size)
@@ -0,0 +1,80 @@
+import queue
+import threading
+import weakref
+
+from torch.utils.data import DataLoader
+
+_END = object()
+
+
+class _ExceptionWrapper:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def _put(q, stop_event, item):
+    # Wait for a free slot (unless the consumer has stopped)
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _prefetch(iterator, q, stop_event):
+    # The thread must not reference the prefetcher (otherwise it is never collected if the iteration is abandoned)
+    try:
+        for batch in iterator:  # Collate (and pin memory) off the training thread
+            if not _put(q, stop_event, batch):
+                return
+    except Exception as e:
+        _put(q, stop_event, _ExceptionWrapper(e))
+    _put(q, stop_event, _END)
+
+
+class _ThreadPrefetcher:
+    """Iterates a DataLoader iterator in a background thread, keeping up to 'num_batches' batches ready.
+    The thread stops (and releases the DataLoader iterator) when the prefetcher is closed or garbage collected.
+    """
+    def __init__(self, iterator, num_batches):
+        self.queue = queue.Queue(maxsize=max(num_batches, 1))
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=_prefetch, args=(iterator, self.queue, self.stop_event), daemon=True)
+        self._finalizer = weakref.finalize(self, self.stop_event.set)
+        self.thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self.queue.get()
+        if item is _END:
+            self.thread.join()
+            raise StopIteration
+        elif isinstance(item, _ExceptionWrapper):
+            raise item.exc
+        return item
+
+    def close(self):
+        self._finalizer()
+
+
+class PrefetchDataLoader(DataLoader):
+    """DataLoader that prepares the next 'prefetch_batches' batches in a background thread.
+    Unlike the worker processes, the thread shares the dataset and vocabularies with the training process.
+    """
+    def __init__(self, *args, prefetch_batches=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prefetch_batches = prefetch_batches
+        self._prefetcher = None  # Weak reference to the last iterator
+
+    def __iter__(self):
+        # Stop the previous iteration (e.g. abandoned by the sanity check, 'limit_*_batches' or 'max_steps')
+        prefetcher = self._prefetcher() if self._prefetcher is not None else None
+        if prefetcher is not None:
+            prefetcher.close()
+        prefetcher = _ThreadPrefetcher(super().__iter__(), num_batches=self.prefetch_batches)
+        self._prefetcher = weakref.ref(prefetcher)
+        return prefetcher
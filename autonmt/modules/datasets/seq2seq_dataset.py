@@ -1,3 +1,4 @@
+import copy
 import numpy as np
 import functools
 import torch
@@ -8,7 +9,8 @@ from itertools import compress
 from autonmt.bundle.utils import read_file_lines
 
 class Seq2SeqDataset(Dataset):
-    def __init__(self, file_prefix, src_lang, trg_lang, src_vocab=None, trg_vocab=None, filter_fn=None, **kwargs):
+    def __init__(self, file_prefix, src_lang, trg_lang, src_vocab=None, trg_vocab=None, filter_fn=None,
+                 split_cache=None, filter_name=None, **kwargs):
         # Set vocabs
         self.src_vocab = src_vocab
         self.trg_vocab = trg_vocab
@@ -17,54 +19,66 @@ class Seq2SeqDataset(Dataset):
         src_file_path = file_prefix.strip() + f".{src_lang}"
         trg_file_path = file_prefix.strip() + f".{trg_lang}"
 
-        # Read files
-        self.src_lines = read_file_lines(filename=src_file_path, autoclean=True)
-        self.trg_lines = read_file_lines(filename=trg_file_path, autoclean=True)
+        # Read files (or reuse them, and filter them with a view of indices)
+        self.indices = None
+        if split_cache is not None:
+            self.src_lines, self.trg_lines = split_cache.get_lines(src_file_path, trg_file_path)
+            self.indices = split_cache.get_indices(src_file_path, trg_file_path, filter_name, filter_fn)
+        else:
+            self.src_lines = read_file_lines(filename=src_file_path, autoclean=True)
+            self.trg_lines = read_file_lines(filename=trg_file_path, autoclean=True)
 
-        # Filter langs
-        if filter_fn:
-            self.src_lines, self.trg_lines = filter_fn(self.src_lines, self.trg_lines)
+            # Filter langs
+            if filter_fn:
+                self.src_lines, self.trg_lines = filter_fn(self.src_lines, self.trg_lines)
 
         assert len(self.src_lines) == len(self.trg_lines)
 
     def __len__(self):
-        return len(self.src_lines)
+        return len(self.src_lines) if self.indices is None else len(self.indices)
 
     def __getitem__(self, idx):
+        if self.indices is not None:
+            idx = self.indices[idx]
         src_line, trg_line = self.src_lines[idx], self.trg_lines[idx]
         return src_line, trg_line
 
-    def collate_fn(self, batch, max_tokens=None, **kwargs):
-        x_encoded, y_encoded = [], []
-        x_max_len = y_max_len = 0
-
-        # Add elements to batch
-        for i, (x, y) in enumerate(batch):
-            # Encode tokens
-            _x = self.src_vocab.encode(x)
-            _y = self.trg_vocab.encode(y)
-
-            # Control tokens in batch
-            x_max_len = max(x_max_len, len(_x))
-            y_max_len = max(y_max_len, len(_y))
-
-            # Add elements
-            if max_tokens is None or (i+1)*(x_max_len+y_max_len) <= max_tokens:  # sample*size
-                x_encoded.append(torch.tensor(_x, dtype=torch.long))
-                y_encoded.append(torch.tensor(_y, dtype=torch.long))
-            else:
+    def subset(self, idxs):
+        # View of some samples (the lines are shared)
+        view = copy.copy(self)
+        idxs = np.asarray(idxs, dtype=np.int64)
+        view.indices = idxs if self.indices is None else self.indices[idxs]
+        return view
+
+    def collate_fn(self, batch, max_tokens=None, packing=False, pack_size=None, **kwargs):
+        # Encode tokens: (B, L) padded ids
+        x_ids, x_lens = self.src_vocab.encode_batch([x for x, _ in batch])
+        y_ids, y_lens = self.trg_vocab.encode_batch([y for _, y in batch])
+
+        # Control tokens in batch: sample*size
+        num_samples = len(batch)
+        if max_tokens is not None:
+            batch_tokens = np.arange(1, num_samples+1) * (np.maximum.accumulate(x_lens) + np.maximum.accumulate(y_lens))
+            exceeded = batch_tokens > max_tokens
+            if exceeded.any():
+                num_samples = int(exceeded.argmax())
                 msg = "[WARNING] Dropping {:.2f}% of the batch because the maximum number of tokens ({}) was exceeded"
-                drop_ratio = 1 - ((i+1)/len(batch))
+                drop_ratio = 1 - ((num_samples+1)/len(batch))
                 print(msg.format(drop_ratio, max_tokens))
-                break
+
+        # Pack multiple pairs per row (optional)
+        if packing:
+            x_encoded = [torch.from_numpy(x_ids[i, :x_lens[i]]) for i in range(num_samples)]
+            y_encoded = [torch.from_numpy(y_ids[i, :y_lens[i]]) for i in range(num_samples)]
+            return self._pack_batch(x_encoded, y_encoded, pack_size=pack_size)
 
         # Get lengths
-        x_len = torch.tensor([len(x) for x in x_encoded], dtype=torch.long)
-        y_len = torch.tensor([len(y) for y in y_encoded], dtype=torch.long)
+        x_len = torch.from_numpy(x_lens[:num_samples])
+        y_len = torch.from_numpy(y_lens[:num_samples])
 
-        # Pad sequence
-        x_padded = pad_sequence(x_encoded, batch_first=False, padding_value=self.src_vocab.pad_id).T
-        y_padded = pad_sequence(y_encoded, batch_first=False, padding_value=self.trg_vocab.pad_id).T
+        # Remove extra padding (dropped samples)
+        x_padded = torch.from_numpy(np.ascontiguousarray(x_ids[:num_samples, :int(x_len.max())]))
+        y_padded = torch.from_numpy(np.ascontiguousarray(y_ids[:num_samples, :int(y_len.max())]))
 
         # Sort these tensors pairs by the length of x_len
         # if sort_within_batch:
@@ -74,10 +88,47 @@ class Seq2SeqDataset(Dataset):
         #     y_padded = y_padded[x_idx]
 
         # Check stuff
-        assert x_padded.shape[0] == y_padded.shape[0] == len(x_encoded)  # Control samples
+        assert x_padded.shape[0] == y_padded.shape[0] == num_samples  # Control samples
         assert max_tokens is None or (x_padded.numel() + y_padded.numel()) <= max_tokens  # Control max tokens
         return (x_padded, y_padded), (x_len, y_len)
 
-    def get_collate_fn(self, max_tokens):
-        return functools.partial(self.collate_fn, max_tokens=max_tokens)
+    def _pack_batch(self, x_encoded, y_encoded, pack_size=None):
+        # By default, rows are not longer than the longest sentences of the batch
+        x_max_len = pack_size if pack_size else max([len(x) for x in x_encoded])
+        y_max_len = pack_size if pack_size else max([len(y) for y in y_encoded])
+
+        # First-fit decreasing: [idxs, x_len, y_len]
+        rows = []
+        for i in sorted(range(len(x_encoded)), key=lambda i: len(x_encoded[i]) + len(y_encoded[i]), reverse=True):
+            x_len_i, y_len_i = len(x_encoded[i]), len(y_encoded[i])
+            for row in rows:
+                if row[1] + x_len_i <= x_max_len and row[2] + y_len_i <= y_max_len:
+                    row[0].append(i)
+                    row[1] += x_len_i
+                    row[2] += y_len_i
+                    break
+            else:
+                rows.append([[i], x_len_i, y_len_i])
+
+        # Concatenate pairs and keep the segment of each token (1, 2,...; 0=padding)
+        x_packed, y_packed, x_segments, y_segments = [], [], [], []
+        for idxs, _, _ in rows:
+            x_packed.append(torch.cat([x_encoded[i] for i in idxs]))
+            y_packed.append(torch.cat([y_encoded[i] for i in idxs]))
+            x_segments.append(torch.cat([torch.full((len(x_encoded[i]),), s, dtype=torch.long) for s, i in enumerate(idxs, 1)]))
+            y_segments.append(torch.cat([torch.full((len(y_encoded[i]),), s, dtype=torch.long) for s, i in enumerate(idxs, 1)]))
+
+        # Get lengths
+        x_len = torch.tensor([len(x) for x in x_packed], dtype=torch.long)
+        y_len = torch.tensor([len(y) for y in y_packed], dtype=torch.long)
+
+        # Pad sequences
+        x_padded = pad_sequence(x_packed, batch_first=True, padding_value=self.src_vocab.pad_id)
+        y_padded = pad_sequence(y_packed, batch_first=True, padding_value=self.trg_vocab.pad_id)
+        x_seg = pad_sequence(x_segments, batch_first=True, padding_value=0)
+        y_seg = pad_sequence(y_segments, batch_first=True, padding_value=0)
+        return (x_padded, y_padded), (x_len, y_len), (x_seg, y_seg)
+
+    def get_collate_fn(self, max_tokens, packing=False, pack_size=None):
+        return functools.partial(self.collate_fn, max_tokens=max_tokens, packing=packing, pack_size=pack_size)
 
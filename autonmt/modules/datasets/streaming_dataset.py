@@ -0,0 +1,218 @@
+import math
+import mmap
+import os
+
+import numpy as np
+import torch.distributed as dist
+from torch.utils.data import IterableDataset, get_worker_info
+
+from autonmt.bundle.eval_cache import fn_fingerprint
+from autonmt.bundle.split_cache import filter_indices
+from autonmt.bundle.utils import clean_file_line
+from autonmt.modules.datasets.seq2seq_dataset import Seq2SeqDataset
+
+
+def build_line_offsets(filename, chunk_size=2**26, force_overwrite=False):
+    """Byte offsets of the beginning of each line (+ the file size). Cached next to the file ('.offsets.npy')"""
+    offsets_file = filename + ".offsets.npy"
+    if not force_overwrite and os.path.exists(offsets_file) and os.path.getmtime(offsets_file) >= os.path.getmtime(filename):
+        return np.load(offsets_file, mmap_mode="r")
+
+    # Find line breaks (by chunks, so the file is never fully loaded)
+    file_size = os.path.getsize(filename)
+    offsets = [np.zeros(1, dtype=np.int64)]
+    if file_size:
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, file_size, chunk_size):
+                chunk = np.frombuffer(mm, dtype=np.uint8, count=min(chunk_size, file_size - start), offset=start)
+                offsets.append(np.flatnonzero(chunk == ord('\n')).astype(np.int64) + start + 1)
+                del chunk  # Release the buffer before closing the mmap
+    offsets = np.concatenate(offsets)
+    if offsets[-1] != file_size:  # Last line without line break
+        offsets = np.append(offsets, file_size)
+
+    # Save offsets
+    np.save(offsets_file, offsets)
+    return np.load(offsets_file, mmap_mode="r")
+
+
+def _read_lines(mm, offsets, line_ids):
+    return [clean_file_line(mm[offsets[i]:offsets[i+1]]) for i in line_ids]
+
+
+def build_filtered_line_ids(src_file, trg_file, filter_fn, chunk_size=100000, force_overwrite=False):
+    """Ids of the lines kept by 'filter_fn' (applied by chunks). Cached next to the src file ('.<filter>.ids.npy')"""
+    ids_file = src_file + f".{fn_fingerprint(filter_fn)[:16]}.ids.npy"
+    last_mtime = max(os.path.getmtime(src_file), os.path.getmtime(trg_file))
+    if not force_overwrite and os.path.exists(ids_file) and os.path.getmtime(ids_file) >= last_mtime:
+        return np.load(ids_file, mmap_mode="r")
+
+    # Filter lines (by chunks, so the files are never fully loaded)
+    src_offsets, trg_offsets = build_line_offsets(src_file), build_line_offsets(trg_file)
+    num_lines = len(src_offsets) - 1
+    line_ids = [np.zeros(0, dtype=np.int64)]
+    with open(src_file, 'rb') as fs, open(trg_file, 'rb') as ft, \
+            mmap.mmap(fs.fileno(), 0, access=mmap.ACCESS_READ) as src_mm, \
+            mmap.mmap(ft.fileno(), 0, access=mmap.ACCESS_READ) as trg_mm:
+        for start in range(0, num_lines, chunk_size):
+            chunk_ids = range(start, min(start + chunk_size, num_lines))
+            src_lines, trg_lines = _read_lines(src_mm, src_offsets, chunk_ids), _read_lines(trg_mm, trg_offsets, chunk_ids)
+            line_ids.append(filter_indices(filter_fn, src_lines, trg_lines) + start)
+    line_ids = np.concatenate(line_ids)
+
+    # Save ids (atomic, all the ranks build the same index)
+    tmp_file = f"{ids_file}.{os.getpid()}.tmp.npy"
+    np.save(tmp_file, line_ids)
+    os.replace(tmp_file, ids_file)
+    return np.load(ids_file, mmap_mode="r")
+
+
+class StreamingSeq2SeqDataset(IterableDataset):
+    """Streams the (encoded) src/trg files from memory-mapped files, so the corpus does not need to fit in RAM.
+    The files are split into shards of 'shard_size' lines that are distributed across DDP ranks and DataLoader workers,
+    and the samples of each stream are shuffled within a buffer of 'shuffle_buffer_size' samples.
+    """
+    def __init__(self, file_prefix, src_lang, trg_lang, src_vocab=None, trg_vocab=None, filter_fn=None,
+                 shard_size=10000, shuffle_buffer_size=10000, shuffle=True, seed=0, **kwargs):
+        # Set vocabs
+        self.src_vocab = src_vocab
+        self.trg_vocab = trg_vocab
+
+        # Get src/trg file paths
+        self.src_file_path = file_prefix.strip() + f".{src_lang}"
+        self.trg_file_path = file_prefix.strip() + f".{trg_lang}"
+
+        # Streaming params
+        self.filter_fn = filter_fn  # Applied once, when the lines are indexed
+        self.shard_size = shard_size
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.num_replicas = None
+        self.rank = None
+        self.skip = None  # Resume mid-epoch: (num_batches, batch_size)
+
+        # Index lines (only the offsets are kept)
+        src_offsets = build_line_offsets(self.src_file_path)
+        trg_offsets = build_line_offsets(self.trg_file_path)
+        assert len(src_offsets) == len(trg_offsets)
+
+        # Shards are made of the lines that pass the filter, so all the streams get the same number of samples
+        self._line_ids = None
+        if filter_fn and len(src_offsets) > 1:
+            self.num_lines = len(build_filtered_line_ids(self.src_file_path, self.trg_file_path, filter_fn))
+        else:
+            self.num_lines = len(src_offsets) - 1
+        self.num_shards = max(math.ceil(self.num_lines / self.shard_size), 1)
+
+        # Mapped files are opened lazily by each worker
+        self._src_offsets = self._trg_offsets = self._src_mm = self._trg_mm = None
+
+    def __getstate__(self):
+        # Do not pickle the mapped files (DataLoader workers)
+        state = self.__dict__.copy()
+        state.update(_src_offsets=None, _trg_offsets=None, _src_mm=None, _trg_mm=None, _line_ids=None)
+        return state
+
+    def _open(self):
+        if self._src_mm is None:
+            self._src_offsets = build_line_offsets(self.src_file_path)
+            self._trg_offsets = build_line_offsets(self.trg_file_path)
+            if self.filter_fn and self.num_lines:
+                self._line_ids = build_filtered_line_ids(self.src_file_path, self.trg_file_path, self.filter_fn)
+            with open(self.src_file_path, 'rb') as f:
+                self._src_mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.src_file_path) else b""
+            with open(self.trg_file_path, 'rb') as f:
+                self._trg_mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.trg_file_path) else b""
+
+    def _get_replicas(self):
+        num_replicas, rank = self.num_replicas, self.rank
+        if num_replicas is None or rank is None:
+            is_distributed = dist.is_available() and dist.is_initialized()
+            num_replicas = dist.get_world_size() if is_distributed else 1
+            rank = dist.get_rank() if is_distributed else 0
+        return num_replicas, rank
+
+    def set_epoch(self, epoch):
+        # Must be called from the main process (the DataLoader workers get a copy of the dataset)
+        self.epoch = epoch
+        self.num_replicas, self.rank = self._get_replicas()
+        self.skip = None
+
+    def skip_batches(self, num_batches, batch_size):
+        # Skip the batches already seen in this epoch (only for the next iteration)
+        self.skip = (num_batches, batch_size)
+
+    def state_dict(self, num_batches, batch_size):
+        return {"epoch": self.epoch, "num_batches": num_batches, "batch_size": batch_size}
+
+    def load_state_dict(self, state):
+        # Resume only if the checkpoint was saved in the middle of the current epoch
+        if state and state["epoch"] == self.epoch:
+            self.skip_batches(state["num_batches"], state["batch_size"])
+
+    def _read_shard(self, shard_idx):
+        start, end = shard_idx * self.shard_size, min((shard_idx + 1) * self.shard_size, self.num_lines)
+        line_ids = self._line_ids[start:end].tolist() if self._line_ids is not None else range(start, end)
+        src_lines = _read_lines(self._src_mm, self._src_offsets, line_ids)
+        trg_lines = _read_lines(self._trg_mm, self._trg_offsets, line_ids)
+        return zip(src_lines, trg_lines)
+
+    def _iter_samples(self, stream_id, num_streams, rng):
+        # Shuffle shards (same order for all streams)
+        shards = np.random.default_rng([self.seed, self.epoch]).permutation(self.num_shards).tolist() \
+            if self.shuffle else list(range(self.num_shards))
+
+        # Same number of shards per stream (repeat the first ones) and same number of samples (the last shard is shorter)
+        shards_per_stream = math.ceil(len(shards) / num_streams)
+        shards = (shards * math.ceil(shards_per_stream * num_streams / len(shards)))[:shards_per_stream * num_streams]
+        last_shard_size = self.num_lines - (self.num_shards - 1) * self.shard_size
+        max_samples = shards_per_stream * self.shard_size - (self.shard_size - last_shard_size)
+
+        # Shuffle samples within a bounded buffer
+        buffer, num_samples = [], 0
+        for shard_idx in shards[stream_id::num_streams]:
+            for sample in self._read_shard(shard_idx):
+                if num_samples >= max_samples:
+                    break
+                num_samples += 1
+                if not self.shuffle:
+                    yield sample
+                elif len(buffer) < self.shuffle_buffer_size:
+                    buffer.append(sample)
+                else:
+                    i = rng.integers(len(buffer))
+                    yield buffer[i]
+                    buffer[i] = sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def __iter__(self):
+        self._open()
+
+        # Batches are fetched from the workers in order (round-robin), always starting from the first worker. So, when
+        # resuming, the workers continue the streams of the previous workers rotated by the number of batches seen
+        worker_info = get_worker_info()
+        num_workers, worker_id = (worker_info.num_workers, worker_info.id) if worker_info else (1, 0)
+        num_skip = 0
+        if self.skip:
+            num_batches, batch_size = self.skip
+            worker_id = (worker_id + num_batches) % num_workers
+            num_skip = len(range(worker_id, num_batches, num_workers)) * batch_size
+            self.skip = None
+
+        # Each (rank, worker) reads its own shards
+        num_replicas, rank = self._get_replicas()
+        num_streams, stream_id = num_replicas * num_workers, rank * num_workers + worker_id
+
+        # Deterministic stream (needed to resume)
+        rng = np.random.default_rng([self.seed, self.epoch, stream_id])
+        for i, sample in enumerate(self._iter_samples(stream_id, num_streams, rng)):
+            if i >= num_skip:
+                yield sample
+
+    # The collate function is shared with the map-style dataset
+    collate_fn = Seq2SeqDataset.collate_fn
+    _pack_batch = Seq2SeqDataset._pack_batch
+    get_collate_fn = Seq2SeqDataset.get_collate_fn
@@ -1,3 +1,5 @@
 from autonmt.modules.layers.generic_pos_emb import PositionalEmbedding
 from autonmt.modules.layers.learned_pos_emb import LearnedPositionalEmbedding
 from autonmt.modules.layers.sinusoidal_pos_emb import SinusoidalPositionalEmbedding
+from autonmt.modules.layers.adaptive_softmax import AdaptiveSoftmax, compute_adaptive_cutoffs
+from autonmt.modules.layers.segments import segment_positions, segment_attention_mask
@@ -0,0 +1,57 @@
+import numpy as np
+import torch
+import torch.nn as nn
+
+
+def compute_adaptive_cutoffs(frequencies, coverages=(0.8, 0.95), num_special_tokens=4):
+    """Computes the adaptive softmax cutoffs from the token frequencies (indexed by vocab id).
+    Returns the cutoffs (in frequency ranks) and the vocab ids sorted by frequency (special tokens first).
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+
+    # Sort tokens by frequency, but keep the special tokens in the head (<s>, </s>,...)
+    sort_keys = frequencies.copy()
+    sort_keys[:num_special_tokens] = np.inf
+    token_order = np.argsort(-sort_keys, kind="stable")
+
+    # Place a cutoff where the cumulative frequency reaches each coverage
+    coverage = np.cumsum(frequencies[token_order]) / max(frequencies.sum(), 1.0)
+    cutoffs = {int(np.searchsorted(coverage, c)) + 1 for c in coverages}
+    cutoffs = sorted([c for c in cutoffs if num_special_tokens < c < len(frequencies) - 1])
+    return cutoffs, token_order.tolist()
+
+
+class AdaptiveSoftmax(nn.Module):
+    """Adaptive softmax output layer (Grave et al., 2017) that works with the original vocab ids.
+    The forward returns the full log-probabilities so that it can be used as a regular output layer, but the
+    loss and the predictions can be computed without evaluating all the tail clusters.
+    """
+    def __init__(self, in_features, n_classes, cutoffs, token_order=None, div_value=4.0):
+        super().__init__()
+        self.in_features = in_features
+        self.n_classes = n_classes
+        self.asm = nn.AdaptiveLogSoftmaxWithLoss(in_features, n_classes, cutoffs=list(cutoffs), div_value=div_value)
+
+        # Mapping between vocab ids and frequency ranks (the adaptive softmax expects sorted classes)
+        rank2id = torch.arange(n_classes) if token_order is None else torch.as_tensor(token_order, dtype=torch.long)
+        id2rank = torch.empty_like(rank2id).scatter_(0, rank2id, torch.arange(n_classes))
+        self.register_buffer("rank2id", rank2id)
+        self.register_buffer("id2rank", id2rank)
+
+    def forward(self, x):
+        # (..., H) => (..., V) log-probabilities in vocab order
+        shape = x.shape[:-1]
+        log_probs = self.asm.log_prob(x.reshape(-1, self.in_features))
+        log_probs = log_probs.index_select(1, self.id2rank)
+        return log_probs.reshape(*shape, self.n_classes)
+
+    def loss(self, x, target):
+        # (N, H), (N) => mean negative log-likelihood
+        _, loss = self.asm(x.reshape(-1, self.in_features), self.id2rank[target.reshape(-1)])
+        return loss
+
+    def predict(self, x):
+        # (..., H) => (...) most probable vocab ids
+        shape = x.shape[:-1]
+        ranks = self.asm.predict(x.reshape(-1, self.in_features))
+        return self.rank2id[ranks].reshape(shape)
@@ -13,7 +13,7 @@ class PositionalEmbedding(nn.Module):
         else:
             self.pos_emb = SinusoidalPositionalEmbedding(num_embeddings, embedding_dim, padding_idx)
 
-    def forward(self, x):
-        output = self.pos_emb(x)
+    def forward(self, x, positions=None):
+        output = self.pos_emb(x, positions=positions)
         return output
 
@@ -8,8 +8,11 @@ class LearnedPositionalEmbedding(nn.Embedding):
         self.ori_padding_idx = padding_idx
         super().__init__(num_embeddings, embedding_dim, padding_idx=0)
 
-    def forward(self, x):
+    def forward(self, x, positions=None):
         # 1, 2, 3,... but 0 where padding is.
         mask = x.ne(self.ori_padding_idx).int()  # 1 1 1 1 0 0 0
-        positions = (torch.cumsum(mask, dim=1).type_as(mask) * mask).long()  # 1 2 3 4 0 0 0
+        if positions is None:
+            positions = (torch.cumsum(mask, dim=1).type_as(mask) * mask).long()  # 1 2 3 4 0 0 0
+        else:  # Custom positions (e.g. packed sequences): 0 1 0 1 2 => 1 2 1 2 3
+            positions = ((positions + 1) * mask).long()
         return super().forward(positions)
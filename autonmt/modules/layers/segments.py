@@ -0,0 +1,21 @@
+import torch
+
+
+def segment_positions(segments):
+    """Positions that restart at the beginning of each segment: (B, L) => (B, L)
+    Segment ids start at 1 for each row (0 is padding): 1 1 1 2 2 0 => 0 1 2 0 1 0
+    """
+    idxs = torch.arange(segments.shape[1], device=segments.device).unsqueeze(0).expand_as(segments)
+    starts = torch.ones_like(segments, dtype=torch.bool)
+    starts[:, 1:] = segments[:, 1:] != segments[:, :-1]
+    start_idxs = torch.cummax(torch.where(starts, idxs, torch.zeros_like(idxs)), dim=1).values
+    return (idxs - start_idxs) * (segments != 0)
+
+
+def segment_attention_mask(q_segments, k_segments, num_heads):
+    """Block-diagonal attention mask (True = not allowed): (B, Lq), (B, Lk) => (B*num_heads, Lq, Lk)
+    Padding queries can attend everything to avoid fully-masked rows (NaNs). Their outputs are ignored.
+    """
+    mask = q_segments.unsqueeze(2) != k_segments.unsqueeze(1)
+    mask &= (q_segments != 0).unsqueeze(2)
+    return mask.repeat_interleave(num_heads, dim=0)
@@ -23,11 +23,14 @@ class SinusoidalPositionalEmbedding(nn.Module):
 
         self.register_buffer("_float_tensor", torch.FloatTensor(1))
 
-    def forward(self, x):
-        """Input is expected to be of size [bsz x seqlen]."""
+    def forward(self, x, positions=None):
+        """Input is expected to be of size [bsz x seqlen]. Positions (optional) must have the same size."""
         bsz, seq_len = x.shape
         self.emb = self.emb.to(self._float_tensor)
 
         mask = x.ne(self.ori_padding_idx).int().unsqueeze(2)  # 1 1 1 1 0 0 0
-        pos = torch.tile(self.emb[:x.size(1), :].unsqueeze(0), (bsz, 1, 1))
+        if positions is None:
+            pos = torch.tile(self.emb[:x.size(1), :].unsqueeze(0), (bsz, 1, 1))
+        else:  # Custom positions (e.g. packed sequences)
+            pos = self.emb[positions]
         return pos*mask
@@ -0,0 +1,2 @@
+from autonmt.modules.losses.chunked_cross_entropy import ChunkedCrossEntropyLoss
+from autonmt.modules.losses.adaptive_softmax_loss import AdaptiveSoftmaxLoss
@@ -0,0 +1,30 @@
+import torch
+import torch.nn as nn
+
+from autonmt.modules.layers.adaptive_softmax import AdaptiveSoftmax
+
+
+class AdaptiveSoftmaxLoss(nn.Module):
+    """Negative log-likelihood computed by an adaptive softmax output layer (no full logits are needed)"""
+    def __init__(self, ignore_index):
+        super().__init__()
+        self.ignore_index = ignore_index
+
+    def forward(self, features, target, projection):
+        if not isinstance(projection, AdaptiveSoftmax):
+            raise ValueError("The 'adaptive_softmax' criterion requires a model with an adaptive softmax output layer "
+                             "(see 'adaptive_softmax_cutoffs')")
+
+        # Flatten tokens: (B, L, H) => (B*L, H)
+        batch_size, length = target.shape
+        features = features.reshape(batch_size * length, -1)
+        target = target.reshape(-1)
+
+        # Ignore padding
+        mask = target != self.ignore_index
+        loss = projection.loss(features[mask], target[mask])
+
+        # Predictions: (B*L) => (B, L)
+        with torch.no_grad():
+            predictions = projection.predict(features.detach()).reshape(batch_size, length)
+        return loss, predictions
@@ -0,0 +1,47 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+
+class ChunkedCrossEntropyLoss(nn.Module):
+    """Cross-entropy computed from the decoder features in chunks of tokens.
+    The (B, L, V) logits are never materialized: each chunk is projected, scored and discarded, and its
+    activations are recomputed during the backward pass.
+    """
+    def __init__(self, ignore_index, chunk_size=1024):
+        super().__init__()
+        self.ignore_index = ignore_index
+        self.chunk_size = chunk_size if chunk_size else 1024
+
+    def _chunk_loss(self, features, target, projection):
+        logits = projection(features)  # (N, H) => (N, V)
+        loss = F.cross_entropy(logits, target, ignore_index=self.ignore_index, reduction="sum")
+        predictions = logits.detach().argmax(-1)
+        return loss, predictions
+
+    def forward(self, features, target, projection):
+        # Flatten tokens: (B, L, H) => (B*L, H)
+        batch_size, length = target.shape
+        features = features.reshape(batch_size * length, -1)
+        target = target.reshape(-1)
+
+        # Compute the loss chunk by chunk (recomputing the projection in backward)
+        loss = features.new_zeros(())
+        predictions = []
+        for i in range(0, features.shape[0], self.chunk_size):
+            features_i, target_i = features[i:i + self.chunk_size], target[i:i + self.chunk_size]
+            if torch.is_grad_enabled() and features_i.requires_grad:
+                loss_i, predictions_i = checkpoint(self._chunk_loss, features_i, target_i, projection, use_reentrant=False)
+            else:
+                loss_i, predictions_i = self._chunk_loss(features_i, target_i, projection)
+            loss = loss + loss_i
+            predictions.append(predictions_i)
+
+        # Mean over the non-ignored tokens (same as nn.CrossEntropyLoss)
+        num_tokens = (target != self.ignore_index).sum().clamp(min=1)
+        loss = loss / num_tokens
+
+        # Predictions: (B*L) => (B, L)
+        predictions = torch.cat(predictions).reshape(batch_size, length)
+        return loss, predictions
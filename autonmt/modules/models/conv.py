@@ -67,7 +67,7 @@ class Conv(LitSeq2Seq):
                                               kernel_size=decoder_kernel_size)
                                     for _ in range(decoder_layers)])
         self.decoder_dropout = nn.Dropout(decoder_dropout)
-        self.output_layer = nn.Linear(decoder_embed_dim, trg_vocab_size)
+        self.output_layer = self.build_output_layer(decoder_embed_dim)
 
 
     def forward_encoder(self, x, x_len, **kwargs):
@@ -90,10 +90,7 @@ class Conv(LitSeq2Seq):
         # Convolutional blocks
         conved = None  # Dummy placeholder
         for i, conv in enumerate(self.encoder_convs):
-            conved = self.encoder_dropout(conv_input)  # (B, hid dim, L)
-            conved = conv(conved)  # (B, 2 * hid dim, L)
-            conved = F.glu(conved, dim=1)  # Reduce hid dim by half: (B, hid dim, L)
-            conved = (conved + conv_input) * self.encoder_scale  # Residual connection
+            conved = self.checkpoint_layer(self._encoder_block, conv, conv_input)  # (B, hid dim, L)
             conv_input = conved  # Set input for next layer
 
         # Permute and convert back from hid dim to emb dim
@@ -103,6 +100,31 @@ class Conv(LitSeq2Seq):
 
         return None, (conved, combined)
 
+    def _encoder_block(self, conv, conv_input):
+        conved = self.encoder_dropout(conv_input)  # (B, hid dim, L)
+        conved = conv(conved)  # (B, 2 * hid dim, L)
+        conved = F.glu(conved, dim=1)  # Reduce hid dim by half: (B, hid dim, L)
+        conved = (conved + conv_input) * self.encoder_scale  # Residual connection
+        return conved
+
+    def _decoder_block(self, conv, conv_input, y_emb, encoder_conved, encoder_combined):
+        batch_size = conv_input.shape[0]
+        conv_input = self.decoder_dropout(conv_input)  # (B, hid dim, L)
+
+        # Pad the input so decoder can't look ahead: Pad => (B, hid dim, K-1) + Conv => (B, hid dim, L)
+        padding = torch.zeros(batch_size, self.decoder_hidden_dim, self.decoder_kernel_size - 1).fill_(self.padding_idx).to(conv_input.device)
+        padded_conv_input = torch.cat((padding, conv_input), dim=2)  # (B, hid dim, L + K - 1)
+
+        conved = conv(padded_conv_input)  # (B, 2 * hid dim, L)
+        conved = F.glu(conved, dim=1)  # Reduce hid dim by half: (B, hid dim, L)
+
+        # Calculate attention
+        attention, conved = self.calculate_attention(y_emb, conved, encoder_conved, encoder_combined)
+
+        # apply residual connection
+        conved = (conved + conv_input) * self.decoder_scale  # Residual connection
+        return conved
+
     def calculate_attention(self, y_emb, conved, encoder_conved, encoder_combined):
         conved_emb = self.decoder_attn_hid2emb(conved.permute(0, 2, 1))
         combined = (conved_emb + y_emb) * self.decoder_scale
@@ -134,26 +156,16 @@ class Conv(LitSeq2Seq):
 
         conved = None  # Dummy placeholder
         for i, conv in enumerate(self.decoder_convs):
-            conv_input = self.decoder_dropout(conv_input)  # (B, hid dim, L)
-
-            # Pad the input so decoder can't look ahead: Pad => (B, hid dim, K-1) + Conv => (B, hid dim, L)
-            padding = torch.zeros(batch_size, self.decoder_hidden_dim, self.decoder_kernel_size - 1).fill_(self.padding_idx).to(y.device)
-            padded_conv_input = torch.cat((padding, conv_input), dim=2)  # (B, hid dim, L + K - 1)
-
-            conved = conv(padded_conv_input)  # (B, 2 * hid dim, L)
-            conved = F.glu(conved, dim=1)  # Reduce hid dim by half: (B, hid dim, L)
-
-            # Calculate attention
-            attention, conved = self.calculate_attention(y_emb, conved, encoder_conved, encoder_combined)
-
-            # apply residual connection
-            conved = (conved + conv_input) * self.decoder_scale  # Residual connection
+            conved = self.checkpoint_layer(self._decoder_block, conv, conv_input, y_emb, encoder_conved, encoder_combined)
             conv_input = conved  # Set input for next layer
 
         # Permute and convert back from hid dim to emb dim
         conved = conved.permute(0, 2, 1)  # (B, hid dim, L) => (B, L, hid dim)
         conved = self.decoder_hid2emb(conved)  # (B, L, emb dim)
-        output = self.output_layer(self.decoder_dropout(conved))  # (B, L, vocab size)
+        conved = self.decoder_dropout(conved)
+        if kwargs.get("features_only"):  # The output layer is applied by the criterion
+            return conved, (encoder_conved, encoder_combined)
+        output = self.output_layer(conved)  # (B, L, vocab size)
 
         return output, (encoder_conved, encoder_combined)  # Return state for compatibility
 
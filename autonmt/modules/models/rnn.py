@@ -47,7 +47,7 @@ class SimpleRNN(LitSeq2Seq):
         self.trg_embeddings = nn.Embedding(trg_vocab_size, decoder_embed_dim)
         self.enc_dropout = nn.Dropout(encoder_dropout)
         self.dec_dropout = nn.Dropout(decoder_dropout)
-        self.output_layer = nn.Linear(decoder_hidden_dim, trg_vocab_size)
+        self.output_layer = self.build_output_layer(decoder_hidden_dim)
 
         # RNN
         base_rnn = self.get_base_rnn(self.base_rnn)
@@ -96,7 +96,7 @@ class SimpleRNN(LitSeq2Seq):
         # output: (length, batch, hidden_dim * n_directions)
         # hidden: (n_layers * n_directions, batch, hidden_dim)
         # cell: (n_layers * n_directions, batch, hidden_dim)
-        output, states = self.encoder_rnn(x_emb)
+        output, states = self.checkpoint_layer(self.encoder_rnn, x_emb)
 
         # Unpack sequence
         if self.packed_sequence:
@@ -121,6 +121,8 @@ class SimpleRNN(LitSeq2Seq):
         output, states = self.decoder_rnn(y_emb, states)
 
         # Get output: (batch, 1-length, hidden_dim * n_directions) => (batch, 1-length, trg_vocab_size)
+        if kwargs.get("features_only"):  # The output layer is applied by the criterion
+            return output, states
         output = self.output_layer(output)
         return output, states
 
@@ -135,13 +137,18 @@ class SimpleRNN(LitSeq2Seq):
         x_pad_mask = (x != self.padding_idx) if self.packed_sequence else None  # Mask padding
         trg_length = y.shape[1]
         for t in range(trg_length):
-            outputs_t, states = self.forward_decoder(y=y_pred, y_len=y_len, states=states, x_pad_mask=x_pad_mask, **kwargs)  # (B, L, E)
+            outputs_t, states = self.checkpoint_layer(self.forward_decoder, y=y_pred, y_len=y_len, states=states, x_pad_mask=x_pad_mask, **kwargs)  # (B, L, E)
             outputs.append(outputs_t)  # (B, L, V)
 
             # Next input?
             teacher_force = random.random() < self.teacher_forcing_ratio
-            top1 = outputs_t.argmax(2)  # Get most probable next-word (logits)
-            y_pred = y[:, t] if teacher_force else top1  # Use ground-truth or predicted word
+            if teacher_force:
+                y_pred = y[:, t]  # Use ground-truth
+            elif kwargs.get("features_only"):
+                with torch.no_grad():
+                    y_pred = self.output_layer(outputs_t).argmax(2)  # Get most probable next-word (logits)
+            else:
+                y_pred = outputs_t.argmax(2)  # Get most probable next-word (logits)
 
         # Concatenate outputs (B, 1, V) => (B, L, V)
         outputs = torch.concat(outputs, 1)
@@ -162,7 +169,7 @@ class ContextRNN(SimpleRNN):
                                     num_layers=self.decoder_n_layers,
                                     dropout=self.decoder_dropout,
                                     bidirectional=self.decoder_bidirectional, batch_first=True)
-        self.output_layer = nn.Linear(self.decoder_embed_dim + self.decoder_hidden_dim * 2, self.trg_vocab_size)
+        self.output_layer = self.build_output_layer(self.decoder_embed_dim + self.decoder_hidden_dim * 2)
 
     def forward_encoder(self, x, x_len, **kwargs):
         output, states = super().forward_encoder(x, x_len)
@@ -204,6 +211,8 @@ class ContextRNN(SimpleRNN):
         output = torch.cat((y_emb, tmp_hidden, tmp_context), dim=2)
 
         # Get output: (batch, length, hidden_dim * n_directions) => (batch, length, trg_vocab_size)
+        if kwargs.get("features_only"):  # The output layer is applied by the criterion
+            return output, (states, context)
         output = self.output_layer(output)
         return output, (states, context)
 
@@ -229,8 +238,7 @@ class AttentionRNN(SimpleRNN):
 
         self.enc_ffn = nn.Linear(self.encoder_hidden_dim * self.encoder_n_layers * 2,
                                  self.decoder_hidden_dim * self.decoder_n_layers)
-        self.output_layer = nn.Linear(self.decoder_embed_dim + self.decoder_hidden_dim + self.encoder_hidden_dim * 2,
-                                      self.trg_vocab_size)
+        self.output_layer = self.build_output_layer(self.decoder_embed_dim + self.decoder_hidden_dim + self.encoder_hidden_dim * 2)
 
     def forward_encoder(self, x, x_len, **kwargs):
         # input: (B, L) =>
@@ -280,6 +288,8 @@ class AttentionRNN(SimpleRNN):
 
         # Get output: => (B, 1-length, H+H+H)
         output = torch.cat((output, weighted, y_emb), dim=2)
+        if kwargs.get("features_only"):  # The output layer is applied by the criterion
+            return output, (states, enc_outputs)
         output = self.output_layer(output)  # (B, 1, H+H+H) => (B, 1, V)
 
         return output, (states, enc_outputs)  # pass enc_outputs (trick)
@@ -1,10 +1,13 @@
+import torch
 import torch.nn as nn
 
-from autonmt.modules.layers import PositionalEmbedding
+from autonmt.modules.layers import PositionalEmbedding, segment_positions, segment_attention_mask
 from autonmt.modules.seq2seq import LitSeq2Seq
 
 
 class Transformer(LitSeq2Seq):
+    supports_packing = True
+
     def __init__(self,
                  src_vocab_size, trg_vocab_size,
                  encoder_embed_dim=256,
@@ -38,7 +41,7 @@ class Transformer(LitSeq2Seq):
                                           dim_feedforward=encoder_ffn_embed_dim,
                                           dropout=dropout,
                                           activation=activation_fn)
-        self.output_layer = nn.Linear(encoder_embed_dim, trg_vocab_size)
+        self.output_layer = self.build_output_layer(encoder_embed_dim)
         self.input_dropout = nn.Dropout(dropout)
 
         # Checks
@@ -46,33 +49,59 @@ class Transformer(LitSeq2Seq):
         assert encoder_attention_heads == decoder_attention_heads
         assert encoder_ffn_embed_dim == decoder_ffn_embed_dim
 
-    def forward_encoder(self, x, x_len, **kwargs):
+    def forward_encoder(self, x, x_len, x_seg=None, **kwargs):
         assert x.shape[1] <= self.max_src_positions
 
-        # Encode src
-        x_pos = self.src_pos_embeddings(x)
+        # Encode src (positions restart at each segment for packed sequences)
+        x_pos = self.src_pos_embeddings(x, positions=segment_positions(x_seg) if x_seg is not None else None)
         x_emb = self.src_embeddings(x)
         x_emb = (x_emb + x_pos).transpose(0, 1)
 
-        state = self.transformer.encoder(src=x_emb, mask=None, src_key_padding_mask=None)
+        # Make src mask (packed sequences only)
+        src_mask = segment_attention_mask(x_seg, x_seg, self.transformer.nhead) if x_seg is not None else None
+
+        if self.gradient_checkpointing and self.training:
+            state = x_emb
+            for layer in self.transformer.encoder.layers:
+                state = self.checkpoint_layer(layer, state, src_mask=src_mask, src_key_padding_mask=None)
+            if self.transformer.encoder.norm is not None:
+                state = self.transformer.encoder.norm(state)
+        else:
+            state = self.transformer.encoder(src=x_emb, mask=src_mask, src_key_padding_mask=None)
         return None, state
 
-    def forward_decoder(self, y, y_len, states, **kwargs):
+    def forward_decoder(self, y, y_len, states, y_seg=None, x_seg=None, **kwargs):
         assert y.shape[1] <= self.max_trg_positions
 
-        # Encode trg
-        y_pos = self.trg_pos_embeddings(y)
+        # Encode trg (positions restart at each segment for packed sequences)
+        y_pos = self.trg_pos_embeddings(y, positions=segment_positions(y_seg) if y_seg is not None else None)
         y_emb = self.trg_embeddings(y)
         y_emb = (y_emb + y_pos).transpose(0, 1)
 
         # Make trg mask
-        tgt_mask = self.transformer.generate_square_subsequent_mask(y_emb.shape[0]).to(y_emb.device)
+        memory_mask = None
+        if y_seg is None:
+            tgt_mask = self.transformer.generate_square_subsequent_mask(y_emb.shape[0]).to(y_emb.device)
+        else:  # Packed sequences: causal + block-diagonal masks (True = not allowed)
+            causal_mask = torch.triu(torch.ones(y.shape[1], y.shape[1], dtype=torch.bool, device=y.device), diagonal=1)
+            tgt_mask = segment_attention_mask(y_seg, y_seg, self.transformer.nhead) | causal_mask
+            memory_mask = segment_attention_mask(y_seg, x_seg, self.transformer.nhead)
 
-        output = self.transformer.decoder(tgt=y_emb, memory=states, tgt_mask=tgt_mask, memory_mask=None,
-                                          tgt_key_padding_mask=None, memory_key_padding_mask=None)
+        if self.gradient_checkpointing and self.training:
+            output = y_emb
+            for layer in self.transformer.decoder.layers:
+                output = self.checkpoint_layer(layer, output, states, tgt_mask=tgt_mask, memory_mask=memory_mask,
+                                               tgt_key_padding_mask=None, memory_key_padding_mask=None)
+            if self.transformer.decoder.norm is not None:
+                output = self.transformer.decoder.norm(output)
+        else:
+            output = self.transformer.decoder(tgt=y_emb, memory=states, tgt_mask=tgt_mask, memory_mask=memory_mask,
+                                              tgt_key_padding_mask=None, memory_key_padding_mask=None)
 
         # Get output
         output = output.transpose(0, 1)
+        if kwargs.get("features_only"):  # The output layer is applied by the criterion
+            return output, states
         output = self.output_layer(output)
         return output, states  # Return state for compatibility
 
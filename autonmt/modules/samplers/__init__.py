@@ -1,3 +1,5 @@
 from autonmt.modules.samplers.sequential import SequentialIterator
 from autonmt.modules.samplers.random import RandomIterator
 from autonmt.modules.samplers.bucket import BucketIterator
+from autonmt.modules.samplers.distributed_bucket import DistributedBucketBatchSampler
+from autonmt.modules.samplers.temperature import TemperatureSampler
@@ -0,0 +1,108 @@
+import math
+
+import numpy as np
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+
+
+class DistributedBucketBatchSampler(Sampler):
+    """Batch sampler that groups samples of similar length and shards the batches across ranks.
+    All ranks shuffle the batches with the same seed (and epoch), and get the same number of batches (the first buckets
+    are repeated at the end if needed; see 'num_unique_batches'). If 'num_replicas' or 'rank' are not set, they are
+    read from the process group when iterating.
+    'sort_key' can return a tuple of lengths (e.g. (src_len, trg_len)). Then, the token budget of a batch is
+    'num_samples * sum(max_lengths)', the same as in 'Seq2SeqDataset.collate_fn'.
+    """
+    def __init__(self, data_source, batch_size, sort_key, max_tokens=None, shuffle=True, sort_within_batch=False,
+                 num_replicas=None, rank=None, seed=0, drop_last=False):
+        super().__init__()
+        self.data_source = data_source
+        self.batch_size = batch_size
+        self.sort_key = sort_key
+        self.max_tokens = max_tokens
+        self.shuffle = shuffle
+        self.sort_within_batch = sort_within_batch
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+        # Sort indices by the specified key (e.g., sequence length). Tuples are sorted by their total length
+        self.lengths = np.array([sort_key(x, y) for x, y in self.data_source], dtype=np.int64)
+        self.lengths = self.lengths.reshape(len(self.lengths), -1) if len(self.lengths) else np.zeros((0, 1), dtype=np.int64)
+        self.total_lengths = self.lengths.sum(1)
+        self.sorted_indices = np.argsort(self.total_lengths, kind="stable")
+
+        # Create buckets of indices (fixed number of samples or token budget)
+        self.buckets = self._make_buckets()
+
+    def _make_buckets(self):
+        lengths = self.lengths.tolist()
+        buckets, bucket, bucket_max_lens = [], [], [0] * self.lengths.shape[1]
+        for idx in self.sorted_indices.tolist():
+            max_lens = [max(a, b) for a, b in zip(bucket_max_lens, lengths[idx])]
+            exceeds_tokens = self.max_tokens and (len(bucket) + 1) * sum(max_lens) > self.max_tokens
+            if bucket and (len(bucket) == self.batch_size or exceeds_tokens):
+                buckets.append(bucket)
+                bucket, max_lens = [], lengths[idx]
+            bucket.append(idx)
+            bucket_max_lens = max_lens
+        if bucket:
+            buckets.append(bucket)
+        return buckets
+
+    def _get_replicas(self):
+        num_replicas, rank = self.num_replicas, self.rank
+        if num_replicas is None:
+            num_replicas = dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+        if rank is None:
+            rank = dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"Invalid rank {rank} (num_replicas={num_replicas})")
+        return num_replicas, rank
+
+    def _num_batches(self, num_replicas):
+        if self.drop_last:
+            return len(self.buckets) // num_replicas
+        else:
+            return math.ceil(len(self.buckets) / num_replicas)
+
+    def num_unique_batches(self):
+        # Batches of this rank that are not repeated (the repeated ones are always the last ones)
+        num_replicas, rank = self._get_replicas()
+        total_size = self._num_batches(num_replicas) * num_replicas
+        return len(range(rank, min(len(self.buckets), total_size), num_replicas))
+
+    def set_epoch(self, epoch):
+        # Called by Lightning at the beginning of each epoch (same shuffling for all ranks)
+        self.epoch = epoch
+
+    def __iter__(self):
+        num_replicas, rank = self._get_replicas()
+        num_batches = self._num_batches(num_replicas)
+
+        # Shuffle buckets (deterministic across ranks)
+        order = list(range(len(self.buckets)))
+        if self.shuffle:
+            g = torch.Generator()
+            g.manual_seed(self.seed + self.epoch)
+            order = torch.randperm(len(self.buckets), generator=g).tolist()
+
+        # Equal number of batches per rank (repeat the first buckets or drop the last ones)
+        total_size = num_batches * num_replicas
+        if total_size > len(order):
+            order += (order * math.ceil(total_size / max(len(order), 1)))[:total_size - len(order)]
+        order = order[:total_size]
+
+        # Shard buckets
+        for i in order[rank:total_size:num_replicas]:
+            bucket = self.buckets[i]
+            if self.sort_within_batch:
+                bucket = sorted(bucket, key=lambda idx: self.total_lengths[idx], reverse=True)
+            yield list(bucket)
+
+    def __len__(self):
+        num_replicas, _ = self._get_replicas()
+        return self._num_batches(num_replicas)
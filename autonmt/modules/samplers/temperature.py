@@ -0,0 +1,79 @@
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+class TemperatureSampler(Sampler):
+    """Samples the corpora of a 'MultiCorpusDataset' with probabilities proportional to size^(1/T).
+    T=1 keeps the natural distribution, and larger temperatures upsample the low-resource corpora (T=inf => uniform).
+    Optionally, the number of tokens drawn per epoch from each corpus can be capped ('token_budgets': {name: tokens}).
+    """
+    def __init__(self, data_source, temperature=1.0, num_samples=None, token_budgets=None, sort_key=None, seed=0):
+        super().__init__()
+        self.data_source = data_source
+        self.temperature = temperature
+        self.num_samples = num_samples if num_samples else len(data_source)
+        self.token_budgets = token_budgets if token_budgets else {}
+        self.seed = seed
+        self.epoch = 0
+
+        # Check budgets
+        unknown = set(self.token_budgets.keys()) - set(data_source.names)
+        if unknown:
+            raise ValueError(f"Unknown corpora in 'token_budgets': {', '.join(sorted(unknown))}")
+        if self.token_budgets and sort_key is None:
+            raise ValueError("'sort_key' is needed to compute the token budgets")
+
+        # Lengths of the corpora with a token budget
+        self.lengths = {}
+        for name, ds in zip(data_source.names, data_source.datasets):
+            if name in self.token_budgets:
+                self.lengths[name] = np.array([sort_key(x, y) for x, y in ds])
+
+        self.indices = self._sample()
+
+    def get_probabilities(self):
+        sizes = np.array(self.data_source.sizes, dtype=np.float64)
+        weights = sizes ** (1.0 / self.temperature)
+        return weights / weights.sum()
+
+    def set_temperature(self, temperature):
+        # The mixing ratios can be changed between epochs
+        self.temperature = temperature
+        self.indices = self._sample()
+
+    def set_epoch(self, epoch):
+        # Called by Lightning at the beginning of each epoch
+        self.epoch = epoch
+        self.indices = self._sample()
+
+    def _sample(self):
+        rng = np.random.default_rng([self.seed, self.epoch])
+        counts = np.round(self.get_probabilities() * self.num_samples).astype(np.int64)
+
+        indices = []
+        for name, ds_size, offset, count in zip(self.data_source.names, self.data_source.sizes, self.data_source.offsets, counts):
+            if not ds_size:
+                continue
+
+            # Without replacement (repeat the corpus if it is upsampled)
+            reps = int(np.ceil(count / ds_size))
+            local_idxs = np.concatenate([rng.permutation(ds_size) for _ in range(reps)])[:count] if reps else np.array([], dtype=np.int64)
+
+            # Cap the number of tokens
+            if name in self.token_budgets:
+                num_tokens = np.cumsum(self.lengths[name][local_idxs])
+                local_idxs = local_idxs[num_tokens <= self.token_budgets[name]]
+            indices.append(local_idxs + offset)
+
+        # Mix corpora
+        indices = np.concatenate(indices) if indices else np.array([], dtype=np.int64)
+        g = torch.Generator()
+        g.manual_seed(self.seed + self.epoch)
+        return indices[torch.randperm(len(indices), generator=g).numpy()].tolist()
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def __len__(self):
+        return len(self.indices)
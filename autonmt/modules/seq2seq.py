@@ -5,14 +5,23 @@ from collections import defaultdict
 import pytorch_lightning as pl
 import torch
 from torch import nn
-
-from autonmt.bundle.metrics import _sacrebleu  # TODO: I don't like this
+from torch.utils.checkpoint import checkpoint
+
+from autonmt.bundle.metrics import _sacrebleu_from_stats  # TODO: I don't like this
+from autonmt.bundle.metric_worker import MetricWorker, compute_bleu_stats
+from autonmt.modules.datasets.streaming_dataset import StreamingSeq2SeqDataset
+from autonmt.modules.layers import AdaptiveSoftmax
+from autonmt.modules.losses import ChunkedCrossEntropyLoss, AdaptiveSoftmaxLoss
+from autonmt.modules.samplers.distributed_bucket import DistributedBucketBatchSampler
 from autonmt.preprocessing.processors import decode_lines
 
 
 class LitSeq2Seq(pl.LightningModule):
+    supports_packing = False  # Multiple sentences per row (block-diagonal attention)
 
-    def __init__(self, src_vocab_size, trg_vocab_size, padding_idx, packed_sequence=False, architecture=None, **kwargs):
+    def __init__(self, src_vocab_size, trg_vocab_size, padding_idx, packed_sequence=False, architecture=None,
+                 adaptive_softmax_cutoffs=None, adaptive_softmax_token_order=None, adaptive_softmax_div_value=4.0,
+                 **kwargs):
         super().__init__()
         self.src_vocab_size = src_vocab_size
         self.trg_vocab_size = trg_vocab_size
@@ -20,6 +29,11 @@ class LitSeq2Seq(pl.LightningModule):
         self.packed_sequence = packed_sequence  # Use for RNNs and to "sort within batches"
         self.architecture = architecture if architecture else self.__class__.__name__
 
+        # Output layer: Adaptive softmax (optional)
+        self.adaptive_softmax_cutoffs = adaptive_softmax_cutoffs
+        self.adaptive_softmax_token_order = adaptive_softmax_token_order  # Vocab ids sorted by frequency
+        self.adaptive_softmax_div_value = adaptive_softmax_div_value
+
         # Hyperparams (PyTorch Lightning stuff)
         self.strategy = None
         self.optimizer = None
@@ -27,11 +41,20 @@ class LitSeq2Seq(pl.LightningModule):
         self.weight_decay = None
         self.criterion_fn = None
         self.regularization_fn = None
+        self.gradient_checkpointing = False  # Recompute the activations of each layer during the backward
 
         # Other
-        self.save_hyperparameters()
+        self.save_hyperparameters(ignore=["adaptive_softmax_token_order"])  # Stored as a buffer of the output layer
         self.best_scores = defaultdict(float)
-        self.validation_step_outputs = defaultdict(list)
+        self.validation_step_outputs = defaultdict(list)  # Samples to print (if requested)
+        self.validation_metric_stats = {}  # Sufficient statistics per validation prefix (e.g. BLEU n-gram counts)
+        self.validation_num_samples = defaultdict(int)
+        self.metric_worker = None  # Background process for the validation metrics (optional)
+        self.pending_val_metrics = []  # Async jobs of previous validation epochs (in order)
+        self.train_step_stats = None  # Device accumulators: [loss_sum, num_steps, num_errors, num_tokens]
+        self.train_epoch_stats = None
+        self.streaming_state = None  # Position of the streaming dataset (restored from a checkpoint)
+        self._streaming_tds = None  # Streaming training dataset (set by the toolkit)
 
     @abstractmethod
     def forward_encoder(self, x, x_len, **kwargs):
@@ -45,6 +68,22 @@ class LitSeq2Seq(pl.LightningModule):
     def forward_enc_dec(self, x, x_len, y, y_len, **kwargs):
         pass
 
+    def checkpoint_layer(self, layer, *args, **kwargs):
+        # Trade compute for memory (training only)
+        if self.gradient_checkpointing and self.training and torch.is_grad_enabled():
+            return checkpoint(layer, *args, use_reentrant=False, **kwargs)
+        else:
+            return layer(*args, **kwargs)
+
+    def build_output_layer(self, in_features):
+        # Dense layer (default) or adaptive softmax (for large vocabularies)
+        if self.adaptive_softmax_cutoffs:
+            return AdaptiveSoftmax(in_features, self.trg_vocab_size, cutoffs=self.adaptive_softmax_cutoffs,
+                                   token_order=self.adaptive_softmax_token_order,
+                                   div_value=self.adaptive_softmax_div_value)
+        else:
+            return nn.Linear(in_features, self.trg_vocab_size)
+
     def count_parameters(self):
         # Get model params
         trainable_params = sum(p.numel() for p in self.parameters() if p.requires_grad)
@@ -79,12 +118,16 @@ class LitSeq2Seq(pl.LightningModule):
         else:
             return self.optimizer
 
-    def configure_criterion(self, criterion):
+    def configure_criterion(self, criterion, chunk_size=None):
         # Set criterion
         if isinstance(criterion, str):
             criterion_key = criterion.lower().strip()
             if criterion_key == "cross_entropy":
                 self.criterion_fn = nn.CrossEntropyLoss(ignore_index=self.padding_idx)
+            elif criterion_key == "chunked_cross_entropy":  # Does not materialize the (B, L, V) logits
+                self.criterion_fn = ChunkedCrossEntropyLoss(ignore_index=self.padding_idx, chunk_size=chunk_size)
+            elif criterion_key == "adaptive_softmax":  # Requires an adaptive softmax output layer
+                self.criterion_fn = AdaptiveSoftmaxLoss(ignore_index=self.padding_idx)
             else:
                 raise ValueError(f"Unknown value '{criterion}' for criterion")
         else:
@@ -92,18 +135,111 @@ class LitSeq2Seq(pl.LightningModule):
 
     def training_step(self, batch, batch_idx, dataloader_idx=None):
         loss, _ = self._step(batch, batch_idx, log_prefix=f"train")
+
+        # Reduce the training metrics every N steps (avoids a host-device sync per step)
+        interval = self._train_metrics_interval or self.trainer.log_every_n_steps
+        if (batch_idx + 1) % max(interval, 1) == 0:
+            self._log_train_metrics(self.train_step_stats, suffix="_step")
+            self.train_step_stats.zero_()
         return loss
 
+    def on_train_start(self):
+        # Also needed when resuming mid-epoch ('on_train_epoch_start' is not called)
+        self.train_step_stats = torch.zeros(4, device=self.device)
+        self.train_epoch_stats = torch.zeros(4, device=self.device)
+        self.streaming_state = None  # The first iterator has already been created
+
+    def on_train_epoch_start(self):
+        self.train_step_stats = torch.zeros(4, device=self.device)
+        self.train_epoch_stats = torch.zeros(4, device=self.device)
+
+        # Streaming datasets: Shuffle by epoch
+        if self._streaming_tds is not None:
+            self._streaming_tds.set_epoch(self.current_epoch)
+
+    def _restore_streaming_tds(self):
+        # Lightning creates the first iterator before 'on_train_epoch_start' (and not again when resuming), so the
+        # epoch and the batches already seen must be set before
+        if self._streaming_tds is not None:
+            self._streaming_tds.set_epoch(self.streaming_state["epoch"] if self.streaming_state else 0)
+            self._streaming_tds.load_state_dict(self.streaming_state)
+
+    def on_save_checkpoint(self, checkpoint):
+        train_loader = self.trainer.train_dataloader
+        if isinstance(getattr(train_loader, "dataset", None), StreamingSeq2SeqDataset):
+            batch_progress = self.trainer.fit_loop.epoch_loop.batch_progress
+            num_batches = batch_progress.current.processed  # Also counts the batch of 'on_train_batch_end'
+            state = train_loader.dataset.state_dict(num_batches, batch_size=train_loader.batch_size)
+            if batch_progress.is_last_batch:  # Resume from the beginning of the next epoch
+                state.update(epoch=state["epoch"] + 1, num_batches=0)
+            checkpoint["streaming_state"] = state
+
+    def on_load_checkpoint(self, checkpoint):
+        self.streaming_state = checkpoint.get("streaming_state")
+        self._restore_streaming_tds()
+
+    def on_train_epoch_end(self):
+        self._log_train_metrics(self.train_epoch_stats, suffix="_epoch")
+
     def validation_step(self, batch, batch_idx, dataloader_idx=None):
         eval_prefix = "val"
         if dataloader_idx is not None:
             fn_name, _ = self._filter_eval[dataloader_idx]
             eval_prefix += "_" + fn_name
-        loss, outputs = self._step(batch, batch_idx, log_prefix=eval_prefix)
-        self.validation_step_outputs[dataloader_idx].append(outputs)
+        repeated = self._is_repeated_val_batch(batch_idx, dataloader_idx)
+        loss, outputs = self._step(batch, batch_idx, log_prefix=eval_prefix, repeated=repeated)
+        if outputs:
+            self.validation_step_outputs[dataloader_idx].append(outputs)
         return loss, outputs
 
+    def _is_repeated_val_batch(self, batch_idx, dataloader_idx):
+        # The distributed bucketing sampler repeats the first buckets so that all ranks get the same number of batches
+        val_loaders = self.trainer.val_dataloaders
+        val_loader = val_loaders[dataloader_idx or 0] if isinstance(val_loaders, (list, tuple)) else val_loaders
+        batch_sampler = getattr(val_loader, "batch_sampler", None)
+        if isinstance(batch_sampler, DistributedBucketBatchSampler):
+            return batch_idx >= batch_sampler.num_unique_batches()
+        return False
+
+    def on_fit_start(self):
+        # Streaming datasets: Start from the first epoch or from the checkpoint (if loaded before this hook)
+        self._restore_streaming_tds()
+
+        # Decode and score the validation predictions in the background (optional)
+        if self._async_val_metrics and not self._skip_val_metrics:
+            self.metric_worker = MetricWorker(self._trg_vocab)
+
+    def on_fit_end(self):
+        # Wait for the remaining validation metrics
+        if self.metric_worker:
+            self._flush_val_metrics(wait=True)
+            self.metric_worker.shutdown()
+            self.metric_worker = None
+
+    def on_train_batch_end(self, outputs, batch, batch_idx):
+        # Log the async validation metrics as soon as they are ready
+        if self.pending_val_metrics:
+            self._flush_val_metrics(wait=False)
+
     def on_validation_epoch_end(self):
+        # Async metrics: Wait only if a callback monitors them (or if they must be reduced across ranks)
+        if self.metric_worker:
+            jobs = self.metric_worker.pop_jobs()
+            if self.trainer.world_size > 1 or any(self._is_monitored(log_prefix) for log_prefix in jobs):
+                self._flush_val_metrics(wait=True)
+                stats = self.metric_worker.gather(jobs)
+                self.validation_metric_stats = {k: torch.tensor(v, dtype=torch.long, device=self.device) for k, v in stats.items()}
+            else:
+                self.pending_val_metrics.append(jobs)
+
+        # Compute corpus-level metrics from the statistics accumulated over all batches (and ranks)
+        for log_prefix in sorted(self.validation_metric_stats.keys()):
+            stats = self.validation_metric_stats[log_prefix]
+            if self.trainer.world_size > 1:
+                stats = self.all_gather(stats).sum(dim=0)
+            scores = _sacrebleu_from_stats(stats.tolist())
+            self._log_scores(scores, log_prefix=log_prefix)
+
         # Print samples (if enabled)
         if self._print_samples:
             for (dl_idx, outputs), (fn_name, _) in zip(self.validation_step_outputs.items(), self._filter_eval):  # Iterate over dataloader
@@ -128,35 +264,71 @@ class LitSeq2Seq(pl.LightningModule):
 
         # Free memory
         self.validation_step_outputs.clear()
+        self.validation_metric_stats.clear()
+        self.validation_num_samples.clear()
+
+    def _step(self, batch, batch_idx, log_prefix, repeated=False):
+        (x, y), (x_len, y_len) = batch[:2]
 
-    def _step(self, batch, batch_idx, log_prefix):
-        (x, y), (x_len, y_len) = batch
+        # Packed sequences: (x_seg, y_seg) contain the segment of each token (1, 2,...; 0=padding)
+        segments, y_boundaries = {}, None
+        if len(batch) > 2:
+            x_seg, y_seg = batch[2]
+            segments = dict(x_seg=x_seg, y_seg=y_seg[:, :-1])
+            y_boundaries = y_seg[:, 1:] != y_seg[:, :-1]  # The '</s>' of a segment must not predict the next '<s>'
 
         # Forward => (Batch, Length) => (Batch, Length, Vocab)
         # The input of the decoder needs the <sos>, but its output is shifted as it starts with the first word, not
         # with the <sos>. Therefore, we need to remove the last token from 'y'
-        output = self.forward_enc_dec(x=x, x_len=x_len, y=y[:, :-1], y_len=y_len)
+        if isinstance(self.criterion_fn, (ChunkedCrossEntropyLoss, AdaptiveSoftmaxLoss)):
+            # (Batch, Length) => (Batch, Length, Hidden). The output layer is applied by the criterion
+            features = self.forward_enc_dec(x=x, x_len=x_len, y=y[:, :-1], y_len=y_len, features_only=True, **segments)
+
+            # Remove the <sos> token from the target
+            y = y[:, 1:]
+            if y_boundaries is not None:  # The loss is computed per segment
+                y = y.masked_fill(y_boundaries, self.padding_idx)
+
+            # Compute loss (and predictions) without the full logits
+            loss, predictions = self.criterion_fn(features, y, projection=self.output_layer)
+        else:
+            output = self.forward_enc_dec(x=x, x_len=x_len, y=y[:, :-1], y_len=y_len, **segments)
 
-        # Remove the <sos> token from the target
-        y = y[:, 1:]
+            # Remove the <sos> token from the target
+            y = y[:, 1:]
+            if y_boundaries is not None:  # The loss is computed per segment
+                y = y.masked_fill(y_boundaries, self.padding_idx)
 
-        # Compute loss
-        output = output.transpose(1, 2)  # (B, L, V) => (B, V, L)
-        loss = self.criterion_fn(output, y)  # (B, V, L) vs (B, L)
+            # Compute loss
+            output = output.transpose(1, 2)  # (B, L, V) => (B, V, L)
+            loss = self.criterion_fn(output, y)  # (B, V, L) vs (B, L)
+            predictions = output.detach().argmax(1) if (log_prefix != "train" or self._train_accuracy) else None
 
         # Apply regularization
         if self.regularization_fn:
             self.regularization_fn(self, loss)
 
+        # Training metrics are accumulated on the device (see '_log_train_metrics')
+        outputs = None
+        if log_prefix == "train":
+            stats = torch.zeros(4, device=loss.device)
+            stats[0] = loss.detach()
+            stats[1] = 1
+            if predictions is not None and self._train_accuracy:
+                stats[2] = (predictions != y).sum()
+                stats[3] = predictions.numel()
+            self.train_step_stats += stats
+            self.train_epoch_stats += stats
+            return loss, outputs
+
         # Metrics: Accuracy
-        predictions = output.detach().argmax(1)
         batch_errors = (predictions != y).sum().item()
         accuracy = 1 - (batch_errors / predictions.numel())
 
         # Log params
-        outputs = None
         if log_prefix:  # Not clear is 'sync_dist=True' should be enabled by default
             sync_dist = (self.strategy == "ddp")
+            batch_size = 0 if repeated else len(x)  # Repeated batches are logged (all ranks sync) but not averaged
 
             # Control for overflow (Should it simply fail?)
             try:
@@ -166,34 +338,85 @@ class LitSeq2Seq(pl.LightningModule):
                 print("=> [WARNING] Overflow detected when computing perplexity. Set to 'inf'")
 
             # Log metrics
-            self.log(f"{log_prefix}_loss", loss, on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist)
-            self.log(f"{log_prefix}_ppl", ppl, on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist)
-            self.log(f"{log_prefix}_acc", accuracy, on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist)
+            self.log(f"{log_prefix}_loss", loss, on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist,
+                     batch_size=batch_size)
+            self.log(f"{log_prefix}_ppl", ppl, on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist,
+                     batch_size=batch_size)
+            self.log(f"{log_prefix}_acc", accuracy, on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist,
+                     batch_size=batch_size)
 
             # Compute metrics for validation
-            if log_prefix.startswith("val"):
+            if log_prefix.startswith("val") and not repeated and (not self._skip_val_metrics or self._print_samples):
                 outputs = self._compute_metrics(y_hat=predictions, y=y, metrics={"bleu"}, x=x, log_prefix=log_prefix)
         return loss, outputs
 
+    def _log_train_metrics(self, stats, suffix):
+        # Sum across ranks before averaging (weighted by the number of steps/tokens)
+        if self.trainer.world_size > 1:
+            stats = self.all_gather(stats).sum(dim=0)
+        loss_sum, num_steps, num_errors, num_tokens = stats
+        if num_steps.item() == 0:
+            return
+
+        # Log metrics (ppl overflows to 'inf')
+        loss = loss_sum / num_steps
+        metrics = {"train_loss": loss, "train_ppl": torch.exp(loss)}
+        if self._train_accuracy:
+            metrics["train_acc"] = 1 - num_errors / num_tokens.clamp(min=1)
+        on_step = (suffix == "_step")
+        for key, value in metrics.items():
+            self.log(key + suffix, value, on_step=on_step, on_epoch=not on_step, prog_bar=on_step, logger=True)
+            if not on_step:  # Allows 'monitor="train_loss"'
+                self.log(key, value, on_step=False, on_epoch=True, prog_bar=False, logger=False)
+
     def _compute_metrics(self, y_hat, y, x, metrics, log_prefix):
         # Decode lines (only during training)
         # Since ref lines are encoded, unknowns can appear. Therefore, for small vocabularies the scores could be strongly biased
-        hyp_lines = [self._trg_vocab.decode(list(x)) for x in y_hat.detach().cpu().numpy()]
-        ref_lines = [self._trg_vocab.decode(list(x)) for x in y.detach().cpu().numpy()]
-        src_lines = [self._src_vocab.decode(list(x)) for x in x.detach().cpu().numpy()]
-
-        # Full decoding (lines are stripped)
-        hyp_lines = decode_lines(hyp_lines, self._trg_vocab.lang, self._trg_vocab.subword_model, self._trg_vocab.pretok_flag, self._trg_vocab.spm_model)
-        ref_lines = decode_lines(ref_lines, self._trg_vocab.lang, self._trg_vocab.subword_model, self._trg_vocab.pretok_flag, self._trg_vocab.spm_model)
-        src_lines = decode_lines(src_lines, self._src_vocab.lang, self._src_vocab.subword_model, self._src_vocab.pretok_flag, self._src_vocab.spm_model)
-
-        # Compute metrics
-        scores = []
-
-        # Compute sacrebleu
-        scores += _sacrebleu(hyp_lines=hyp_lines, ref_lines=ref_lines, metrics=metrics)
+        hyp_ids = y_hat.detach().cpu().numpy()
+        ref_ids = y.detach().cpu().numpy()
 
-        # Log metrics
+        # Accumulate sufficient statistics (the corpus-level score is computed at the end of the epoch)
+        if "bleu" in metrics and not self._skip_val_metrics:
+            if self.metric_worker:  # Decoded and scored in the background
+                self.metric_worker.submit(log_prefix, hyp_ids, ref_ids)
+            else:
+                stats = compute_bleu_stats(hyp_ids, ref_ids, trg_vocab=self._trg_vocab)
+                stats = torch.tensor(stats, dtype=torch.long, device=self.device)
+                if log_prefix in self.validation_metric_stats:
+                    self.validation_metric_stats[log_prefix] += stats
+                else:
+                    self.validation_metric_stats[log_prefix] = stats
+
+        # Keep samples only if they are going to be printed
+        outputs = None
+        num_samples = (self._print_samples - self.validation_num_samples[log_prefix]) if self._print_samples else 0
+        if num_samples > 0:
+            hyp_lines = self._trg_vocab.decode_batch(hyp_ids[:num_samples])
+            ref_lines = self._trg_vocab.decode_batch(ref_ids[:num_samples])
+            hyp_lines = decode_lines(hyp_lines, self._trg_vocab.lang, self._trg_vocab.subword_model, self._trg_vocab.pretok_flag, self._trg_vocab.spm_model)
+            ref_lines = decode_lines(ref_lines, self._trg_vocab.lang, self._trg_vocab.subword_model, self._trg_vocab.pretok_flag, self._trg_vocab.spm_model)
+            src_lines = self._src_vocab.decode_batch(x[:num_samples])
+            src_lines = decode_lines(src_lines, self._src_vocab.lang, self._src_vocab.subword_model, self._src_vocab.pretok_flag, self._src_vocab.spm_model)
+            outputs = {"hyp": hyp_lines, "ref": ref_lines, "src": src_lines}
+            self.validation_num_samples[log_prefix] += len(src_lines)
+        return outputs
+
+    def _is_monitored(self, log_prefix):
+        # Early stopping and checkpointing need the metric at the end of the validation epoch
+        return bool(self._monitor) and self._monitor.startswith(f"{log_prefix}_bleu")
+
+    def _flush_val_metrics(self, wait):
+        # Log the async metrics of previous validation epochs (in order)
+        while self.pending_val_metrics:
+            jobs = self.pending_val_metrics[0]
+            if not wait and not self.metric_worker.is_done(jobs):
+                break
+            self.pending_val_metrics.pop(0)
+            for log_prefix, stats in sorted(self.metric_worker.gather(jobs).items()):
+                self._log_scores(_sacrebleu_from_stats(stats), log_prefix=log_prefix, delayed=True)
+
+    def _log_scores(self, scores, log_prefix, delayed=False):
+        metrics = {}
         for score in scores:
             # Get score and keep best score
             metric_name = score['name'].lower()
@@ -202,10 +425,14 @@ class LitSeq2Seq(pl.LightningModule):
             # Get best
             metric_key_best = f"{metric_key}_best"
             self.best_scores[metric_key] = max(score['score'], self.best_scores[metric_key])
-
-            # Log metrics
-            sync_dist = (self.strategy == "ddp")
-            self.log(metric_key, score['score'], on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist)
-            self.log(metric_key_best, self.best_scores[metric_key], on_step=True, on_epoch=True, prog_bar=True, logger=True, sync_dist=sync_dist)
-
-        return {"hyp": hyp_lines, "ref": ref_lines, "src": src_lines}
+            metrics[metric_key] = score['score']
+            metrics[metric_key_best] = self.best_scores[metric_key]
+
+        # Log metrics (already reduced across ranks)
+        if delayed:  # Outside the validation loop, so 'self.log' cannot be used
+            self.trainer.callback_metrics.update({k: torch.tensor(v) for k, v in metrics.items()})
+            for logger in self.loggers:
+                logger.log_metrics(metrics, step=self.global_step)
+        else:
+            for key, value in metrics.items():
+                self.log(key, value, on_step=False, on_epoch=True, prog_bar=True, logger=True)
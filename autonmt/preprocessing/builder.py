@@ -11,7 +11,7 @@ from autonmt.preprocessing import tokenizers
 from autonmt.bundle import utils, plots
 from autonmt.bundle.utils import *
 from autonmt.preprocessing.dataset import Dataset
-from autonmt.preprocessing.processors import pretokenize_file, encode_file
+from autonmt.preprocessing.processors import pretokenize_file, encode_file, build_shortlist_file
 
 
 class DatasetBuilder:
@@ -39,6 +39,10 @@ class DatasetBuilder:
         self.split_digits = True
         self.truncate_at = 1024
 
+        # Shortlist
+        self.shortlist_top_k = 100
+        self.shortlist_num_frequent = 100
+
         # Other
         self.ds_refs = {str(ds): ds for ds in self._unroll_datasets(encodings=None, parent_ds=True, ref_size_only=True)}  # Reference datasets (must exist, but might not appear in the user code)
         self.ds_list_parents = self._unroll_datasets(encodings=None, parent_ds=True) # main preprocessing only
@@ -126,7 +130,7 @@ class DatasetBuilder:
     def get_test_ds(self):
         return self.get_ds(ignore_variants=True)
 
-    def build(self, make_plots=False, force_overwrite=False, verbose=False):
+    def build(self, make_plots=False, make_shortlists=False, force_overwrite=False, verbose=False):
         print(f"=> Building datasets...")
         print(f"\t- base_path={self.base_path}")
 
@@ -153,6 +157,10 @@ class DatasetBuilder:
             self._export_vocab_frequencies(force_overwrite=force_overwrite)
             self._compute_stats(force_overwrite=force_overwrite, print_stats=verbose)
 
+            # Lexical shortlists (to restrict the output vocabulary during decoding)
+            if make_shortlists:
+                self._build_shortlists(force_overwrite=force_overwrite)
+
             # Make plot
             if make_plots:
                 self._plot_datasets(force_overwrite=force_overwrite)
@@ -546,7 +554,7 @@ class DatasetBuilder:
             if ds.subword_model in {None, "none"}:
                 continue
             elif ds.subword_model in {"bytes"}:
-                split_fn = lambda x: x.split(' ')
+                split_fn = utils.bytes2tokens
             else:
                 split_fn = lambda x: x.split(' ')
                 spm_model = True
@@ -603,6 +611,21 @@ class DatasetBuilder:
                         lines = [f"{pair[0]}\t{pair[1]}" for pair in vocab_frequencies]
                         write_file_lines(lines=lines, filename=vocab_path, insert_break_line=True)
 
+    def _build_shortlists(self, force_overwrite):
+        print(f"=> Building shortlists...")
+        for ds in self:  # Dataset
+            # Ignore dataset (there is nothing to restrict)
+            if ds.subword_model in {None, "none", "bytes"}:
+                continue
+
+            # Build table from the encoded training files
+            print(f"\t- Building shortlist: {ds.id2(as_path=True)}")
+            build_shortlist_file(src_file=ds.get_encoded_path(f"{ds.train_name}.{ds.src_lang}"),
+                                 trg_file=ds.get_encoded_path(f"{ds.train_name}.{ds.trg_lang}"),
+                                 output_file=ds.get_shortlist_file(),
+                                 top_k=self.shortlist_top_k, num_frequent=self.shortlist_num_frequent,
+                                 force_overwrite=force_overwrite)
+
     def _compute_stats(self, force_overwrite, print_stats=True):
         print(f"=> Computing stats... (base_path={self.base_path})")
 
@@ -664,7 +687,7 @@ class DatasetBuilder:
                 split_name, split_lang = fname.split('.')
 
                 # Ignore dataset
-                tokens_per_sentence = utils.count_tokens_per_sentence(filename=ds.get_encoded_path(fname))
+                tokens_per_sentence = utils.count_tokens_per_sentence(filename=ds.get_encoded_path(fname), split_fn=ds.get_split_fn())
                 tokens_per_sentence = np.array(tokens_per_sentence)
 
                 # Compute data stats
@@ -155,6 +155,9 @@ class Dataset:
         else:
             return os.path.join(self.base_path, *self.id(), self.vocab_path, *self.vocab_size_id(), f"{lang}")
 
+    def get_shortlist_file(self):
+        return os.path.join(self.base_path, *self.id(), self.vocab_path, *self.vocab_size_id(), f"{self.src_lang}-{self.trg_lang}.shortlist")
+
     def get_toolkit_path(self, toolkit, fname=""):
         return os.path.join(self.base_path, *self.id(), self.models_path, toolkit, fname)
 
@@ -204,6 +207,13 @@ class Dataset:
     def get_run_name(self, run_prefix):
         return f"{run_prefix}_{self.subword_model}_{self.vocab_size}".lower()
 
+    def get_split_fn(self):
+        # Tokens of an encoded line ("bytes" files contain text)
+        if self.subword_model in {"bytes"}:
+            return utils.text2bytes
+        else:
+            return lambda x: x.strip().split(' ')
+
     def get_stats(self, splits=None, count_unknowns=False):
 
         if not splits:
@@ -214,7 +224,7 @@ class Dataset:
             split_name, split_lang = fname.split('.')
 
             # Count tokens per sentence
-            tokens_per_sentence = utils.count_tokens_per_sentence(filename=self.get_encoded_path(fname))
+            tokens_per_sentence = utils.count_tokens_per_sentence(filename=self.get_encoded_path(fname), split_fn=self.get_split_fn())
             tokens_per_sentence = np.array(tokens_per_sentence)
 
             # Compute stats
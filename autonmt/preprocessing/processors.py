@@ -1,4 +1,5 @@
 import collections
+import itertools
 import numpy as np
 
 from tokenizers import normalizers
@@ -118,19 +119,23 @@ def normalize_lines(lines, seq=None):
     lines = [normalizer.normalize_str(line) for line in lines]
     return lines
 
-def preprocess_predict_file(input_file, output_file, preprocess_fn, pretokenize, input_lang, vocab_lang, ds, force_overwrite):
-    if force_overwrite or not os.path.exists(output_file):
-        lines = read_file_lines(input_file, autoclean=True)
+def preprocess_predict_lines(lines, preprocess_fn, pretokenize, input_lang, vocab_lang, ds):
+    # preprocess_fn
+    if preprocess_fn:
+        data = {"lang": input_lang, "lines": lines}
+        lines = preprocess_fn(data, ds)
 
-        # preprocess_fn
-        if preprocess_fn:
-            data = {"lang": input_lang, "lines": lines}
-            lines = preprocess_fn(data, ds)
+    # Pretokenize
+    if pretokenize:
+        lines = tokenizers._moses_tokenizer(lines, lang=vocab_lang)
+    return lines
 
-        # Pretokenize
-        if pretokenize:
-            lines = tokenizers._moses_tokenizer(lines, lang=vocab_lang)
 
+def preprocess_predict_file(input_file, output_file, preprocess_fn, pretokenize, input_lang, vocab_lang, ds, force_overwrite):
+    if force_overwrite or not os.path.exists(output_file):
+        lines = read_file_lines(input_file, autoclean=True)
+        lines = preprocess_predict_lines(lines, preprocess_fn=preprocess_fn, pretokenize=pretokenize,
+                                         input_lang=input_lang, vocab_lang=vocab_lang, ds=ds)
         write_file_lines(lines=lines, filename=output_file, insert_break_line=True, encoding="utf-8")
         assert os.path.exists(output_file)
 
@@ -150,10 +155,9 @@ def encode_file(input_file, output_file, model_vocab_path, subword_model, force_
             shutil.copyfile(input_file, output_file)
 
         elif subword_model in {"bytes"}:  # No vocab is needed (just bytes)
-            # Save file as UTF8 and make sure everything uses NFKC
+            # Save file as UTF8 and make sure everything uses NFKC (the vocabulary encodes the UTF-8 bytes directly)
             lines = read_file_lines(input_file, autoclean=True)
             lines = [NFKC().normalize_str(line) for line in lines]
-            lines = [utils.text2hex(line, return_str=True) for line in lines]
             write_file_lines(lines=lines, filename=output_file, insert_break_line=True)
 
         else:
@@ -185,6 +189,22 @@ def decode_file(input_file, output_file, lang, subword_model, pretok_flag, model
         assert os.path.exists(output_file)
 
 
+def encode_lines(lines, lang, subword_model, pretok_flag, spm_model=None):
+    # Pretokenize with moses
+    if pretok_flag:
+        lines = tokenizers._moses_tokenizer(lines, lang=lang)
+
+    # Encode
+    if subword_model in {None, "none"}:
+        pass
+    elif subword_model in {"bytes"}:  # The vocabulary encodes the UTF-8 bytes directly
+        lines = [NFKC().normalize_str(line) for line in lines]
+    else:
+        lines = tokenizers._spm_encode(lines, spm_model)
+
+    return lines
+
+
 def decode_lines(lines, lang, subword_model, pretok_flag, spm_model=None):
     # Detokenize
     if subword_model in {None, "none", "bytes"}:
@@ -197,3 +217,73 @@ def decode_lines(lines, lang, subword_model, pretok_flag, spm_model=None):
         lines = tokenizers._moses_detokenizer(lines, lang=lang)
 
     return lines
+
+
+def _read_token_ids(f, num_lines, tok2id):
+    # Unique tokens of the next 'num_lines' lines => flat ids + number of tokens per line (new tokens get new ids)
+    ids, lengths = [], []
+    for line in itertools.islice(f, num_lines):
+        tokens = set(clean_file_line(line).split(' '))
+        ids.extend(tok2id.setdefault(tok, len(tok2id)) for tok in tokens)
+        lengths.append(len(tokens))
+    return np.array(ids, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def _count_pairs(src_ids, src_lengths, trg_ids, trg_lengths):
+    # Sentence-level co-occurrences of a chunk (vectorized cross product per sentence) => unique pair keys + counts
+    reps = np.repeat(trg_lengths, src_lengths)  # Each src token is paired with all the trg tokens of its sentence
+    trg_starts = np.repeat(np.cumsum(trg_lengths) - trg_lengths, src_lengths)
+    offsets = np.arange(int(reps.sum())) - np.repeat(np.cumsum(reps) - reps, reps)
+    pair_trg = trg_ids[np.repeat(trg_starts, reps) + offsets]
+    keys = (np.repeat(src_ids, reps) << 32) | pair_trg
+    return np.unique(keys, return_counts=True)
+
+
+def build_shortlist_file(src_file, trg_file, output_file, top_k, num_frequent, force_overwrite, chunk_size=10000):
+    """
+    Source-to-target lexical shortlist from the (encoded) training files: 'src_token\ttrg_token1 trg_token2...'
+    The first line has an empty key and contains the most frequent target tokens (always candidates).
+    Co-occurrences are counted with integer ids by chunks of 'chunk_size' lines (16 bytes per distinct pair).
+    """
+    if force_overwrite or not os.path.exists(output_file):
+        # Count sentence-level co-occurrences: keys = (src_id << 32) | trg_id
+        src_tok2id, trg_tok2id = {}, {}
+        src_freq, trg_freq = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        keys, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        with open(src_file, 'rb') as fs, open(trg_file, 'rb') as ft:
+            while True:
+                src_ids, src_lengths = _read_token_ids(fs, chunk_size, src_tok2id)
+                trg_ids, trg_lengths = _read_token_ids(ft, chunk_size, trg_tok2id)
+                assert len(src_lengths) == len(trg_lengths)
+                if not len(src_lengths):
+                    break
+
+                # Frequencies (number of sentences)
+                src_freq = np.bincount(src_ids, minlength=len(src_tok2id)) + np.pad(src_freq, (0, len(src_tok2id) - len(src_freq)))
+                trg_freq = np.bincount(trg_ids, minlength=len(trg_tok2id)) + np.pad(trg_freq, (0, len(trg_tok2id) - len(trg_freq)))
+
+                # Merge the pairs of this chunk
+                chunk_keys, chunk_counts = _count_pairs(src_ids, src_lengths, trg_ids, trg_lengths)
+                keys, inverse = np.unique(np.concatenate([keys, chunk_keys]), return_inverse=True)
+                counts = np.bincount(inverse, weights=np.concatenate([counts, chunk_counts])).astype(np.int64)
+
+        # Keep the top-k target tokens for each source token (Dice coefficient; ties by first appearance)
+        src_ids, trg_ids = keys >> 32, keys & 0xFFFFFFFF
+        dice = 2 * counts / (src_freq[src_ids] + trg_freq[trg_ids])
+        order = np.lexsort((trg_ids, -dice, src_ids))
+        src_ids, trg_ids = src_ids[order], trg_ids[order]
+        group_starts = np.flatnonzero(np.r_[True, src_ids[1:] != src_ids[:-1]]) if len(src_ids) else np.zeros(0, dtype=np.int64)
+        rank = np.arange(len(src_ids)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(src_ids)]))
+        keep = rank < top_k
+
+        # Write table (source tokens in order of appearance)
+        src_id2tok, trg_id2tok = list(src_tok2id), np.array(list(trg_tok2id), dtype=object)
+        most_frequent = np.argsort(-trg_freq, kind="stable")[:num_frequent]
+        lines = ['\t' + ' '.join(trg_id2tok[most_frequent])]
+        src_ids, trg_ids = src_ids[keep], trg_ids[keep]
+        bounds = np.flatnonzero(np.r_[True, src_ids[1:] != src_ids[:-1], True]) if len(src_ids) else []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            lines.append(f"{src_id2tok[src_ids[start]]}\t{' '.join(trg_id2tok[trg_ids[start:end]])}")
+
+        write_file_lines(lines=lines, filename=output_file, insert_break_line=True)
+        assert os.path.exists(output_file)
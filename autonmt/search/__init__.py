@@ -1,2 +1,4 @@
 from autonmt.search.beam_search import beam_search
 from autonmt.search.greedy_search import greedy_search
+from autonmt.search.sharded_search import sharded_greedy_search
+from autonmt.search.shortlist import Shortlist
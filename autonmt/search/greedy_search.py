@@ -1,12 +1,74 @@
 import torch
+import torch.nn as nn
+import torch.nn.functional as F
 import torch.utils.data as tud
 import tqdm
 
+from autonmt.modules.layers import AdaptiveSoftmax
 
-def greedy_search(model, dataset, sos_id, eos_id, pad_id, batch_size, max_tokens, max_len_a, max_len_b, num_workers, **kwargs):
+
+def check_shortlist(model, shortlist):
+    # Shortlist: Project only onto the candidates of each batch
+    if shortlist is not None and not isinstance(getattr(model, "output_layer", None), nn.Linear):
+        print("\t- [WARNING]: Shortlists require a linear output layer ('model.output_layer'). Ignoring shortlist.")
+        shortlist = None
+    return shortlist
+
+
+def greedy_decode(model, x, x_len, sos_id, eos_id, pad_id, max_len_a, max_len_b, shortlist=None):
+    """Greedy decoding of a single batch (B, L) of source ids. Returns the predicted ids (B, L') on the model's device"""
+    device = next(model.parameters()).device
+    adaptive_softmax = isinstance(getattr(model, "output_layer", None), AdaptiveSoftmax)  # Avoid the full log-probs
+    features_only = adaptive_softmax or shortlist is not None
+    max_gen_length = int(max_len_a*x.shape[1] + max_len_b)
+
+    # Run encoder
+    _, states = model.forward_encoder(x=x.to(device), x_len=x_len.to(device))
+
+    # Restrict the output layer to the candidates of this batch
+    if shortlist is not None:
+        candidates = shortlist.get_candidates(x).to(device)  # (C)
+        sl_weight = model.output_layer.weight.index_select(0, candidates)  # (C, H)
+        sl_bias = model.output_layer.bias.index_select(0, candidates) if model.output_layer.bias is not None else None
+
+    # Set start token <sos> and initial probabilities
+    y_pred = torch.full((x.shape[0], max_gen_length), pad_id, dtype=torch.long).to(device)  # (B, L)
+    y_pred[:, 0] = sos_id
+
+    # Iterate over trg tokens
+    x_pad_mask = (x != pad_id).to(device) if model.packed_sequence else None  # Mask padding
+    eos_mask = torch.zeros(x.shape[0], dtype=torch.bool).to(device)
+    max_iter = 0
+    for i in range(1, max_gen_length):
+        max_iter = i
+        outputs_t, states = model.forward_decoder(y=y_pred[:, :i], y_len=None, states=states, x_pad_mask=x_pad_mask,
+                                                  features_only=features_only)
+        if shortlist is not None:
+            logits_t = F.linear(outputs_t[:, -1, :], sl_weight, sl_bias)  # (B, C)
+            top1 = candidates[logits_t.argmax(1)]  # Map back to the vocab ids
+        elif adaptive_softmax:
+            top1 = model.output_layer.predict(outputs_t[:, -1, :])  # Get most probable next-word (features)
+        else:
+            top1 = outputs_t[:, -1, :].argmax(1)  # Get most probable next-word (logits)
+
+        # Update y_pred for next iteration
+        y_pred[:, i] = top1
+
+        # Check for EOS tokens
+        eos_mask |= (top1 == eos_id)  # in-place OR
+
+        # Break if all sentences have an EOS token
+        if eos_mask.all():
+            break
+    return y_pred[:, :max_iter]
+
+
+def greedy_search(model, dataset, sos_id, eos_id, pad_id, batch_size, max_tokens, max_len_a, max_len_b, num_workers,
+                  shortlist=None, **kwargs):
     model.eval()
     device = next(model.parameters()).device
     pin_memory = False if device.type == "cpu" else True
+    shortlist = check_shortlist(model, shortlist)
 
     # Create dataloader
     eval_dataloader = tud.DataLoader(dataset,
@@ -18,35 +80,10 @@ def greedy_search(model, dataset, sos_id, eos_id, pad_id, batch_size, max_tokens
     with torch.no_grad():
         outputs = []
         for (x, _), (x_len, _) in tqdm.tqdm(eval_dataloader, total=len(eval_dataloader)):
-            max_gen_length = int(max_len_a*x.shape[1] + max_len_b)
-
-            # Run encoder
-            _, states = model.forward_encoder(x=x.to(device), x_len=x_len.to(device))
-
-            # Set start token <sos> and initial probabilities
-            y_pred = torch.full((x.shape[0], max_gen_length), pad_id, dtype=torch.long).to(device)  # (B, L)
-            y_pred[:, 0] = sos_id
-
-            # Iterate over trg tokens
-            x_pad_mask = (x != pad_id) if model.packed_sequence else None  # Mask padding
-            eos_mask = torch.zeros(x.shape[0], dtype=torch.bool).to(device)
-            max_iter = 0
-            for i in range(1, max_gen_length):
-                max_iter = i
-                outputs_t, states = model.forward_decoder(y=y_pred[:, :i], y_len=None, states=states, x_pad_mask=x_pad_mask)
-                top1 = outputs_t[:, -1, :].argmax(1)  # Get most probable next-word (logits)
-
-                # Update y_pred for next iteration
-                y_pred[:, i] = top1
-
-                # Check for EOS tokens
-                eos_mask |= (top1 == eos_id)  # in-place OR
-
-                # Break if all sentences have an EOS token
-                if eos_mask.all():
-                    break
+            y_pred = greedy_decode(model, x, x_len, sos_id=sos_id, eos_id=eos_id, pad_id=pad_id,
+                                   max_len_a=max_len_a, max_len_b=max_len_b, shortlist=shortlist)
 
             # Add outputs
-            outputs.extend(y_pred[:, :max_iter].tolist())
+            outputs.extend(y_pred.tolist())
 
     return outputs, None
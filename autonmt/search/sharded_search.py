@@ -0,0 +1,99 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import torch.utils.data as tud
+import tqdm
+
+from autonmt.search.greedy_search import greedy_decode, check_shortlist
+
+_worker_model = None
+_worker_params = None
+
+# References kept by the trainer that are not needed to decode (and might not be picklable)
+_TRAINING_ATTRS = ("_src_vocab", "_trg_vocab", "_filter_train", "_filter_eval", "metric_worker", "regularization_fn")
+
+
+def _init_worker(model, num_threads, params):
+    global _worker_model, _worker_params
+    torch.set_num_threads(num_threads)  # Pinned per process (intra-op threads scale poorly on small matmuls)
+    _worker_model = model.eval()
+    _worker_params = params
+
+
+def _decode_shard(batches):
+    outputs = []
+    with torch.no_grad():
+        for x, x_len in batches:
+            outputs.extend(greedy_decode(_worker_model, x, x_len, **_worker_params).tolist())
+    return outputs
+
+
+def _picklable_model(model):
+    # Copy without the training references, with its weights in shared memory (copied once for all the processes).
+    # The caller's model is not modified (sharing moves the storages in place)
+    model = copy.copy(model)
+    for attr in _TRAINING_ATTRS:
+        model.__dict__.pop(attr, None)
+    model = copy.deepcopy(model)
+    model.share_memory()
+    return model
+
+
+def split_contiguous(sizes, num_shards):
+    # Boundaries of 'num_shards' contiguous chunks with a similar total size
+    cum_sizes = np.cumsum(sizes)
+    targets = cum_sizes[-1] * np.arange(1, num_shards) / num_shards if len(sizes) else []
+    bounds = np.searchsorted(cum_sizes, targets, side="left") + 1 if len(sizes) else []
+    bounds = [0] + [int(b) for b in bounds] + [len(sizes)]
+    return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def sharded_greedy_search(model, dataset, sos_id, eos_id, pad_id, batch_size, max_tokens, max_len_a, max_len_b,
+                          num_workers, num_procs, num_threads=None, shortlist=None, beam_width=1, **kwargs):
+    """
+    Greedy search on CPU with 'num_procs' processes. The test set is split into contiguous shards (by tokens), and the
+    hypotheses are merged back in order. Each process uses 'num_threads' intra-op threads (default: cores/num_procs).
+    The model class must be importable by the worker processes (spawn). Other search options are not supported.
+    """
+    if beam_width != 1:
+        raise ValueError("The sharded search only supports greedy decoding ('beam_width=1')")
+    ignored = sorted(k for k, v in kwargs.items() if v is not None)
+    if ignored:
+        print(f"\t- [WARNING]: Options not supported by the sharded search: {', '.join(ignored)}. Ignoring them.")
+
+    model.eval()
+    shortlist = check_shortlist(model, shortlist)
+    if shortlist is not None:  # The vocabularies are not needed to get the candidates
+        shortlist = copy.copy(shortlist)
+        shortlist.src_vocab = shortlist.trg_vocab = None
+    num_threads = num_threads if num_threads else max(1, (os.cpu_count() or 1) // num_procs)
+
+    # Create batches (in order)
+    eval_dataloader = tud.DataLoader(dataset,
+                                     collate_fn=dataset.get_collate_fn(max_tokens),
+                                     num_workers=num_workers, persistent_workers=bool(num_workers),
+                                     batch_size=batch_size, shuffle=False)
+    batches = [(x, x_len) for (x, _), (x_len, _) in eval_dataloader]
+    if not batches:
+        return [], None
+
+    # Split the batches into contiguous shards
+    shards = split_contiguous([int(x.numel()) for x, _ in batches], num_shards=num_procs)
+    print(f"\t- [INFO]: Decoding {len(batches):,} batches with {len(shards)} processes ({num_threads} threads each)")
+
+    # Decode shards
+    params = dict(sos_id=sos_id, eos_id=eos_id, pad_id=pad_id, max_len_a=max_len_a, max_len_b=max_len_b,
+                  shortlist=shortlist)
+    with ProcessPoolExecutor(max_workers=len(shards), mp_context=mp.get_context("spawn"), initializer=_init_worker,
+                             initargs=(_picklable_model(model), num_threads, params)) as executor:
+        futures = [executor.submit(_decode_shard, batches[start:end]) for start, end in shards]
+
+        # Merge outputs (in order)
+        outputs = []
+        for future in tqdm.tqdm(futures, total=len(futures)):
+            outputs.extend(future.result())
+    return outputs, None
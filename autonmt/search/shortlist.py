@@ -0,0 +1,39 @@
+import numpy as np
+import torch
+
+from autonmt.bundle.utils import read_file_lines
+
+
+class Shortlist:
+    """Restricts the target vocabulary of a batch to the candidates of its source tokens.
+    See: 'DatasetBuilder.build(make_shortlists=True)'
+    """
+    def __init__(self, src_vocab, trg_vocab):
+        self.src_vocab = src_vocab
+        self.trg_vocab = trg_vocab
+        self.src2trg = {}
+        self.default_ids = np.array([], dtype=np.int64)
+        self.filename = None
+
+    def load(self, filename):
+        self.filename = filename
+
+        # Special tokens are always candidates
+        default_ids = [idx for _, idx in self.trg_vocab.special_tokens()]
+
+        # Parse table (the empty key contains the most frequent target tokens)
+        for line in read_file_lines(filename, autoclean=False, remove_empty=True):
+            src_tok, trg_tokens = line.rstrip('\r\n').split('\t')
+            trg_ids = [self.trg_vocab.voc2idx[tok] for tok in trg_tokens.split(' ') if tok in self.trg_vocab.voc2idx]
+            if not src_tok:
+                default_ids += trg_ids
+            elif src_tok in self.src_vocab.voc2idx:
+                self.src2trg[self.src_vocab.voc2idx[src_tok]] = np.array(trg_ids, dtype=np.int64)
+        self.default_ids = np.unique(np.array(default_ids, dtype=np.int64))
+        return self
+
+    def get_candidates(self, x):
+        # (B, L) source ids => (C) sorted target ids
+        src_ids = np.unique(x.detach().cpu().numpy())
+        candidates = [self.default_ids] + [self.src2trg[idx] for idx in src_ids if idx in self.src2trg]
+        return torch.from_numpy(np.unique(np.concatenate(candidates)))
@@ -7,7 +7,9 @@ import pytorch_lightning as pl
 import wandb
 from pytorch_lightning.loggers import CometLogger
 
+import functools
 import glob
+import itertools
 import inspect
 
 from pytorch_lightning.callbacks.early_stopping import EarlyStopping
@@ -17,9 +19,17 @@ from pytorch_lightning.loggers import WandbLogger
 from torch.utils.data import DataLoader
 
 from autonmt.bundle.utils import *
+from autonmt.bundle.checkpoint_cache import checkpoint_cache
+from autonmt.bundle.translation_cache import TranslationCache, LRUTranslationCache, SQLiteTranslationCache, translate_with_cache, model_fingerprint
 from autonmt.modules.datasets.seq2seq_dataset import Seq2SeqDataset
+from autonmt.modules.datasets.streaming_dataset import StreamingSeq2SeqDataset
+from autonmt.modules.datasets.multi_corpus_dataset import MultiCorpusDataset
+from autonmt.modules.datasets.prefetch_loader import PrefetchDataLoader
 from autonmt.search.beam_search import beam_search
-from autonmt.search.greedy_search import greedy_search
+from autonmt.search.greedy_search import greedy_search, greedy_decode, check_shortlist
+from autonmt.search.sharded_search import sharded_greedy_search
+from autonmt.preprocessing.processors import encode_lines, decode_lines
+from autonmt.search.shortlist import Shortlist
 from autonmt.toolkits.base import BaseTranslator
 from autonmt.modules.samplers import *
 
@@ -66,6 +76,12 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         self.val_tds = None
         self.test_tds = None
 
+        # Lexical shortlists (loaded once)
+        self.shortlists = {}
+
+        # Translation caches (opened once)
+        self.translation_caches = {}
+
     def _preprocess(self, train_path, val_path, test_path,
                     apply2train, apply2val, apply2test,
                     src_lang, trg_lang, src_vocab_path, trg_vocab_path,
@@ -77,26 +93,51 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         # Training data
         if apply2train:
             fn_name, filter_fn = self.filter_tr_data_fn
-            self.train_tds = Seq2SeqDataset(file_prefix=train_path, filter_fn=filter_fn, **params, **kwargs)
-
-        # Validation data
+            if kwargs.get("train_corpora"):  # Several corpora read in place (e.g. one per language pair)
+                self.train_tds = self._build_multi_corpus(kwargs.get("train_corpora"), filter_fn=filter_fn, **kwargs)
+            elif kwargs.get("streaming"):  # Corpora larger than RAM
+                self.train_tds = StreamingSeq2SeqDataset(file_prefix=train_path, filter_fn=filter_fn, **params, **kwargs)
+            else:
+                self.train_tds = Seq2SeqDataset(file_prefix=train_path, filter_fn=filter_fn, **params, **kwargs)
+
+        # Validation data (the split is read once, and each filter is a view)
         if apply2val:
             self.val_tds = []
             for fn_name, filter_fn in self.filter_vl_data_fn:
-                sds = Seq2SeqDataset(file_prefix=val_path, filter_fn=filter_fn, **params, **kwargs)
+                sds = Seq2SeqDataset(file_prefix=val_path, filter_fn=filter_fn, split_cache=self.split_cache,
+                                     filter_name=fn_name, **params, **kwargs)
                 self.val_tds.append(sds)
 
-        # Test data
+        # Test data (the split is read once, and each filter is a view)
         if apply2test:
             self.test_tds = []
             for fn_name, filter_fn in self.filter_ts_data_fn:
-                sds = Seq2SeqDataset(file_prefix=test_path, filter_fn=filter_fn, **params, **kwargs)
+                sds = Seq2SeqDataset(file_prefix=test_path, filter_fn=filter_fn, split_cache=self.split_cache,
+                                     filter_name=fn_name, **params, **kwargs)
                 self.test_tds.append(sds)
 
+    def _build_multi_corpus(self, train_corpora, filter_fn, **kwargs):
+        datasets, names = [], []
+        for ds_i in train_corpora:
+            # The corpora must be encoded with the vocabularies of the model
+            for lang, vocab in [(ds_i.src_lang, self.src_vocab), (ds_i.trg_lang, self.trg_vocab)]:
+                vocab_path = ds_i.get_vocab_file(lang=lang) + ".vocab"
+                if vocab.vocab_path != vocab_path and read_file_lines(vocab_path) != read_file_lines(vocab.vocab_path):
+                    raise ValueError(f"The corpus '{str(ds_i)}' was not encoded with the vocabulary of the model ({vocab.vocab_path})")
+
+            # Read encoded training split
+            train_path = ds_i.get_encoded_path(fname=ds_i.train_name)
+            datasets.append(Seq2SeqDataset(file_prefix=train_path, src_lang=ds_i.src_lang, trg_lang=ds_i.trg_lang,
+                                           src_vocab=self.src_vocab, trg_vocab=self.trg_vocab, filter_fn=filter_fn, **kwargs))
+            names.append(str(ds_i))
+        return MultiCorpusDataset(datasets, names=names)
+
     # def _len_func(self, ds, i):
     #     return len(ds.datasets.iloc[i]["src"].split())
 
     def _train(self, train_ds, checkpoints_dir, logs_path, force_overwrite, **kwargs):
+        self.loaded_checkpoint = self.model_fingerprint = None  # The weights will change
+
         # Training params
         batch_size = kwargs.get("batch_size")
         max_tokens = kwargs.get("max_tokens")
@@ -109,10 +150,17 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         comet_params = kwargs.get("comet_params")
         print_samples = kwargs.get("print_samples")
         skip_val_metrics = kwargs.get("skip_val_metrics")
+        async_val_metrics = kwargs.get("async_val_metrics")
         use_bucketing = kwargs.get("use_bucketing")
+        packing = kwargs.get("packing")
+        pack_size = kwargs.get("pack_size")
         mode_str = "min" if "loss" in monitor.lower() else "max"
         ckpt_filename = "{epoch:03d}-{" + monitor.replace('/', '-') + ":.3f}"
         pin_memory = False if kwargs.get('devices') == "cpu" else True
+        prefetch_batches = kwargs.get("prefetch_batches")
+        loader_cls = functools.partial(PrefetchDataLoader, prefetch_batches=prefetch_batches) if prefetch_batches else DataLoader
+        strategy = kwargs.get("strategy")
+        distributed_bucketing = use_bucketing and "ddp" in (strategy if isinstance(strategy, str) else type(strategy).__name__).lower()
         loggers, callbacks = [], []
 
         # Model hyperparams
@@ -120,7 +168,8 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         self.model.optimizer = kwargs.get("optimizer")
         self.model.learning_rate = kwargs.get("learning_rate")
         self.model.weight_decay = kwargs.get("weight_decay")
-        self.model.configure_criterion(kwargs.get("criterion"))
+        self.model.gradient_checkpointing = bool(kwargs.get("gradient_checkpointing"))
+        self.model.configure_criterion(kwargs.get("criterion"), chunk_size=kwargs.get("criterion_chunk_size"))
 
         # Additional information for metrics
         self.model._src_vocab = self.train_tds.src_vocab
@@ -129,24 +178,65 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         self.model._filter_eval = self.filter_vl_data_fn
         self.model._print_samples = print_samples
         self.model._skip_val_metrics = skip_val_metrics
+        self.model._async_val_metrics = async_val_metrics
+        self.model._monitor = monitor
+        self.model._train_accuracy = kwargs.get("train_accuracy", True)  # Argmax accuracy during training
+        self.model._train_metrics_interval = kwargs.get("train_metrics_interval")  # Default: 'log_every_n_steps'
 
         # Check padding
         if not use_bucketing and self.model.packed_sequence:
             raise ValueError("Packed sequence is only compatible with bucketing")
 
+        # Check streaming (no random access)
+        streaming = isinstance(self.train_tds, StreamingSeq2SeqDataset)
+        if streaming and use_bucketing:
+            raise ValueError("Bucketing is not compatible with streaming datasets")
+        self.model._streaming_tds = self.train_tds if streaming else None
+
+        # Check multi-corpus sampling (the corpora are mixed by the sampler)
+        multi_corpus = isinstance(self.train_tds, MultiCorpusDataset)
+        if multi_corpus and use_bucketing:
+            raise ValueError("Bucketing is not compatible with multi-corpus sampling ('train_corpora')")
+
+        # Check sequence packing (several sentences per row)
+        if packing and not self.model.supports_packing:
+            raise ValueError(f"Sequence packing is not supported by '{self.model.architecture}'")
+
         # Dataloader: Training
         print(f"\t- [INFO]: Preparing training dataloader... (1/1)")
         sampler, shuffle = None, True
-        if use_bucketing:
-            print(f"\t\t- Preparing bucketing iterator...")
-            shuffle = False  # 'sampler' option is mutually exclusive with shuffle (we shuffle in bucket)
-            sampler = BucketIterator(self.train_tds, batch_size=batch_size,
-                                     sort_key=lambda x, y: len(self.model._src_vocab.encode(x)),
-                                     sort_within_batch=self.model.packed_sequence, shuffle=True)
-        train_loader = DataLoader(self.train_tds,
-                                  collate_fn=self.train_tds.get_collate_fn(max_tokens), sampler=sampler,
-                                  num_workers=num_workers, persistent_workers=bool(num_workers), pin_memory=pin_memory,
-                                  batch_size=batch_size, shuffle=shuffle,
+        if streaming:  # Shuffled (and sharded) by the dataset
+            print(f"\t\t- Streaming training data...")
+            batch_params = dict(batch_size=batch_size)
+        elif multi_corpus:
+            print(f"\t\t- Preparing temperature sampler... (T={kwargs.get('sampling_temperature') or 1.0})")
+            sampler = TemperatureSampler(self.train_tds, temperature=kwargs.get("sampling_temperature") or 1.0,
+                                         num_samples=kwargs.get("samples_per_epoch"),
+                                         token_budgets=kwargs.get("corpus_token_budgets"),
+                                         sort_key=lambda x, y: len(self.model._src_vocab.encode(x)) + len(self.model._trg_vocab.encode(y)),
+                                         seed=kwargs.get("seed") or 0)
+            batch_params = dict(sampler=sampler, batch_size=batch_size, shuffle=False)
+        elif distributed_bucketing:  # Batches are sharded by the sampler (not by Lightning)
+            print(f"\t\t- Preparing distributed bucketing sampler...")
+            batch_sampler = DistributedBucketBatchSampler(self.train_tds, batch_size=batch_size, max_tokens=max_tokens,
+                                                          sort_key=lambda x, y: (len(self.model._src_vocab.encode(x)), len(self.model._trg_vocab.encode(y))),
+                                                          sort_within_batch=self.model.packed_sequence, shuffle=True,
+                                                          seed=kwargs.get("seed") or 0)
+            batch_params = dict(batch_sampler=batch_sampler)
+        else:
+            if use_bucketing:
+                print(f"\t\t- Preparing bucketing iterator...")
+                shuffle = False  # 'sampler' option is mutually exclusive with shuffle (we shuffle in bucket)
+                sampler = BucketIterator(self.train_tds, batch_size=batch_size,
+                                         sort_key=lambda x, y: len(self.model._src_vocab.encode(x)),
+                                         sort_within_batch=self.model.packed_sequence, shuffle=True)
+            batch_params = dict(sampler=sampler, batch_size=batch_size, shuffle=shuffle)
+        if prefetch_batches:
+            print(f"\t\t- Prefetching {prefetch_batches} batches in a background thread...")
+        train_loader = loader_cls(self.train_tds,
+                                  collate_fn=self.train_tds.get_collate_fn(max_tokens, packing=packing, pack_size=pack_size),
+                                  num_workers=num_workers, persistent_workers=bool(num_workers) and not streaming,  # The epoch is set on each iteration
+                                  pin_memory=pin_memory, **batch_params
                                   )
 
         # Dataloader: Validation
@@ -154,15 +244,23 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         for i, val_tds_i in enumerate(self.val_tds):
             print(f"\t- [INFO]: Preparing validation dataloader... ({i+1}/{len(self.val_tds)})")
             sampler_i = None
-            if use_bucketing:
-                print(f"\t\t- Preparing bucketing iterator...")
-                sampler_i = BucketIterator(val_tds_i, batch_size=batch_size,
-                                         sort_key=lambda x, y: len(self.model._src_vocab.encode(x)),
-                                         sort_within_batch=self.model.packed_sequence, shuffle=True)
-            val_loaders.append(DataLoader(val_tds_i,
-                                          collate_fn=val_tds_i.get_collate_fn(max_tokens), sampler=sampler_i,
+            if distributed_bucketing:
+                print(f"\t\t- Preparing distributed bucketing sampler...")
+                batch_sampler_i = DistributedBucketBatchSampler(val_tds_i, batch_size=batch_size, max_tokens=max_tokens,
+                                                                sort_key=lambda x, y: (len(self.model._src_vocab.encode(x)), len(self.model._trg_vocab.encode(y))),
+                                                                sort_within_batch=self.model.packed_sequence, shuffle=False)
+                batch_params_i = dict(batch_sampler=batch_sampler_i)
+            else:
+                if use_bucketing:
+                    print(f"\t\t- Preparing bucketing iterator...")
+                    sampler_i = BucketIterator(val_tds_i, batch_size=batch_size,
+                                               sort_key=lambda x, y: len(self.model._src_vocab.encode(x)),
+                                               sort_within_batch=self.model.packed_sequence, shuffle=True)
+                batch_params_i = dict(sampler=sampler_i, batch_size=batch_size, shuffle=False)
+            val_loaders.append(loader_cls(val_tds_i,
+                                          collate_fn=val_tds_i.get_collate_fn(max_tokens),
                                           num_workers=num_workers, persistent_workers=bool(num_workers), pin_memory=pin_memory,
-                                          batch_size=batch_size, shuffle=False))
+                                          **batch_params_i))
 
         # Callbacks: Checkpoint
         ckpt_p = {}
@@ -201,8 +299,10 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         # Training
         pl_whitelist = set(inspect.signature(pl.Trainer.__init__).parameters)
         pl_params = {k: v for k, v in kwargs.items() if k in pl_whitelist}
+        if distributed_bucketing:  # Otherwise, Lightning replaces the sampler and the buckets are lost
+            pl_params["use_distributed_sampler"] = False
         trainer = pl.Trainer(logger=loggers, callbacks=callbacks, **pl_params)  # pl_params must be compatible with PL
-        trainer.fit(self.model, train_dataloaders=train_loader, val_dataloaders=val_loaders)
+        trainer.fit(self.model, train_dataloaders=train_loader, val_dataloaders=val_loaders, ckpt_path=kwargs.get("ckpt_path"))
 
         # Close stuff
         print("Finishing loggers(1/2)...")
@@ -215,7 +315,7 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
 
     def _translate(self, data_path, output_path, src_lang, trg_lang, beam_width, max_len_a, max_len_b, batch_size, max_tokens,
                    checkpoint, num_workers, devices, accelerator,
-                   force_overwrite, checkpoints_dir=None, filter_idx=0, **kwargs):
+                   force_overwrite, checkpoints_dir=None, filter_idx=0, shortlist=None, **kwargs):
         # Checkpoint
         if checkpoint:  # "best", "last", "filename", "path"
             self.from_checkpoint = self.load_checkpoint(checkpoint)
@@ -223,26 +323,162 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         # Set evaluation model
         self.model = set_model_device(self.model, accelerator=accelerator)
 
+        # Lexical shortlist (optional)
+        shortlist_key = shortlist if isinstance(shortlist, str) else bool(shortlist)
+        shortlist = self.load_shortlist(shortlist)
+
         # Iterative decoding
+        dataset = self.test_tds[filter_idx]
         search_algorithm = beam_search if beam_width > 1 else greedy_search
-        predictions, log_probabilities = search_algorithm(model=self.model, dataset=self.test_tds[filter_idx],
-                                                          sos_id=self.trg_vocab.sos_id,
-                                                          eos_id=self.trg_vocab.eos_id,
-                                                          pad_id=self.trg_vocab.pad_id,
-                                                          batch_size=batch_size, max_tokens=max_tokens,
-                                                          beam_width=beam_width, max_len_a=max_len_a, max_len_b=max_len_b,
-                                                          num_workers=num_workers)
+
+        # Sharded CPU decoding (optional)
+        num_procs = kwargs.get("num_procs") or 1
+        if num_procs > 1 and search_algorithm is greedy_search:
+            if self.model.device.type == "cpu":
+                search_algorithm = functools.partial(sharded_greedy_search, num_procs=num_procs,
+                                                     num_threads=kwargs.get("num_threads_per_proc"))
+            else:
+                print("\t- [WARNING]: 'num_procs' is only used on CPU. Ignoring it.")
+
+        search_kwargs = dict(sos_id=self.trg_vocab.sos_id, eos_id=self.trg_vocab.eos_id, pad_id=self.trg_vocab.pad_id,
+                             batch_size=batch_size, max_tokens=max_tokens,
+                             beam_width=beam_width, max_len_a=max_len_a, max_len_b=max_len_b,
+                             num_workers=num_workers, shortlist=shortlist)
+
+        # Translation cache (optional): Unique sentences are translated once, and cached ones are not translated
+        cache = self.load_translation_cache(kwargs.get("translation_cache"))
+        if cache is None:
+            predictions, log_probabilities = search_algorithm(model=self.model, dataset=dataset, **search_kwargs)
+            hyp_tok = self.trg_vocab.decode_batch(predictions)
+        else:
+            def translate_fn(idxs):
+                predictions, _ = search_algorithm(model=self.model, dataset=dataset.subset(idxs), **search_kwargs)
+                return self.trg_vocab.decode_batch(predictions)
+
+            prefix = cache.make_prefix(self.get_model_fingerprint(), self.src_vocab, self.trg_vocab,
+                                       beam_width=beam_width, max_len_a=max_len_a, max_len_b=max_len_b, shortlist=shortlist_key)
+            src_lines = [dataset[i][0] for i in range(len(dataset))]
+            hits0 = cache.hits
+            hyp_tok = translate_with_cache(src_lines, translate_fn, cache=cache, prefix=prefix)
+            print(f"\t- [INFO]: Translation cache: {cache.hits-hits0:,} hits ({len(src_lines):,} sentences)")
+
         # Decode output
-        self._postprocess_output(predictions=predictions, output_path=output_path)
+        self._postprocess_output(hyp_tok=hyp_tok, output_path=output_path)
 
-    def _postprocess_output(self, predictions, output_path):
+    def _postprocess_output(self, hyp_tok, output_path):
         """
         Important: src and ref will be overwritten with the original preprocessed files to avoid problems with unknowns
         """
-        # Decode: hyp
-        hyp_tok = [self.trg_vocab.decode(tokens) for tokens in predictions]
+        # Save: hyp
         write_file_lines(lines=hyp_tok, filename=os.path.join(output_path, "hyp.tok"), insert_break_line=True)
 
+    def translate_lines(self, lines, beam=1, batch_size=64, max_tokens=None, max_len_a=1.2, max_len_b=50,
+                        preprocess_fn=None, checkpoint=None, accelerator="auto", shortlist=None, translation_cache=None,
+                        ds=None, input_lang=None):
+        """
+        Translates an iterable of sentences in memory (no files are written).
+        The sentences are preprocessed, encoded, translated and decoded in chunks of 'batch_size' lines, and the
+        translations are yielded in the input order as soon as each chunk is done.
+        """
+        if beam > 1:
+            raise ValueError("Beam search with a width larger than '1' is currently disabled.")
+        if batch_size < 1:
+            raise ValueError("'batch_size' must be greater than zero")
+
+        # Set evaluation model
+        shortlist_key = shortlist if isinstance(shortlist, str) else bool(shortlist)
+        shortlist = self.prepare_inference(checkpoint=checkpoint, accelerator=accelerator, shortlist=shortlist)
+
+        # Translation cache (optional)
+        cache = self.load_translation_cache(translation_cache)
+        if cache is not None:
+            prefix = cache.make_prefix(self.get_model_fingerprint(), self.src_vocab, self.trg_vocab,
+                                       beam_width=beam, max_len_a=max_len_a, max_len_b=max_len_b, shortlist=shortlist_key)
+
+        lines = iter(lines)
+        while True:
+            chunk = list(itertools.islice(lines, batch_size))
+            if not chunk:
+                break
+            src_lines = self.preprocess_src_lines(chunk, preprocess_fn=preprocess_fn, ds=ds, input_lang=input_lang)
+            translate_fn = lambda idxs: self.translate_ids(*self.src_vocab.encode_batch([src_lines[i] for i in idxs]),
+                                                           max_tokens=max_tokens, max_len_a=max_len_a,
+                                                           max_len_b=max_len_b, shortlist=shortlist)
+            if cache is None:
+                hyp_tok = translate_fn(range(len(src_lines)))
+            else:
+                hyp_tok = translate_with_cache(src_lines, translate_fn, cache=cache, prefix=prefix)
+            yield from self.decode_hyp_lines(hyp_tok)
+
+    def _translate_lines(self, src_lines, beam_width, preprocess_fn, ds, batch_size=64, max_tokens=None,
+                         max_len_a=1.2, max_len_b=50, checkpoint=None, accelerator="auto", shortlist=None, **kwargs):
+        # In-memory evaluation (see: 'BaseTranslator.translate_in_memory')
+        return list(self.translate_lines(src_lines, beam=beam_width, batch_size=batch_size, max_tokens=max_tokens,
+                                         max_len_a=max_len_a, max_len_b=max_len_b, preprocess_fn=preprocess_fn,
+                                         checkpoint=checkpoint, accelerator=accelerator, shortlist=shortlist,
+                                         translation_cache=kwargs.get("translation_cache"), ds=ds,
+                                         input_lang=ds.src_lang if ds else None))
+
+    def prepare_inference(self, checkpoint=None, accelerator="auto", shortlist=None):
+        # Checkpoint
+        if checkpoint:  # "best", "last", "filename", "path"
+            self.from_checkpoint = self.load_checkpoint(checkpoint)
+
+        # Set evaluation model
+        self.model = set_model_device(self.model, accelerator=accelerator)
+        self.model.eval()
+
+        # Lexical shortlist (optional)
+        return check_shortlist(self.model, self.load_shortlist(shortlist))
+
+    def preprocess_src_lines(self, lines, preprocess_fn=None, ds=None, input_lang=None):
+        # Preprocess and encode: N texts => N preprocessed lines (e.g. subwords)
+        # 'input_lang' is the language of the lines (default: the vocabulary language), as in 'preprocess_predict_file'
+        src_vocab = self.src_vocab
+        lines = [line.strip() for line in lines]
+        if preprocess_fn:
+            lines = preprocess_fn({"lang": input_lang if input_lang else src_vocab.lang, "lines": lines}, ds)
+        return encode_lines(lines, src_vocab.lang, src_vocab.subword_model, src_vocab.pretok_flag, src_vocab.spm_model)
+
+    def encode_src_lines(self, lines, preprocess_fn=None, ds=None, input_lang=None):
+        # N texts => (N, L) padded ids + (N) lengths
+        return self.src_vocab.encode_batch(self.preprocess_src_lines(lines, preprocess_fn=preprocess_fn, ds=ds,
+                                                                     input_lang=input_lang))
+
+    def translate_ids(self, x_ids, x_lens, max_tokens=None, max_len_a=1.2, max_len_b=50, shortlist=None):
+        # Translate: (N, L) padded ids => N tokenized texts (see: 'prepare_inference')
+        trg_vocab = self.trg_vocab
+        predictions = []
+        with torch.no_grad():
+            # Split the batch to respect 'max_tokens' (no sentence is dropped)
+            for idxs in self._split_by_tokens(x_lens, max_tokens):
+                x_len = torch.from_numpy(x_lens[idxs])
+                x = torch.from_numpy(np.ascontiguousarray(x_ids[idxs, :int(x_len.max())]))
+                y_pred = greedy_decode(self.model, x, x_len, sos_id=trg_vocab.sos_id, eos_id=trg_vocab.eos_id,
+                                       pad_id=trg_vocab.pad_id, max_len_a=max_len_a, max_len_b=max_len_b,
+                                       shortlist=shortlist)
+                predictions.extend(trg_vocab.decode_batch(y_pred))
+        return predictions
+
+    def decode_hyp_lines(self, lines):
+        # N tokenized texts => N texts
+        trg_vocab = self.trg_vocab
+        return decode_lines(lines, trg_vocab.lang, trg_vocab.subword_model, trg_vocab.pretok_flag, trg_vocab.spm_model)
+
+    @staticmethod
+    def _split_by_tokens(lengths, max_tokens):
+        # Consecutive slices with at most 'max_tokens' padded tokens (at least one sentence each)
+        if not max_tokens:
+            return [slice(0, len(lengths))]
+        slices, start, max_len = [], 0, 0
+        for i, length in enumerate(lengths):
+            max_len = max(max_len, int(length))
+            if i > start and (i - start + 1) * max_len > max_tokens:
+                slices.append(slice(start, i))
+                start, max_len = i, int(length)
+        slices.append(slice(start, len(lengths)))
+        return slices
+
     @staticmethod
     def _count_model_parameters(model):
         trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
@@ -278,11 +514,51 @@ class AutonmtTranslator(BaseTranslator):  # AutoNMT Translator
         else:
             raise ValueError("'checkpoint' must be a filename or 'best' or 'last'")
 
-        # Load checkpoint
-        _model = torch.load(checkpoint_path)
-        self.model.load_state_dict(_model.get("state_dict", _model))
+        # Load checkpoint (unless it is already loaded). Checkpoints are read once per process (see: 'checkpoint_cache')
+        checkpoint_key = checkpoint_cache.get_key(checkpoint_path)
+        if checkpoint_key != self.loaded_checkpoint:
+            self.model.load_state_dict(checkpoint_cache.load(checkpoint_path))
+            self.loaded_checkpoint, self.model_fingerprint = checkpoint_key, None
         return checkpoint_path
 
+    def get_model_fingerprint(self):
+        # The weights are hashed once per loaded checkpoint (reset when another one is loaded or the model is trained)
+        if self.model_fingerprint is None:
+            self.model_fingerprint = model_fingerprint(self.model)
+        return self.model_fingerprint
+
+    def load_shortlist(self, shortlist):
+        # None/False: Disabled; True: Default shortlist of the model; str: Path; Shortlist: Already loaded
+        if not shortlist or isinstance(shortlist, Shortlist):
+            return shortlist if shortlist else None
+        elif shortlist is True:
+            vocab_lang = self.src_vocab.lang if self.src_vocab.lang == self.trg_vocab.lang else f"{self.src_vocab.lang}-{self.trg_vocab.lang}"
+            shortlist_path = os.path.join(os.path.dirname(self.src_vocab.vocab_path), f"{vocab_lang}.shortlist")
+        else:
+            shortlist_path = shortlist
+
+        # Load shortlist (once)
+        if shortlist_path not in self.shortlists:
+            if not os.path.isfile(shortlist_path):
+                raise ValueError(f"Shortlist not found: {shortlist_path}. (Hint: 'DatasetBuilder.build(make_shortlists=True)')")
+            print(f"\t- [INFO]: Loading shortlist: {shortlist_path}")
+            self.shortlists[shortlist_path] = Shortlist(self.src_vocab, self.trg_vocab).load(shortlist_path)
+        return self.shortlists[shortlist_path]
+
+    def load_translation_cache(self, cache):
+        # None/False: Disabled; True: In-memory LRU cache; str: SQLite file; TranslationCache: Already loaded
+        if not cache or isinstance(cache, TranslationCache):
+            return cache if cache else None
+
+        # Open cache (once)
+        if cache not in self.translation_caches:
+            if cache is True:
+                self.translation_caches[cache] = LRUTranslationCache()
+            else:
+                print(f"\t- [INFO]: Opening translation cache: {cache}")
+                self.translation_caches[cache] = SQLiteTranslationCache(cache)
+        return self.translation_caches[cache]
+
     def get_checkpoint_path(self, mode="best"):
         return self._get_checkpoints(self.get_model_checkpoints_path(), mode=mode)
 
@@ -1,14 +1,19 @@
 import datetime
+import functools
+import multiprocessing
 import os.path
 import shutil
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import List, Set
 
 from autonmt.bundle.metrics import *
 from autonmt.bundle.utils import *
+from autonmt.bundle.split_cache import SplitCache
+from autonmt.bundle.eval_cache import EncodedSetCache
 from autonmt.preprocessing.dataset import Dataset
 from autonmt.preprocessing.scores import Score
-from autonmt.preprocessing.processors import preprocess_predict_file, pretokenize_file, encode_file, decode_file
+from autonmt.preprocessing.processors import preprocess_predict_file, preprocess_predict_lines, pretokenize_file, encode_file, decode_file
 
 
 def _check_datasets(train_ds: Dataset = None, eval_ds: Dataset = None):
@@ -79,6 +84,8 @@ class BaseTranslator(ABC):
         self.src_vocab = src_vocab
         self.trg_vocab = trg_vocab
         self.from_checkpoint = None
+        self.loaded_checkpoint = None  # (path, mtime)
+        self.model_fingerprint = None  # Hash of the loaded weights (computed once per checkpoint)
         self.safe_seconds = safe_seconds
         self.trained_ds = []  # Trick to perform evaluate "same"
 
@@ -86,6 +93,7 @@ class BaseTranslator(ABC):
         self.filter_tr_data_fn = ('', None) if not filter_tr_data_fn else filter_tr_data_fn
         self.filter_vl_data_fn = [('', None)] if not filter_vl_data_fn else filter_vl_data_fn
         self.filter_ts_data_fn = [('', None)] if not filter_ts_data_fn else filter_ts_data_fn
+        self.split_cache = SplitCache()  # Splits are read once, and the filters are cached by name
 
         # Models paths: toolkit/runs/model_name/[checkpoints, logs, eval]
         self.models_checkpoints_path = "checkpoints"
@@ -173,19 +181,159 @@ class BaseTranslator(ABC):
         if not eval_datasets:
             print(f"=> [Predict]: Skipped. No valid test datasets were found.")
 
-        # Translate and score
+        self.loaded_checkpoint = self.model_fingerprint = None  # The checkpoint is loaded (and hashed) once
+        scoring_executor = None
+        try:
+            # Zero-file evaluation: Lines flow between stages in memory (artifacts are optional)
+            if kwargs.get("in_memory_eval"):
+                return self._predict_in_memory(eval_datasets, beams=beams, metrics=metrics, max_len_a=max_len_a,
+                                               max_len_b=max_len_b, batch_size=batch_size, max_tokens=max_tokens,
+                                               devices=devices, accelerator=accelerator, num_workers=num_workers,
+                                               checkpoint=load_checkpoint, preprocess_fn=preprocess_fn,
+                                               force_overwrite=force_overwrite, **kwargs)
+
+            # Parallel scoring (optional): The metric tools run in a process pool, pipelined with the translation
+            if kwargs.get("scoring_procs"):
+                scoring_executor = ProcessPoolExecutor(max_workers=kwargs.get("scoring_procs"),
+                                                       mp_context=multiprocessing.get_context("spawn"))
+                kwargs["scoring_executor"] = scoring_executor
+
+            # Translate and score
+            for eval_ds in eval_datasets:
+                pending_scores = {}  # {(split_name, beam): futures}
+                if scoring_executor:
+                    kwargs["pending_scores"] = pending_scores
+                    kwargs["on_translated"] = functools.partial(self._submit_scores, pending_scores, eval_ds, metrics,
+                                                                force_overwrite, scoring_executor)
+                self.translate(eval_ds, beams=beams, max_len_a=max_len_a, max_len_b=max_len_b,
+                               batch_size=batch_size, max_tokens=max_tokens,
+                               devices=devices, accelerator=accelerator, num_workers=num_workers,
+                               checkpoint=load_checkpoint, preprocess_fn=preprocess_fn,
+                               force_overwrite=force_overwrite, **kwargs)
+                self.score_translations(eval_ds, beams=beams, metrics=metrics, force_overwrite=force_overwrite, **kwargs)
+                run_scores = self.parse_metrics(eval_ds, beams=beams, metrics=metrics,
+                                                  engine=self.engine, force_overwrite=force_overwrite, **kwargs)
+                scores.append(run_scores)
+            return scores
+        finally:
+            self.loaded_checkpoint = self.model_fingerprint = None
+            if scoring_executor:
+                scoring_executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit_scores(self, pending_scores, eval_ds, metrics, force_overwrite, executor, fn_name, beam):
+        # Called by 'translate' after each beam. The futures are awaited in 'score_translations'
+        pending_scores[(fn_name, beam)] = self.score_beam(eval_ds, fn_name=fn_name, beam=beam, metrics=metrics,
+                                                          force_overwrite=force_overwrite, executor=executor)
+
+    def _predict_in_memory(self, eval_datasets, beams, metrics, preprocess_fn, force_overwrite, **kwargs):
+        # These options only apply to the file-based evaluation
+        for option in ("scoring_procs", "num_procs", "eval_cache_dir"):
+            if kwargs.get(option):
+                print(f"\t- [WARNING]: '{option}' is not supported with 'in_memory_eval'. Ignoring it.")
+
+        save_artifacts = kwargs.get("save_eval_artifacts", False)
+        executor = ThreadPoolExecutor(max_workers=1) if save_artifacts else None  # Writes files in the background
+        scores = []
         for eval_ds in eval_datasets:
-            self.translate(eval_ds, beams=beams, max_len_a=max_len_a, max_len_b=max_len_b,
-                           batch_size=batch_size, max_tokens=max_tokens,
-                           devices=devices, accelerator=accelerator, num_workers=num_workers,
-                           checkpoint=load_checkpoint, preprocess_fn=preprocess_fn,
-                           force_overwrite=force_overwrite, **kwargs)
-            self.score_translations(eval_ds, beams=beams, metrics=metrics, force_overwrite=force_overwrite, **kwargs)
-            run_scores = self.parse_metrics(eval_ds, beams=beams, metrics=metrics,
-                                              engine=self.engine, force_overwrite=force_overwrite, **kwargs)
+            translations = self.translate_in_memory(eval_ds, beams=beams, preprocess_fn=preprocess_fn, **kwargs)
+            raw_scores = self.score_lines(eval_ds, translations=translations, metrics=metrics)
+            run_scores = self.parse_metrics(eval_ds, beams=beams, metrics=metrics, engine=self.engine,
+                                            raw_scores=raw_scores, force_overwrite=force_overwrite, **kwargs)
             scores.append(run_scores)
+
+            # Save translations and scores (optional)
+            if executor:
+                executor.submit(self.save_eval_artifacts, eval_ds, translations, raw_scores, force_overwrite)
+
+        # Wait for the artifacts
+        if executor:
+            executor.shutdown(wait=True)
         return scores
 
+    def _translate_lines(self, src_lines, beam_width, preprocess_fn, ds, **kwargs):
+        raise NotImplementedError(f"In-memory evaluation is not supported by the '{self.engine}' engine")
+
+    def translate_in_memory(self, eval_ds, beams, preprocess_fn, **kwargs):
+        """
+        Translates the test split of 'eval_ds' without writing intermediate files.
+        Returns {(split_name, beam): {"src": lines, "ref": lines, "hyp": lines}}
+        """
+        print(f"=> [Translate]: Started (in memory). (Model: {self.run_name} | Test: {str(eval_ds)})")
+
+        # Check preprocessing
+        _check_datasets(eval_ds=eval_ds)
+
+        # Raw src/ref files (read once)
+        src_file = eval_ds.get_split_path(f"{eval_ds.test_name}.{eval_ds.src_lang}")
+        ref_file = eval_ds.get_split_path(f"{eval_ds.test_name}.{eval_ds.trg_lang}")
+
+        translations = {}
+        for fn_name, filter_fn in self.filter_ts_data_fn:
+            extra_str = f" | split='{fn_name}'" if fn_name else ""
+            src_lines, ref_lines = self.split_cache.get_view(src_file, ref_file, fn_name, filter_fn, from_fn="translate")
+
+            # Iterate over beams
+            for beam in beams:
+                start_time = time.time()
+                hyp_lines = self._translate_lines(src_lines, beam_width=beam, preprocess_fn=preprocess_fn, ds=eval_ds, **kwargs)
+                if len(hyp_lines) != len(ref_lines):
+                    raise ValueError(f"The number of references ({len(ref_lines)}) and hypotheses ({len(hyp_lines)}) "
+                                     f"does not match.")
+
+                # Post-process lines to make them more 'equal' during evaluation
+                d = {"src": src_lines, "ref": ref_lines, "hyp": hyp_lines}
+                if preprocess_fn:
+                    langs = {"src": (eval_ds.src_lang, self.src_vocab), "ref": (eval_ds.trg_lang, self.trg_vocab),
+                             "hyp": (eval_ds.trg_lang, self.trg_vocab)}
+                    for k, (input_lang, vocab) in langs.items():
+                        d[k] = preprocess_predict_lines(d[k], preprocess_fn=preprocess_fn, pretokenize=vocab.pretok_flag,
+                                                        input_lang=input_lang, vocab_lang=vocab.lang, ds=eval_ds)
+                translations[(fn_name, beam)] = d
+                print(f"\t- [INFO]: Translating time (beam={str(beam)}{extra_str}): {str(datetime.timedelta(seconds=time.time() - start_time))}")
+        return translations
+
+    def score_lines(self, eval_ds, translations, metrics):
+        """
+        Scores the translations of 'translate_in_memory'. Returns {(split_name, beam): {tool: scores}}
+        """
+        print(f"=> [Scoring translations]: Started (in memory). (Model: {self.run_name} | Test: {str(eval_ds)})")
+
+        # Check supported metrics
+        metrics_valid = _check_supported_metrics(metrics, self.METRICS2TOOL.keys())
+        if not metrics_valid:
+            return {}
+        if self.TOOL2METRICS["fairseq"].intersection(metrics):
+            print("\t- [WARNING]: 'fairseq' scores are only available through files. Ignoring metric.")
+
+        raw_scores = {}
+        for (fn_name, beam), d in translations.items():
+            start_time = time.time()
+            extra_str = f" | split='{fn_name}'" if fn_name else ""
+            if not d["hyp"] or not d["ref"]:
+                raise ValueError("Empty translations (hyp/ref)")
+
+            beam_scores = {}
+            hg_metrics = {x[3:] for x in metrics if x.startswith("hg_")}
+            for m_tool in ["sacrebleu", "bertscore", "comet", "huggingface"]:
+                m_metrics = hg_metrics if m_tool == "huggingface" else metrics
+                if (m_tool == "huggingface" and hg_metrics) or self.TOOL2METRICS.get(m_tool, set()).intersection(metrics):
+                    beam_scores[m_tool] = compute_scores(m_tool, d["src"], d["hyp"], d["ref"], m_metrics, self.trg_vocab.lang)
+            raw_scores[(fn_name, beam)] = beam_scores
+            print(f"\t- [INFO]: Scoring time (beam={str(beam)}{extra_str}): {str(datetime.timedelta(seconds=time.time() - start_time))}")
+        return raw_scores
+
+    def save_eval_artifacts(self, eval_ds, translations, raw_scores, force_overwrite):
+        # Same layout as the file-based evaluation: src.txt, ref.txt, hyp.txt and scores/*.json
+        for (fn_name, beam), d in translations.items():
+            output_path = self.get_model_eval_translations_beam_path(eval_name=str(eval_ds), split_name=fn_name, beam=beam)
+            scores_path = self.get_model_eval_translations_beam_scores_path(eval_name=str(eval_ds), split_name=fn_name, beam=beam)
+            make_dir([output_path, scores_path])
+            for fname in ["src", "ref", "hyp"]:
+                write_file_lines(lines=d[fname], filename=os.path.join(output_path, f"{fname}.txt"), insert_break_line=True)
+            for m_tool, m_scores in raw_scores.get((fn_name, beam), {}).items():
+                filename = os.path.join(scores_path, f"{self.TOOL_PARSERS[m_tool]['filename']}.json")
+                save_json(m_scores, filename, allow_overwrite=force_overwrite)
+
     @abstractmethod
     def _preprocess(self, *args, **kwargs):
         pass
@@ -272,6 +420,7 @@ class BaseTranslator(ABC):
         model_vocab_paths = {self.src_vocab.lang: self.src_vocab.model_path, self.trg_vocab.lang: self.trg_vocab.model_path}
         subword_models = {self.src_vocab.lang: self.src_vocab.subword_model, self.trg_vocab.lang: self.trg_vocab.subword_model}
         test_fnames = [f"{eval_ds.test_name}.{eval_ds.src_lang}", f"{eval_ds.test_name}.{eval_ds.trg_lang}"]  #  IMP! => (0: src, 1: trg)
+        eval_cache = EncodedSetCache(kwargs.get("eval_cache_dir")) if kwargs.get("eval_cache_dir") else None
         for i, ts_fname in enumerate(test_fnames):
             input_file = eval_ds.get_split_path(ts_fname)   # As "raw" as possible. The split preprocessing will depend on the model
             input_lang = ts_fname.split(".")[-1]
@@ -287,18 +436,38 @@ class BaseTranslator(ABC):
                 assert os.path.exists(source_file)
                 input_file = source_file
 
-            # 2 - Preprocess file (+pretokenization if needed)
+            # Shared cache: Reuse the files preprocessed and encoded by other runs with the same vocabulary
             preprocessed_file = os.path.join(dst_preprocessed_path, ts_fname)
+            enc_file = os.path.join(dst_encoded_path, ts_fname)
+            cached_files = {"preprocessed": preprocessed_file, "encoded": enc_file}
+            if eval_cache:
+                cache_key = eval_cache.make_key(input_file=source_file, preprocess_fn=preprocess_fn,
+                                                input_lang=input_lang, vocab_lang=vocab_lang, pretok_flag=pretok_flags[vocab_lang],
+                                                subword_model=subword_models[vocab_lang],
+                                                model_vocab_path=model_vocab_paths[vocab_lang])
+                if not force_overwrite and eval_cache.get(cache_key, cached_files):
+                    print(f"\t- [INFO]: Reusing preprocessed and encoded file from the eval cache: {ts_fname}")
+                    continue
+
+                # The files might be hardlinks to the cache (do not overwrite them in place)
+                for f in cached_files.values():
+                    if force_overwrite and os.path.exists(f):
+                        os.remove(f)
+
+            # 2 - Preprocess file (+pretokenization if needed)
             preprocess_predict_file(input_file=input_file, output_file=preprocessed_file, preprocess_fn=preprocess_fn,
                                     pretokenize=pretok_flags[vocab_lang], input_lang=input_lang, vocab_lang=vocab_lang,
                                     ds=eval_ds, force_overwrite=force_overwrite)
             input_file = preprocessed_file
 
             # Encode file
-            enc_file = os.path.join(dst_encoded_path, ts_fname)
             encode_file(input_file=input_file, output_file=enc_file, model_vocab_path=model_vocab_paths[vocab_lang],
                         subword_model=subword_models[vocab_lang], force_overwrite=force_overwrite)
 
+            # Add to the shared cache
+            if eval_cache:
+                eval_cache.put(cache_key, cached_files)
+
         # Preprocess external data
         test_path = os.path.join(dst_encoded_path, eval_ds.test_name)  # without lang extension
         self._preprocess(train_path=None, val_path=None, test_path=test_path,
@@ -347,15 +516,14 @@ class BaseTranslator(ABC):
                     src_input_file = os.path.join(dst_raw_path, f"{eval_ds.test_name}.{eval_ds.src_lang}")
                     ref_input_file = os.path.join(dst_raw_path, f"{eval_ds.test_name}.{eval_ds.trg_lang}")
 
-                    # Filter src/ref sentences if needed
+                    # Filter src/ref sentences if needed (the filter is computed once for all beams)
                     if not filter_fn:
                         shutil.copyfile(src_input_file, src_output_file)  # Copy src raw files
                         shutil.copyfile(ref_input_file, ref_output_file)  # Copy trg raw files
                     else:
                         print(f"Filtering src/ref raw files (split='{fn_name}')...")
-                        src_ref_lines = read_file_lines(filename=src_input_file, autoclean=True)
-                        trg_ref_lines = read_file_lines(filename=ref_input_file, autoclean=True)
-                        src_ref_lines, trg_ref_lines = filter_fn(src_ref_lines, trg_ref_lines, from_fn="translate")
+                        src_ref_lines, trg_ref_lines = self.split_cache.get_view(src_input_file, ref_input_file, fn_name,
+                                                                                 filter_fn, from_fn="translate")
                         write_file_lines(filename=src_output_file, lines=src_ref_lines, autoclean=True, insert_break_line=True)
                         write_file_lines(filename=ref_output_file, lines=trg_ref_lines, autoclean=True, insert_break_line=True)
 
@@ -384,6 +552,9 @@ class BaseTranslator(ABC):
 
                 print(f"\t- [INFO]: Translating time (beam={str(beam)}{extra_str}): {str(datetime.timedelta(seconds=time.time() - start_time))}")
 
+                # Pipelined scoring: This beam is scored while the next one is translated
+                if kwargs.get("on_translated"):
+                    kwargs["on_translated"](fn_name, beam)
 
     def score_translations(self, eval_ds: Dataset, beams: List[int], metrics: Set[str], force_overwrite, **kwargs):
         print(f"=> [Scoring translations]: Started. (Model: {self.run_name} | Test: {str(eval_ds)})")
@@ -397,63 +568,93 @@ class BaseTranslator(ABC):
             return
 
         # Allow to split ts data (optional)
+        start_time = time.time()
+        executor = kwargs.get("scoring_executor")
+        pending_scores = kwargs.get("pending_scores") or {}
+        futures = []
         for fn_name, _ in self.filter_ts_data_fn:
             extra_str = f" | split='{fn_name}'" if fn_name else ""
 
             # Iterate over beams
             for beam in beams:
-                start_time = time.time()
+                beam_start_time = time.time()
+
+                # Scores submitted while translating (pipelined), or pending
+                if (fn_name, beam) in pending_scores:
+                    futures += pending_scores.pop((fn_name, beam))
+                else:
+                    futures += self.score_beam(eval_ds, fn_name=fn_name, beam=beam, metrics=metrics,
+                                               force_overwrite=force_overwrite, executor=executor)
+                if not executor:
+                    print(f"\t- [INFO]: Scoring time (beam={str(beam)}{extra_str}): {str(datetime.timedelta(seconds=time.time() - beam_start_time))}")
+
+        # Wait for the metric tools (running in parallel)
+        for future in futures:
+            future.result()
+        if executor:
+            print(f"\t- [INFO]: Scoring time: {str(datetime.timedelta(seconds=time.time() - start_time))}")
+
+    def score_beam(self, eval_ds, fn_name, beam, metrics, force_overwrite, executor=None):
+        """
+        Scores the translations of a beam (the files are read once). If an executor is given, the metric tools are
+        submitted to it and their futures are returned
+        """
+        # Paths
+        beam_path = self.get_model_eval_translations_beam_path(eval_name=str(eval_ds), split_name=fn_name, beam=beam)
+        scores_path = self.get_model_eval_translations_beam_scores_path(eval_name=str(eval_ds), split_name=fn_name, beam=beam)
+        make_dir([scores_path])
+
+        # Set input files (results)
+        src_file_path = os.path.join(beam_path, "src.txt")
+        ref_file_path = os.path.join(beam_path, "ref.txt")
+        hyp_file_path = os.path.join(beam_path, "hyp.txt")
+
+        # Check that the paths exists
+        if not all([os.path.exists(p) for p in [src_file_path, ref_file_path, hyp_file_path]]):
+            raise IOError("Missing files to compute scores")
+
+        # Metric tools: bleu, chrf and ter (sacrebleu), bertscore, comet and huggingface
+        jobs = []
+        for m_tool in ["sacrebleu", "bertscore", "comet"]:
+            if self.TOOL2METRICS[m_tool].intersection(metrics):
+                jobs.append((m_tool, metrics))
+        hg_metrics = {x[3:] for x in metrics if x.startswith("hg_")}
+        if hg_metrics:
+            jobs.append(("huggingface", hg_metrics))
+        jobs = [(m_tool, os.path.join(scores_path, f"{self.TOOL_PARSERS[m_tool]['filename']}.json"), m_metrics)
+                for m_tool, m_metrics in jobs]
+        jobs = [job for job in jobs if force_overwrite or not os.path.exists(job[1])]
+
+        # Score: fairseq
+        if self.TOOL2METRICS["fairseq"].intersection(metrics):
+            output_file = os.path.join(scores_path, f"fairseq_scores.txt")
+            if force_overwrite or not os.path.exists(output_file):
+                compute_fairseq(ref_file=ref_file_path, hyp_file=hyp_file_path, output_file=output_file)
+
+        if not jobs:
+            return []
+
+        # Read files (once)
+        src_lines = read_file_lines(src_file_path, autoclean=True)
+        ref_lines = read_file_lines(ref_file_path, autoclean=True)
+        hyp_lines = read_file_lines(hyp_file_path, autoclean=True)
+        assert len(src_lines) == len(ref_lines) == len(hyp_lines)
+
+        # Check if files have content
+        if not hyp_lines or not ref_lines:
+            raise ValueError("Files empty (hyp/ref)")
+
+        # Score
+        futures = []
+        for m_tool, output_file, m_metrics in jobs:
+            args = (m_tool, output_file, src_lines, hyp_lines, ref_lines, m_metrics, self.trg_vocab.lang)
+            if executor:
+                futures.append(executor.submit(save_scores, *args))
+            else:
+                save_scores(*args)
+        return futures
 
-                # Paths
-                beam_path = self.get_model_eval_translations_beam_path(eval_name=str(eval_ds), split_name=fn_name, beam=beam)
-                scores_path = self.get_model_eval_translations_beam_scores_path(eval_name=str(eval_ds), split_name=fn_name, beam=beam)
-                make_dir([scores_path])
-
-                # Set input files (results)
-                src_file_path = os.path.join(beam_path, "src.txt")
-                ref_file_path = os.path.join(beam_path, "ref.txt")
-                hyp_file_path = os.path.join(beam_path, "hyp.txt")
-
-                # Check that the paths exists
-                if not all([os.path.exists(p) for p in [src_file_path, ref_file_path, hyp_file_path]]):
-                    raise IOError("Missing files to compute scores")
-
-                # Score: bleu, chrf and ter
-                if self.TOOL2METRICS["sacrebleu"].intersection(metrics):
-                    output_file = os.path.join(scores_path, f"sacrebleu_scores.json")
-                    if force_overwrite or not os.path.exists(output_file):
-                        compute_sacrebleu(ref_file=ref_file_path, hyp_file=hyp_file_path, output_file=output_file, metrics=metrics)
-
-                # Score: bertscore
-                if self.TOOL2METRICS["bertscore"].intersection(metrics):
-                    output_file = os.path.join(scores_path, f"bertscore_scores.json")
-                    if force_overwrite or not os.path.exists(output_file):
-                        compute_bertscore(ref_file=ref_file_path, hyp_file=hyp_file_path, output_file=output_file, trg_lang=self.trg_vocab.lang)
-
-                # Score: comet
-                if self.TOOL2METRICS["comet"].intersection(metrics):
-                    output_file = os.path.join(scores_path, f"comet_scores.json")
-                    if force_overwrite or not os.path.exists(output_file):
-                        compute_comet(src_file=src_file_path, ref_file=ref_file_path, hyp_file=hyp_file_path, output_file=output_file)
-
-                 # Score: fairseq
-                if self.TOOL2METRICS["fairseq"].intersection(metrics):
-                    output_file = os.path.join(scores_path, f"fairseq_scores.txt")
-                    if force_overwrite or not os.path.exists(output_file):
-                        compute_fairseq(ref_file=ref_file_path, hyp_file=hyp_file_path, output_file=output_file)
-
-                # Huggingface metrics
-                hg_metrics = {x[3:] for x in metrics if x.startswith("hg_")}
-                if hg_metrics:
-                    output_file = os.path.join(scores_path, f"huggingface_scores.json")
-                    if force_overwrite or not os.path.exists(output_file):
-                        compute_huggingface(src_file=src_file_path, hyp_file=hyp_file_path, ref_file=ref_file_path,
-                                            output_file=output_file, metrics=hg_metrics, trg_lang=self.trg_vocab.lang)
-
-                print(f"\t- [INFO]: Scoring time (beam={str(beam)}{extra_str}): {str(datetime.timedelta(seconds=time.time() - start_time))}")
-
-
-    def parse_metrics(self, eval_ds, beams, metrics, **kwargs):
+    def parse_metrics(self, eval_ds, beams, metrics, raw_scores=None, **kwargs):
         print(f"=> [Parsing]: Started. ({str(eval_ds)})")
 
         # Check preprocessing
@@ -531,6 +732,17 @@ class BaseTranslator(ABC):
                     m_parser, ext = values["py"]
                     m_fname = f"{values['filename']}.{ext}"
 
+                    # Scores computed in memory (zero-file evaluation)
+                    if raw_scores is not None:
+                        if m_tool in raw_scores.get((fn_name, beam), {}):
+                            m_scores = m_parser(text=[json.dumps(raw_scores[(fn_name, beam)][m_tool])])
+                            for m_name, m_values in m_scores.items():
+                                for score_name, score_value in m_values.items():
+                                    beam_scores[f"{m_tool}_{m_name}_{score_name}".lower().strip()] = score_value
+                        else:
+                            print(f"\t- [WARNING]: There are no metrics from '{m_tool}'")
+                        continue
+
                     # Read file
                     filename = os.path.join(scores_path, m_fname)
                     if os.path.exists(filename):
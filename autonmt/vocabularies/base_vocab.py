@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+import numpy as np
+
 
 class BaseVocabulary(ABC):
     def __init__(self, sos_id, eos_id, pad_id, sos_piece, eos_piece, pad_piece, lang=None, max_tokens=None):
@@ -28,4 +30,32 @@ class BaseVocabulary(ABC):
     def decode(self, *args, **kwargs):
         pass
 
+    def encode_batch(self, texts, add_special_tokens=True):
+        # N texts => (N, L) padded ids + (N) lengths
+        idxs = [self.encode(text, add_special_tokens=add_special_tokens) for text in texts]
+        return pad_ids(idxs, pad_id=self.pad_id)
+
+    def decode_batch(self, idxs, remove_special_tokens=True):
+        # (N, L) ids => N texts (ragged rows are decoded up to their length)
+        idxs, lengths = to_numpy_ids(idxs, pad_id=self.pad_id)
+        return [self.decode(list(row[:n]), remove_special_tokens=remove_special_tokens) for row, n in zip(idxs, lengths)]
+
+
+def pad_ids(idxs, pad_id):
+    # List of sequences => (N, L) padded ids + (N) lengths
+    lengths = np.array([len(x) for x in idxs], dtype=np.int64)
+    padded = np.full((len(idxs), lengths.max(initial=0)), pad_id, dtype=np.int64)
+    for i, x in enumerate(idxs):
+        padded[i, :len(x)] = x
+    return padded, lengths
+
+
+def to_numpy_ids(idxs, pad_id):
+    # Tensor, array or (ragged) list of sequences => (N, L) array + (N) lengths (the padding is not part of the rows)
+    if hasattr(idxs, "detach"):  # torch.Tensor
+        idxs = idxs.detach().cpu().numpy()
+    if isinstance(idxs, np.ndarray) and idxs.ndim == 2:
+        return idxs, np.full(idxs.shape[0], idxs.shape[1], dtype=np.int64)
+    return pad_ids(list(idxs), pad_id=pad_id)
+
 
@@ -1,7 +1,9 @@
 from collections import Counter
 
-from autonmt.bundle.utils import read_file_lines, write_file_lines, flatten, hex2text
-from autonmt.vocabularies.base_vocab import BaseVocabulary
+import numpy as np
+
+from autonmt.bundle.utils import read_file_lines, write_file_lines, flatten, text2bytes
+from autonmt.vocabularies.base_vocab import BaseVocabulary, to_numpy_ids
 
 
 class Vocabulary(BaseVocabulary):
@@ -19,7 +21,7 @@ class Vocabulary(BaseVocabulary):
 
         # Build vocab
         self.voc2idx = {}
-        self.idx2voc = {}
+        self.idx2voc = np.array([], dtype=object)  # Array-backed (vectorized decoding)
         self.voc2freq = {}
 
         # Common flags
@@ -52,7 +54,7 @@ class Vocabulary(BaseVocabulary):
         # Tokens must include the special tokens
         tokens = special_tokens + tokens  # Do not sort
         self.voc2idx = {tok: idx for idx, (tok, _) in enumerate(tokens)}
-        self.idx2voc = {idx: tok for idx, (tok, _) in enumerate(tokens)}
+        self.idx2voc = np.array([tok for tok, _ in tokens], dtype=object)
         self.voc2freq = {tok: freq for idx, (tok, freq) in enumerate(tokens)}
 
         self._assert_vocab()
@@ -82,44 +84,90 @@ class Vocabulary(BaseVocabulary):
         self._assert_vocab()
         return self
 
+    def get_frequencies(self, filename=None):
+        # Read token frequencies from the '.vocabf' file (exported by the DatasetBuilder) => [freq_id0, freq_id1,...]
+        filename = filename if filename else self.vocab_path + "f"
+        frequencies = [0] * len(self)
+        for line in read_file_lines(filename, autoclean=True, remove_empty=True):
+            tok, freq = line.split('\t')
+            if tok in self.voc2idx:
+                frequencies[self.voc2idx[tok]] = int(float(freq))
+        return frequencies
+
     def get_tokens(self):
         # Tokens must be returned in their correct order
-        return [self.idx2voc[i] for i in range(len(self.idx2voc))]
+        return self.idx2voc.tolist()
 
     def encode(self, text, add_special_tokens=True):
-        tokens = text.strip().split(' ')
-        idxs = [self.voc2idx.get(tok, self.unk_id) for tok in tokens]
+        if self.subword_model == "bytes":  # byte + offset (special tokens go first)
+            idxs = [byte + len(self.special_tokens()) for byte in text2bytes(text)]
+        else:
+            tokens = text.strip().split(' ')
+            idxs = [self.voc2idx.get(tok, self.unk_id) for tok in tokens]
         idxs = idxs[:self.max_tokens - 2 * int(add_special_tokens)] if self.max_tokens else idxs  # count <sos> and <eos>
         idxs = [self.sos_id] + idxs + [self.eos_id] if add_special_tokens else idxs
         return idxs
 
+    def encode_batch(self, texts, add_special_tokens=True):
+        # N texts => (N, L) padded ids + (N) lengths
+        if self.subword_model == "bytes":
+            tokens = [text2bytes(text) for text in texts]
+        else:
+            tokens = [text.strip().split(' ') for text in texts]
+        if self.max_tokens:  # count <sos> and <eos>
+            tokens = [toks[:self.max_tokens - 2 * int(add_special_tokens)] for toks in tokens]
+        num_tokens = np.array([len(toks) for toks in tokens], dtype=np.int64)
+
+        # Single lookup pass over the flattened tokens
+        if self.subword_model == "bytes":  # byte + offset (no lookup)
+            flat_idxs = np.frombuffer(b''.join(tokens), dtype=np.uint8).astype(np.int64) + len(self.special_tokens())
+        else:
+            flat_idxs = np.fromiter((self.voc2idx.get(tok, self.unk_id) for toks in tokens for tok in toks),
+                                    dtype=np.int64, count=int(num_tokens.sum()))
+
+        # Scatter ids into a padded matrix
+        offset = int(add_special_tokens)
+        lengths = num_tokens + 2 * offset
+        idxs = np.full((len(tokens), lengths.max(initial=0)), self.pad_id, dtype=np.int64)
+        rows = np.repeat(np.arange(len(tokens)), num_tokens)
+        cols = np.arange(len(flat_idxs)) - np.repeat(np.cumsum(num_tokens) - num_tokens, num_tokens) + offset
+        idxs[rows, cols] = flat_idxs
+        if add_special_tokens:
+            idxs[:, 0] = self.sos_id
+            idxs[np.arange(len(tokens)), lengths - 1] = self.eos_id
+        return idxs, lengths
+
     def decode(self, idxs, remove_special_tokens=True):
-        # Remove special tokens
+        return self.decode_batch([idxs], remove_special_tokens=remove_special_tokens)[0]
+
+    def decode_batch(self, idxs, remove_special_tokens=True):
+        # (N, L) ids (array, tensor or ragged list) => N texts
+        idxs, lengths = to_numpy_ids(idxs, pad_id=self.pad_id)
+        if idxs.shape[1] == 0:
+            return [''] * idxs.shape[0]
+        positions = np.arange(idxs.shape[1])[None, :]
+        in_row = positions < lengths[:, None]  # The padding of ragged rows is not decoded
+        keep = in_row
+
+        # Remove special tokens: Everything until the first <sos>, and from the first <eos> after it (important!)
         if remove_special_tokens:
-            try:
-                # Remove <sos>
-                sos_pos = idxs.index(self.sos_id)  # Get first sos (important!)
-                idxs = idxs[sos_pos+1:]
-            except ValueError:
-                pass
-            try:
-                # Remove <eos>
-                eos_pos = idxs.index(self.eos_id)   # Get first eos (important!)
-                idxs = idxs[:eos_pos]
-            except ValueError:
-                pass
-
-        # Decode tokens
+            is_sos = idxs == self.sos_id
+            start = np.where(is_sos.any(1), is_sos.argmax(1) + 1, 0)[:, None]
+            is_eos = (idxs == self.eos_id) & (positions >= start) & in_row
+            end = np.where(is_eos.any(1), is_eos.argmax(1), idxs.shape[1])[:, None]
+            keep = (positions >= start) & (positions < end) & in_row
+
+        # Decode tokens (one gather and one join per row)
         if self.subword_model == "bytes":
-            # Covert idxs to hex remove special tokens that may appear by accident
+            # Ignore special tokens that may appear by accident
             offset = len(self.special_tokens())
-            tokens = [self.idx2voc.get(idx) for idx in idxs if idx >= offset]  # Ignore special tokens
-            tokens = hex2text(tokens)
-            s = ''.join(tokens)
+            keep &= (idxs >= offset) & (idxs < offset + 256)
+            byte_values = (idxs - offset).astype(np.uint8)
+            return [bytes(row[mask]).decode('utf-8', errors="replace") for row, mask in zip(byte_values, keep)]
         else:
-            tokens = [self.idx2voc.get(idx, self.unk_piece) for idx in idxs]
-            s = ' '.join(tokens)
-        return s
+            valid = (idxs >= 0) & (idxs < len(self.idx2voc))
+            tokens = np.where(valid, self.idx2voc[np.where(valid, idxs, 0)], self.unk_piece)
+            return [' '.join(row[mask]) for row, mask in zip(tokens, keep)]
 
     def save(self, filename, include_special_tokens=True):
         lines = []
@@ -16,6 +16,8 @@ setup(name='autonmt',
       install_requires=requirements,
       zip_safe=False,
       entry_points={
-          'console_scripts': []
+          'console_scripts': [
+              'autonmt-serve=autonmt.api.server:main',
+          ]
       },
       )
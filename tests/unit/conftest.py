@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+
+from autonmt.vocabularies.whitespace_vocab import Vocabulary
+
+
+class TinySeq2Seq(nn.Module):
+    """Predicts the next token from the mean source embedding and the last target token"""
+    packed_sequence = False
+
+    def __init__(self, vocab_size=14, hidden_dim=8):
+        super().__init__()
+        torch.manual_seed(0)
+        self.embedding = nn.Embedding(vocab_size, hidden_dim)
+        self.output_layer = nn.Linear(hidden_dim, vocab_size)
+
+    def forward_encoder(self, x, x_len, **kwargs):
+        mask = (torch.arange(x.shape[1])[None, :] < x_len[:, None]).float()  # Independent of the batch padding
+        return None, (self.embedding(x) * mask[..., None]).sum(1) / x_len[:, None]
+
+    def forward_decoder(self, y, y_len, states, features_only=False, **kwargs):
+        features = (self.embedding(y) + states[:, None, :]).tanh()
+        return (features if features_only else self.output_layer(features)), states
+
+
+@pytest.fixture
+def make_vocab():
+    # Special tokens (<unk>=0, <s>=1, </s>=2, <pad>=3) + "w0", "w1",...
+    def _make_vocab(num_words=10, subword_model=None):
+        vocab = Vocabulary()
+        tokens = ["<unk>", "<s>", "</s>", "<pad>"] + [f"w{i}" for i in range(num_words)]
+        vocab.voc2idx = {tok: i for i, tok in enumerate(tokens)}
+        vocab.idx2voc = np.array(tokens, dtype=object)
+        vocab.subword_model = subword_model
+        return vocab
+    return _make_vocab
+
+
+@pytest.fixture
+def make_seq2seq():
+    # The class is defined at module level, so the model can be sent to other processes
+    return TinySeq2Seq
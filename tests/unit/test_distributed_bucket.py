@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from autonmt.modules.samplers.distributed_bucket import DistributedBucketBatchSampler
+
+
+def make_data(num_samples=101):
+    rng = np.random.default_rng(1234)
+    return [("x" * int(n), "y" * int(m)) for n, m in zip(rng.integers(1, 30, num_samples), rng.integers(1, 30, num_samples))]
+
+
+def make_sampler(data, **kwargs):
+    return DistributedBucketBatchSampler(data, batch_size=16, max_tokens=200, sort_key=lambda x, y: (len(x), len(y)),
+                                         **kwargs)
+
+
+def _get_batches(rank, world_size, init_file, shuffle, results):
+    dist.init_process_group("gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size)
+    try:
+        sampler = make_sampler(make_data(), shuffle=shuffle)
+        sampler.set_epoch(1)
+        results[rank] = (list(sampler), sampler.num_unique_batches(), len(sampler))
+    finally:
+        dist.destroy_process_group()
+
+
+@pytest.mark.parametrize("shuffle", [True, False])
+def test_distributed_bucket_ddp(tmp_path, shuffle):
+    results = mp.Manager().dict()
+    mp.spawn(_get_batches, args=(2, str(tmp_path / "dist_init"), shuffle, results), nprocs=2, join=True)
+    (batches0, unique0, len0), (batches1, unique1, len1) = results[0], results[1]
+
+    # Same number of batches on all the ranks
+    assert len(batches0) == len(batches1) == len0 == len1
+
+    # The unique batches cover each sample exactly once (the repeated ones are the last ones)
+    unique_idxs = sorted(idx for batch in batches0[:unique0] + batches1[:unique1] for idx in batch)
+    assert unique_idxs == list(range(len(make_data())))
+
+
+def test_distributed_bucket_token_budget():
+    # Same budget as 'Seq2SeqDataset.collate_fn': num_samples * (max_src_len + max_trg_len)
+    data = make_data()
+    sampler = make_sampler(data, num_replicas=1, rank=0)
+    for batch in sampler:
+        max_src_len = max(len(data[i][0]) for i in batch)
+        max_trg_len = max(len(data[i][1]) for i in batch)
+        assert len(batch) * (max_src_len + max_trg_len) <= 200
@@ -0,0 +1,79 @@
+import pytest
+
+from autonmt.bundle.metric_session import MetricSession
+
+
+class StandInScorer:
+    """Tiny local scorer (no downloads): fraction of hypotheses equal to their reference"""
+    num_instances = 0
+
+    def __init__(self, lang=None):
+        StandInScorer.num_instances += 1
+        self.lang = lang
+
+    def score(self, src_lines, hyp_lines, ref_lines):
+        matches = sum(hyp == ref for hyp, ref in zip(hyp_lines, ref_lines))
+        return [{"name": "standin", "score": matches / len(ref_lines)}]
+
+
+def test_metric_session_loads_once():
+    StandInScorer.num_instances = 0
+    session = MetricSession()
+    session.register("standin", StandInScorer)
+
+    # Same params => same scorer
+    scorer = session.get("standin", lang="en")
+    assert session.get("standin", lang="en") is scorer
+    assert scorer.score(None, ["a b", "c"], ["a b", "d"]) == [{"name": "standin", "score": 0.5}]
+    assert StandInScorer.num_instances == 1
+
+    # Different params => new scorer
+    assert session.get("standin", lang="de") is not scorer
+    assert StandInScorer.num_instances == 2
+
+    # Re-registering releases the previous scorers
+    session.register("standin", StandInScorer)
+    assert session.get("standin", lang="en") is not scorer
+
+    with pytest.raises(ValueError):
+        session.get("unknown")
+
+
+def test_metrics_use_session(monkeypatch):
+    pytest.importorskip("sacrebleu")
+    from autonmt.bundle import metrics
+    from autonmt.bundle.metric_session import metric_session
+
+    monkeypatch.setitem(metric_session.factories, "bertscore", StandInScorer)
+    monkeypatch.setattr(metric_session, "scorers", {})
+    assert metrics._bertscore(["a", "b"], ["a", "c"], lang="en") == [{"name": "standin", "score": 0.5}]
+
+
+def test_bertscore_cached_references(tmp_path):
+    # Same scores as 'bert_score.score', with a tiny local BERT model
+    torch = pytest.importorskip("torch")
+    bert_score = pytest.importorskip("bert_score")
+    transformers = pytest.importorskip("transformers")
+    from autonmt.bundle.metric_session import BertScoreScorer
+
+    words = ["the", "cat", "dog", "sat", "on", "a", "mat", "ran", "fast", "slow"]
+    with open(tmp_path / "vocab.txt", 'w') as f:
+        f.write('\n'.join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words) + '\n')
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(words) + 5, hidden_size=16, num_hidden_layers=2,
+                                     num_attention_heads=2, intermediate_size=32)
+    transformers.BertModel(config).save_pretrained(tmp_path)
+    transformers.BertTokenizer(str(tmp_path / "vocab.txt"), model_max_length=64).save_pretrained(tmp_path)
+
+    ref_lines = ["the cat sat on a mat", "a dog ran", "the dog ran fast on a mat", "cat", "the slow cat sat"]
+    hyp_lines = ["the cat sat on the mat", "a dog ran fast", "dog ran on mat", "the cat", "slow cat"]
+    model_params = dict(model_type=str(tmp_path), num_layers=2, device="cpu")
+    p, r, f = bert_score.score(hyp_lines, ref_lines, batch_size=2, **model_params)
+
+    scorer = BertScoreScorer(lang="en", batch_size=2, **model_params)
+    for _ in range(2):  # The second time, the references are read from the cache
+        scores = scorer.score(None, hyp_lines, ref_lines)[0]
+        assert scores["precision"] == pytest.approx(float(p.mean()), abs=1e-5)
+        assert scores["recall"] == pytest.approx(float(r.mean()), abs=1e-5)
+        assert scores["f1"] == pytest.approx(float(f.mean()), abs=1e-5)
+    assert len(scorer.ref_cache) == 1
@@ -0,0 +1,42 @@
+import gc
+import threading
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from autonmt.modules.datasets.prefetch_loader import PrefetchDataLoader
+
+
+def wait_for_threads(num_threads, timeout=5.0):
+    start = time.time()
+    while threading.active_count() > num_threads and time.time() - start < timeout:
+        time.sleep(0.05)
+    return threading.active_count()
+
+
+def test_prefetch_loader_order():
+    loader = PrefetchDataLoader(list(range(10)), batch_size=3, prefetch_batches=2)
+    assert [batch.tolist() for batch in loader] == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+
+
+def test_prefetch_loader_abandoned_iterators():
+    num_threads = threading.active_count()
+    loader = PrefetchDataLoader(list(range(100)), batch_size=2, prefetch_batches=2)
+
+    # Abandoned iterators are collected (the thread does not reference them)
+    for _ in range(3):
+        next(iter(loader))
+    gc.collect()
+    assert wait_for_threads(num_threads) == num_threads
+
+    # A new iteration stops the previous one
+    it = iter(loader)
+    next(it)
+    it2 = iter(loader)
+    next(it2)
+    assert wait_for_threads(num_threads + 1) == num_threads + 1
+    del it2
+    gc.collect()
+    assert wait_for_threads(num_threads) == num_threads
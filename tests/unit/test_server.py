@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+from torch import nn
+
+from autonmt.api.server import TranslationServer
+from autonmt.search.greedy_search import greedy_decode
+
+
+class TinyTranslator:
+    """Same inference interface as 'AutonmtTranslator' (see: 'TranslationServer')"""
+    def __init__(self, vocab, model):
+        self.src_vocab = self.trg_vocab = vocab
+        self.model = model
+
+    def prepare_inference(self, checkpoint=None, accelerator="auto", shortlist=None):
+        self.model.eval()
+        return None
+
+    def encode_src_lines(self, lines, preprocess_fn=None, ds=None):
+        return self.src_vocab.encode_batch(lines)
+
+    def translate_ids(self, x_ids, x_lens, max_tokens=None, max_len_a=1.2, max_len_b=50, shortlist=None):
+        with torch.no_grad():
+            y_pred = greedy_decode(self.model, torch.from_numpy(x_ids), torch.from_numpy(x_lens), sos_id=1, eos_id=2,
+                                   pad_id=3, max_len_a=max_len_a, max_len_b=max_len_b, shortlist=shortlist)
+        return self.trg_vocab.decode_batch(y_pred)
+
+    def decode_hyp_lines(self, lines):
+        return lines
+
+
+async def _run_clients(server, texts, num_clients):
+    serve_task = asyncio.ensure_future(server.serve())
+    while server.port == 0:  # Wait for the socket
+        await asyncio.sleep(0.01)
+
+    async def client(requests):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        for req in requests:  # Pipelined (the responses might arrive in any order)
+            writer.write((json.dumps(req) + "\n").encode("utf-8"))
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in requests]
+        writer.close()
+        return responses
+
+    try:
+        requests = [{"id": i, "text": text} for i, text in enumerate(texts)]
+        results = await asyncio.gather(*[client(requests[i::num_clients]) for i in range(num_clients)])
+        stats = (await client([{"id": "s", "cmd": "stats"}]))[0]
+    finally:
+        serve_task.cancel()
+        await asyncio.gather(serve_task, return_exceptions=True)
+    return [r for responses in results for r in responses], stats
+
+
+def test_translation_server(make_vocab, make_seq2seq):
+    vocab = make_vocab(num_words=12)
+    translator = TinyTranslator(vocab, make_seq2seq(vocab_size=len(vocab.idx2voc)))
+    server = TranslationServer(translator, port=0, max_latency_ms=200, max_tokens=4096, max_batch_size=64,
+                               max_len_a=0.0, max_len_b=5)
+    rng = np.random.default_rng(0)
+    texts = [' '.join(f"w{j}" for j in rng.integers(0, 12, size=int(n))) for n in rng.integers(1, 8, size=20)]
+    responses, stats = asyncio.run(_run_clients(server, texts, num_clients=4))
+
+    # Each response matches its request (by id), and it is the same translation as without batching
+    # (max_len_a=0: the generation length does not depend on the padded width of the batch)
+    expected = [translator.translate_ids(*translator.encode_src_lines([text]), max_len_a=0.0, max_len_b=5)[0] for text in texts]
+    assert sorted(r["id"] for r in responses) == list(range(len(texts)))
+    assert all(r["translation"] == expected[r["id"]] for r in responses)
+
+    # Concurrent requests are grouped into micro-batches
+    assert stats["id"] == "s"
+    assert stats["stats"]["num_requests"] == len(texts)
+    assert 0 < stats["stats"]["num_batches"] < len(texts)
+    assert stats["stats"]["request_latency_ms"]["count"] == len(texts)
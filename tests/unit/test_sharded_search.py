@@ -0,0 +1,44 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+from torch import nn
+
+from autonmt.search.greedy_search import greedy_search
+from autonmt.search.sharded_search import sharded_greedy_search, split_contiguous
+
+
+class TinyDataset(torch.utils.data.Dataset):
+    def __init__(self, num_samples=23):
+        g = torch.Generator().manual_seed(1)
+        self.samples = [torch.randint(4, 12, (int(n),), generator=g) for n in torch.randint(1, 9, (num_samples,), generator=g)]
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        return self.samples[idx], self.samples[idx]
+
+    def get_collate_fn(self, max_tokens):
+        def collate_fn(batch):
+            x = nn.utils.rnn.pad_sequence([x for x, _ in batch], batch_first=True, padding_value=3)
+            x_len = torch.tensor([len(x) for x, _ in batch])
+            return (x, x), (x_len, x_len)
+        return collate_fn
+
+
+def test_split_contiguous():
+    assert split_contiguous([1, 1, 1, 1], num_shards=2) == [(0, 2), (2, 4)]
+    assert split_contiguous([10, 1, 1], num_shards=3) == [(0, 1), (1, 3)]  # Balanced by size (no empty shards)
+    assert split_contiguous([], num_shards=2) == []
+
+
+def test_sharded_greedy_search(capsys, make_seq2seq):
+    model, dataset = make_seq2seq(), TinyDataset()
+    params = dict(sos_id=1, eos_id=2, pad_id=3, batch_size=4, max_tokens=None, max_len_a=1.0, max_len_b=3, num_workers=0)
+    expected, _ = greedy_search(model, dataset, **params)
+    outputs, _ = sharded_greedy_search(model, dataset, num_procs=2, num_threads=1, unknown_option=True, **params)
+    assert outputs == expected
+
+    # The caller's model is not moved to shared memory, and the ignored options are reported
+    assert not any(p.is_shared() for p in model.parameters())
+    assert "unknown_option" in capsys.readouterr().out
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("sacremoses")
+pytest.importorskip("seaborn")
+
+from autonmt.preprocessing.processors import build_shortlist_file
+
+
+def test_build_shortlist_file(tmp_path):
+    src_file, trg_file, output_file = tmp_path / "train.src", tmp_path / "train.trg", tmp_path / "shortlist"
+    src_file.write_text("a b\na c\nb\n")
+    trg_file.write_text("x y\nx z\nx y\n")
+    build_shortlist_file(src_file=str(src_file), trg_file=str(trg_file), output_file=str(output_file),
+                         top_k=2, num_frequent=1, force_overwrite=True, chunk_size=2)
+
+    # Most frequent target tokens first, then the top-k target tokens of each source token (Dice coefficient)
+    lines = output_file.read_text().splitlines()
+    assert lines[0] == "\tx"
+    assert dict(line.split('\t') for line in lines[1:]) == {"a": "x z", "b": "y x", "c": "z x"}
@@ -0,0 +1,136 @@
+import os
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.utils.data as tud
+
+from autonmt.modules.datasets.streaming_dataset import StreamingSeq2SeqDataset
+
+
+def make_corpus(path, num_lines=100):
+    rng = np.random.default_rng(1234)
+    lengths = rng.integers(1, 10, size=num_lines)
+    for lang in ("src", "trg"):
+        with open(os.path.join(path, f"train.{lang}"), 'w') as f:
+            f.write('\n'.join(' '.join(f"w{j % 10}" for j in range(n)) for n in lengths) + '\n')
+    return os.path.join(path, "train")
+
+
+def short_lines_filter(src_lines, trg_lines):
+    # Drops lines unevenly across the shards
+    pairs = [(s, t) for s, t in zip(src_lines, trg_lines) if len(s.split(' ')) <= 5]
+    return [s for s, _ in pairs], [t for _, t in pairs]
+
+
+def _count_batches(rank, world_size, init_file, file_prefix, vocab, results):
+    dist.init_process_group("gloo", init_method=f"file://{init_file}", rank=rank, world_size=world_size)
+    try:
+        dataset = StreamingSeq2SeqDataset(file_prefix, src_lang="src", trg_lang="trg", src_vocab=vocab,
+                                          trg_vocab=vocab, filter_fn=short_lines_filter, shard_size=7,
+                                          shuffle_buffer_size=5)
+        dataset.set_epoch(0)
+        loader = tud.DataLoader(dataset, batch_size=4, collate_fn=dataset.get_collate_fn(max_tokens=None))
+        num_samples, num_batches = 0, 0
+        for (x, _), _ in loader:
+            num_samples += len(x)
+            num_batches += 1
+        results[rank] = (num_batches, num_samples)
+    finally:
+        dist.destroy_process_group()
+
+
+def test_streaming_filter_equal_counts_ddp(tmp_path, make_vocab):
+    file_prefix = make_corpus(tmp_path)
+    results = mp.Manager().dict()
+    mp.spawn(_count_batches, args=(2, str(tmp_path / "dist_init"), file_prefix, make_vocab(), results), nprocs=2, join=True)
+    assert results[0] == results[1]
+    assert results[0][0] > 0
+
+
+def test_streaming_filter_applied_once(tmp_path, make_vocab):
+    file_prefix = make_corpus(tmp_path)
+    vocab = make_vocab()
+    dataset = StreamingSeq2SeqDataset(file_prefix, src_lang="src", trg_lang="trg", src_vocab=vocab, trg_vocab=vocab,
+                                      filter_fn=short_lines_filter, shard_size=7, shuffle=False)
+    with open(file_prefix + ".src") as f:
+        expected = [line.strip() for line in f if len(line.split()) <= 5]
+    assert dataset.num_lines == len(expected)
+    assert [src for src, _ in dataset] == expected
+
+
+def _save_at_step(step, ckpt_path):
+    # Saves a checkpoint after the given training step (None: at the end of the first epoch)
+    pl = pytest.importorskip("pytorch_lightning")
+
+    class SaveAtStep(pl.Callback):
+        def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx):
+            if trainer.global_step == step:
+                trainer.save_checkpoint(ckpt_path)
+
+        def on_train_epoch_end(self, trainer, pl_module):
+            if step is None and trainer.current_epoch == 0:
+                trainer.save_checkpoint(ckpt_path)
+    return SaveAtStep()
+
+
+def _fit_streaming(file_prefix, vocab, num_workers, max_epochs, callbacks=(), ckpt_path=None):
+    pl = pytest.importorskip("pytorch_lightning")
+    pytest.importorskip("sacrebleu")
+    from autonmt.modules.seq2seq import LitSeq2Seq
+    from torch import nn
+
+    class TinyLitSeq2Seq(LitSeq2Seq):
+        def __init__(self, vocab_size):
+            super().__init__(src_vocab_size=vocab_size, trg_vocab_size=vocab_size, padding_idx=3)
+            self.embedding = nn.Embedding(vocab_size, 4)
+            self.output_layer = nn.Linear(4, vocab_size)
+            self.seen_batches = []
+
+        def forward_encoder(self, x, x_len, **kwargs):
+            return None, self.embedding(x).mean(1)
+
+        def forward_decoder(self, y, y_len, states, **kwargs):
+            return self.output_layer(self.embedding(y) + states[:, None, :]), states
+
+        def forward_enc_dec(self, x, x_len, y, y_len, **kwargs):
+            _, states = self.forward_encoder(x, x_len)
+            return self.forward_decoder(y, y_len, states)[0]
+
+        def training_step(self, batch, batch_idx, dataloader_idx=None):
+            self.seen_batches.append(batch[0][0].tolist())
+            return super().training_step(batch, batch_idx, dataloader_idx)
+
+    dataset = StreamingSeq2SeqDataset(file_prefix, src_lang="src", trg_lang="trg", src_vocab=vocab, trg_vocab=vocab,
+                                      shard_size=8, shuffle_buffer_size=5)
+    loader = tud.DataLoader(dataset, batch_size=4, collate_fn=dataset.get_collate_fn(max_tokens=None),
+                            num_workers=num_workers)
+
+    # Same setup as the toolkit
+    model = TinyLitSeq2Seq(vocab_size=len(vocab.idx2voc))
+    model.optimizer, model.learning_rate, model.weight_decay = "sgd", 0.1, 0.0
+    model.configure_criterion("cross_entropy")
+    model._streaming_tds = dataset
+    model._train_accuracy, model._train_metrics_interval = True, None
+    model._skip_val_metrics, model._async_val_metrics = True, False
+    trainer = pl.Trainer(max_epochs=max_epochs, accelerator="cpu", logger=False, enable_checkpointing=False,
+                         enable_progress_bar=False, enable_model_summary=False, limit_val_batches=0,
+                         callbacks=list(callbacks))
+    trainer.fit(model, train_dataloaders=loader, ckpt_path=ckpt_path)
+    return model.seen_batches
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+@pytest.mark.parametrize("step", [3, 17, None])  # Mid-epoch (first and second epochs) and end of the first epoch
+def test_streaming_resume(tmp_path, make_vocab, step, num_workers):
+    file_prefix, vocab = make_corpus(tmp_path), make_vocab()
+    ckpt_path = str(tmp_path / "resume.ckpt")
+    batches = _fit_streaming(file_prefix, vocab, num_workers, max_epochs=3, callbacks=[_save_at_step(step, ckpt_path)])
+    num_seen = step if step is not None else len(batches) // 3
+
+    # The resumed run continues with the same batches (the epoch and the batches seen are restored)
+    resumed_batches = _fit_streaming(file_prefix, vocab, num_workers, max_epochs=3, ckpt_path=ckpt_path)
+    assert resumed_batches == batches[num_seen:]
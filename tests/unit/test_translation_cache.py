@@ -0,0 +1,28 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+from torch import nn
+
+from autonmt.bundle.translation_cache import model_fingerprint
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float16, torch.bfloat16])
+def test_model_fingerprint_dtypes(dtype):
+    torch.manual_seed(0)
+    model = nn.Linear(2, 2).to(dtype)
+    fingerprint = model_fingerprint(model)
+    assert fingerprint == model_fingerprint(model)
+
+    # Different weights => different hash
+    with torch.no_grad():
+        model.bias[0] += 1
+    assert model_fingerprint(model) != fingerprint
+
+
+def test_model_fingerprint_includes_dtype():
+    # Same bytes (zeros), different dtype
+    models = [nn.Linear(2, 2).to(dtype) for dtype in (torch.float16, torch.bfloat16)]
+    for model in models:
+        nn.init.zeros_(model.weight)
+        nn.init.zeros_(model.bias)
+    assert model_fingerprint(models[0]) != model_fingerprint(models[1])
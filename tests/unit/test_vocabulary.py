@@ -0,0 +1,22 @@
+def test_decode_batch_ragged(make_vocab):
+    # Rows without <eos> (e.g. greedy outputs that reached 'max_len') must not decode the padding of other rows
+    vocab = make_vocab()
+    rows = [[1, 5, 6], [1, 5, 6, 7, 8, 9, 2], [1, 3, 5, 2]]
+    assert vocab.decode_batch(rows) == [vocab.decode(row) for row in rows] == ["w1 w2", "w1 w2 w3 w4 w5", "<pad> w1"]
+    assert vocab.decode_batch(rows, remove_special_tokens=False)[0] == "<s> w1 w2"
+
+
+def test_encode_decode_batch(make_vocab):
+    vocab = make_vocab()
+    lines = ["w1 w2", "w3", "w4 w5 w6 x"]
+    idxs, lengths = vocab.encode_batch(lines)
+    assert [vocab.encode(line) for line in lines] == [row[:n].tolist() for row, n in zip(idxs, lengths)]
+    assert vocab.decode_batch(idxs) == ["w1 w2", "w3", "w4 w5 w6 <unk>"]
+
+
+def test_decode_batch_bytes(make_vocab):
+    vocab = make_vocab(subword_model="bytes")
+    lines = ["añb", "c"]
+    idxs, lengths = vocab.encode_batch(lines)
+    assert vocab.decode_batch(idxs) == lines
+    assert vocab.decode_batch([row[:n - 1].tolist() for row, n in zip(idxs, lengths)]) == lines  # Without <eos>